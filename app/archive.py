@@ -0,0 +1,199 @@
+# Archival of old closed and rejected claims
+#
+# Closed and rejected claims submitted more than ARCHIVE_AFTER_DAYS ago are moved out of the database into
+# gzip-compressed NDJSON files (the same lines as GET /claims/export?format=ndjson), one file per submission
+# month and run: ARCHIVE_DIR/2023/claims-2023-04.20250501T020000.ndjson.gz
+# Each line also carries the claim's service "lines" and its "attachments" (their metadata: the files stay in
+# ATTACHMENT_DIR, which has them by SHA-256), as their rows are deleted along with the claim.
+# Run it from cron, e.g. nightly:
+#   python -m app.archive
+#   python -m app.archive --older-than-days 365 --dry-run
+#
+# Archived claims are deleted from 'claims', so they also leave GET /claims, the search and GET /claims/stats,
+# and GET /claims/changes reports them as 'archived'.
+# On PostgreSQL, monthly partitions left empty before the cutoff are dropped afterwards.
+#
+# Each chunk is deleted, then written and fsync'ed, before its transaction commits. A crash can leave a chunk
+# both in the database and in a file (the next run archives it again, and 'read_archive' keeps one copy),
+# but never in neither.
+
+import argparse
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from . import cache, changes, crud, export, fastjson, models, partitions, schemas
+from .config import settings
+
+ARCHIVED_STATUSES = (schemas.ClaimStatus.closed.value, schemas.ClaimStatus.rejected.value)
+ARCHIVE_CHUNK_SIZE = 5000  # Claims deleted and written per transaction
+
+
+def archivable_conditions(cutoff: datetime) -> tuple:
+    table = models.Claim.__table__
+    # The submitted_at condition also limits the scan to the partitions before the cutoff
+    return table.c.status.in_(ARCHIVED_STATUSES), table.c.submitted_at < cutoff
+
+
+def archive_statement(cutoff: datetime, chunk_size: int):
+    """
+    DELETE the oldest 'chunk_size' archivable claims, RETURNING the exported columns and the version.
+    The conditions are repeated on the DELETE itself, so a claim reopened in the meantime is left alone.
+    """
+    table = models.Claim.__table__
+    conditions = archivable_conditions(cutoff)
+    oldest = select(table.c.id).where(*conditions).order_by(table.c.submitted_at, table.c.id).limit(chunk_size)
+    return (
+        delete(table)
+        .where(table.c.id.in_(oldest), *conditions)
+        .returning(*(table.c[name] for name in export.EXPORT_COLUMNS), table.c.version)
+    )
+
+
+def count_archivable(db: Session, cutoff: datetime) -> int:
+    return db.scalar(select(func.count()).select_from(models.Claim.__table__).where(*archivable_conditions(cutoff)))
+
+
+# -----------------------------
+# Archive files
+# -----------------------------
+def archive_path(archive_dir, month: str, run_id: str) -> Path:
+    return Path(archive_dir) / month[:4] / f"claims-{month}.{run_id}.ndjson.gz"
+
+
+def attachment_object(row) -> dict:
+    return {
+        "id": row.id,
+        "filename": row.filename,
+        "content_type": row.content_type,
+        "size": row.size,
+        "sha256": row.sha256,
+        "uploaded_at": row.uploaded_at.isoformat(),
+    }
+
+
+def line_object(row) -> dict:
+    # As GET /claims/{claim_id} writes a line
+    return {name: float(row.charge) if name == "charge" else row._mapping[name] for name in fastjson.LINE_FIELDS}
+
+
+def write_chunk(archive_dir, run_id: str, rows, line_rows=(), attachment_rows=()) -> None:
+    """
+    Append 'rows' to the archive files of their submission months and flush them to disk,
+    each claim with its rows from 'line_rows' and 'attachment_rows'.
+    Each chunk is its own gzip member; gzip readers return the members of a file as one stream.
+    """
+    lines = defaultdict(list)
+    for line in sorted(line_rows, key=lambda line: (line.claim_id, line.line_number)):
+        lines[line.claim_id].append(line_object(line))
+    attachments = defaultdict(list)
+    for attachment in sorted(attachment_rows, key=lambda attachment: attachment.id):
+        attachments[attachment.claim_id].append(attachment_object(attachment))
+    by_month = defaultdict(list)
+    for row in rows:
+        by_month[row.submitted_at.strftime("%Y-%m")].append(row)
+    for month, month_rows in by_month.items():
+        path = archive_path(archive_dir, month, run_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        chunk = "".join(
+            json.dumps({**export.claim_object(row), "lines": lines[row.id], "attachments": attachments[row.id]}) + "\n"
+            for row in month_rows
+        )
+        with open(path, "ab") as file:
+            file.write(gzip.compress(chunk.encode()))
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def read_archive(archive_dir) -> Iterator[dict]:
+    """
+    Every archived claim under 'archive_dir', oldest file first, each claim once.
+    A chunk cut short by a crash is read as far as it was written (its claims stayed in the database,
+    and the next run archives them again).
+    """
+    seen = set()
+    for path in sorted(Path(archive_dir).glob("*/claims-*.ndjson.gz")):
+        lines = []
+        try:
+            with gzip.open(path, "rt") as file:
+                for line in file:
+                    lines.append(line)
+        except (EOFError, gzip.BadGzipFile):
+            if lines and not lines[-1].endswith("\n"):
+                lines.pop()  # Last line of the interrupted chunk
+        for line in lines:
+            claim = json.loads(line)
+            if claim["id"] not in seen:
+                seen.add(claim["id"])
+                yield claim
+
+
+# -----------------------------
+# Archiving
+# -----------------------------
+def archive_claims(
+    db: Session,
+    older_than_days: int,
+    archive_dir,
+    chunk_size: int = ARCHIVE_CHUNK_SIZE,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Move closed and rejected claims submitted more than 'older_than_days' ago into archive files.
+    Returns the number of claims archived.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=older_than_days)
+    run_id = now.strftime("%Y%m%dT%H%M%S")
+    archived = 0
+    while True:
+        rows = db.execute(archive_statement(cutoff, chunk_size)).all()
+        if not rows:
+            db.rollback()
+            return archived
+        claim_ids = [row.id for row in rows]
+        # Their lines and attachment rows go in the same transaction, and into the archive with them
+        line_rows = db.execute(crud.delete_claim_lines_statement(claim_ids)).all()
+        attachment_rows = db.execute(crud.delete_claim_attachments_statement(claim_ids)).all()
+        write_chunk(archive_dir, run_id, rows, line_rows, attachment_rows)  # On disk before the rows are gone from the database
+        changes.record(db, schemas.ChangeType.archived, rows)  # Change feed consumers drop them too
+        db.commit()
+        for row in rows:
+            cache.claim_cache.delete(row.id)  # Shared (Redis) cache; per-process caches expire after CLAIM_CACHE_TTL
+        archived += len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move old closed and rejected claims into compressed archive files")
+    parser.add_argument("--older-than-days", type=int, default=settings.archive_after_days, help="Archive claims submitted more than this many days ago (ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--archive-dir", default=settings.archive_dir, help="Directory for the archive files (ARCHIVE_DIR)")
+    parser.add_argument("--chunk-size", type=int, default=ARCHIVE_CHUNK_SIZE, help="Claims moved per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the claims that would be archived")
+    args = parser.parse_args()
+
+    from .database import SessionLocal, engine
+
+    with SessionLocal() as db:
+        if args.dry_run:
+            cutoff = datetime.utcnow() - timedelta(days=args.older_than_days)
+            print(f"{count_archivable(db, cutoff)} claims would be archived")
+            return
+        archived = archive_claims(db, args.older_than_days, args.archive_dir, args.chunk_size)
+    print(f"Archived {archived} claims into {args.archive_dir}")
+
+    with engine.begin() as connection:
+        cutoff_month = partitions.month_start(datetime.utcnow() - timedelta(days=args.older_than_days))
+        dropped = partitions.drop_empty_partitions(connection, before=cutoff_month)
+    if dropped:
+        print(f"Dropped empty partitions: {', '.join(dropped)}")
+
+
+if __name__ == "__main__":
+    main()
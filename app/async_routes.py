@@ -0,0 +1,434 @@
+# Async claim routes (CLAIMS_DB_MODE=async)
+# Same paths, parameters and responses as the sync routes in main.py, but the handlers are 'async def'
+# and use an AsyncSession, so they run on the event loop instead of Starlette's threadpool.
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import attachments, changes, crud, crud_async, etags, export, fastjson, intake, schemas, search
+from .config import settings
+from .database import get_async_db
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+other_router = APIRouter()  # As in main.py: included ahead of 'router'
+
+
+# -------------------------------------
+# POST route to create a new claim
+# -------------------------------------
+@router.post("/claims", response_model=schemas.ClaimWithLines, status_code=201, responses=intake.INTAKE_RESPONSES)
+async def create_claim(
+    claim: schemas.ClaimCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint creates a new claim in the database (or queues it, with CLAIMS_INTAKE_MODE=kafka).
+    A retry with the same 'Idempotency-Key' header returns the claim created the first time.
+    """
+    if settings.intake_mode == "kafka":
+        # Waiting for the broker's acknowledgement blocks, so it runs in a worker thread
+        return await asyncio.to_thread(intake.intake_response, claim, idempotency_key)
+
+    if idempotency_key is not None:
+        try:
+            db_claim, replayed = await crud_async.create_claim_idempotent(db, claim, idempotency_key, settings.idempotency_key_ttl)
+        except crud.IdempotencyKeyReused as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        except crud.IdempotencyKeyConflict as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        response.headers["ETag"] = etags.format_etag(db_claim.version)
+        return await crud_async.with_lines(db, db_claim)
+
+    db_claim = await crud_async.create_claim(db=db, claim=claim)
+    response.headers["ETag"] = etags.format_etag(db_claim.version)
+    return db_claim
+
+
+# -------------------------------------
+# POST route to create many claims in one request
+# -------------------------------------
+@router.post("/claims/bulk", response_model=schemas.BulkClaimResult)
+async def create_claims_bulk(
+    records: list[dict[str, Any]] = Body(..., max_length=crud.MAX_BULK_CLAIMS),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint creates many claims at once; invalid records are reported in 'errors'.
+    """
+    valid_claims, valid_indexes, errors = schemas.split_valid_claims(records)
+    created, failed = await crud_async.create_claims_bulk(db, valid_claims)
+    return schemas.bulk_result(created, errors, failed, valid_indexes)
+
+
+# -------------------------------------
+# GET route to fetch claims, one page at a time
+# -------------------------------------
+@router.get("/claims", response_model=list[schemas.ClaimWithLines])
+async def read_claims(
+    response: Response,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    claim_status: Optional[schemas.ClaimStatus] = Query(None, alias="status", description="Only claims with this status"),
+    min_amount: Optional[float] = Query(None, ge=0, description="Minimum claim amount (inclusive)"),
+    max_amount: Optional[float] = Query(None, ge=0, description="Maximum claim amount (inclusive)"),
+    submitted_from: Optional[datetime] = Query(None, description="Submitted at or after this time"),
+    submitted_to: Optional[datetime] = Query(None, description="Submitted before this time"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint fetches claims one page at a time, with their lines; the next-page cursor is sent in 'X-Next-Cursor'.
+    """
+    try:
+        # FAST_JSON: plain rows, encoded below without re-validating them against the response model
+        get_page = crud_async.get_claims_page_rows if settings.fast_json else crud_async.get_claims_page
+        claims, next_cursor = await get_page(
+            db,
+            limit=limit,
+            cursor=cursor,
+            status=claim_status,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            submitted_from=submitted_from,
+            submitted_to=submitted_to,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if settings.fast_json:
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        lines = await crud_async.get_claim_line_rows(db, claims)
+        return Response(fastjson.encode_claim_list(claims, lines), media_type="application/json", headers=headers)
+
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return claims
+
+
+# -------------------------------------
+# GET route to search claims by claimant name
+# -------------------------------------
+@router.get("/claims/search", response_model=list[schemas.Claim])  # Declared before /claims/{claim_id}
+async def search_claims(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=100, description="Full, partial or misspelled claimant name"),
+    limit: int = Query(search.SEARCH_PAGE_SIZE, ge=1, le=search.MAX_SEARCH_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint finds claims whose claimant name matches 'q', best match first.
+    """
+    try:
+        claims, next_cursor = await crud_async.search_claims(
+            db, q, limit=limit, cursor=cursor, min_similarity=settings.search_min_similarity, fast=settings.fast_json
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if settings.fast_json:
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        return Response(fastjson.encode_claim_list(claims), media_type="application/json", headers=headers)
+
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return claims
+
+
+# -------------------------------------
+# GET route to export every claim as a stream (NDJSON or CSV)
+# -------------------------------------
+@router.get("/claims/export")  # Declared before /claims/{claim_id} so 'export' isn't read as an ID
+async def export_claims(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint streams every claim as NDJSON or CSV without building the whole list in memory.
+    """
+    async def body():
+        # The session stays open until the last chunk has been sent
+        try:
+            async for block in export.encode_async(format, crud_async.stream_claims(db)):
+                yield block
+        finally:
+            await db.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="claims.{format}"'},
+    )
+
+
+# -------------------------------------
+# GET route to fetch a single claim by ID
+# -------------------------------------
+@router.get("/claims/{claim_id}", response_model=schemas.ClaimWithLines)
+async def read_claim(
+    claim_id: int,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match", description="ETag of a copy the client has: 304 if it is still current"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint fetches a specific claim by its ID with its lines, and its version in the 'ETag' header.
+    Claims are served from the claim cache when possible (see cache.py).
+    """
+    entry = await crud_async.get_claim_entry(db, claim_id, fast=settings.fast_json)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Claim not found")
+
+    body, version = entry
+    headers = {"ETag": etags.format_etag(version)}
+    if etags.not_modified(if_none_match, version):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# -------------------------------------
+# PUT route to update an existing claim by ID
+# -------------------------------------
+@router.put("/claims/{claim_id}", response_model=schemas.Claim)
+async def update_claim(
+    claim_id: int,
+    updated_claim: schemas.ClaimUpdate,  # Lines are set at creation only
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match", description="The claim's ETag as last read: only write if nobody changed it since"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint updates a claim with the given claim ID using the data in the request body.
+    With If-Match, a claim changed since the client read it is left alone and 412 is returned.
+    """
+    try:
+        db_claim = await crud_async.update_claim(db, claim_id, updated_claim, etags.write_condition(if_match))
+    except crud.StaleClaimVersion as exc:
+        raise etags.precondition_failed(exc.current_version)
+    except crud.ClaimLinesMismatch as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if db_claim is None:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    response.headers["ETag"] = etags.format_etag(db_claim.version)
+    return db_claim
+
+
+# -------------------------------------
+# PATCH route to change only some fields of a claim
+# -------------------------------------
+@router.patch("/claims/{claim_id}", response_model=schemas.Claim)
+async def patch_claim(
+    claim_id: int,
+    changes: schemas.ClaimPatch,
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match", description="The claim's ETag as last read: only write if nobody changed it since"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint updates only the fields sent in the request body. If-Match works as for PUT.
+    """
+    try:
+        db_claim = await crud_async.patch_claim(db, claim_id, changes.changes(), etags.write_condition(if_match))
+    except crud.StaleClaimVersion as exc:
+        raise etags.precondition_failed(exc.current_version)
+    except crud.ClaimLinesMismatch as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if db_claim is None:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    response.headers["ETag"] = etags.format_etag(db_claim.version)
+    return db_claim
+
+
+# -------------------------------------
+# DELETE route to remove a claim by ID
+# -------------------------------------
+@router.delete("/claims/{claim_id}", status_code=204)
+async def delete_claim(
+    claim_id: int,
+    if_match: Optional[str] = Header(None, alias="If-Match", description="The claim's ETag as last read: only write if nobody changed it since"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint deletes a claim; it returns 204 No Content on success. If-Match works as for PUT.
+    """
+    try:
+        deleted = await crud_async.delete_claim(db, claim_id, etags.write_condition(if_match))
+    except crud.StaleClaimVersion as exc:
+        raise etags.precondition_failed(exc.current_version)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Claim not found")
+
+
+# -------------------------------------
+# GET route to look up a claim queued through the Kafka intake
+# -------------------------------------
+@other_router.get("/claims/intake/{tracking_id}", response_model=schemas.Claim)
+async def read_intake_claim(tracking_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    This endpoint returns the claim written for a tracking ID (404 while it is still queued).
+    """
+    db_claim = await crud_async.get_claim_by_tracking_id(db, tracking_id)
+    if db_claim is None:
+        raise HTTPException(status_code=404, detail="Claim not written yet")
+    return db_claim
+
+
+# -------------------------------------
+# GET route to tail claim changes (change feed for downstream systems)
+# -------------------------------------
+@other_router.get("/claims/changes", response_model=schemas.ChangeFeed)
+async def read_claim_changes(
+    since: int = Query(0, ge=0, description="Position of the last change already processed (0 = from the start)"),
+    limit: int = Query(changes.FEED_PAGE_SIZE, ge=1, le=changes.MAX_FEED_PAGE_SIZE, description="Most changes returned"),
+    wait: float = Query(0, ge=0, le=changes.MAX_WAIT, description="Seconds to wait for a change when there is none yet (long poll)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint returns the claim changes after position 'since', in order; 'wait' makes it a long poll.
+    """
+    try:
+        rows = await crud_async.poll_changes(db, since, limit, wait)
+    except changes.ChangesPurged as exc:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Changes up to position {exc.purged_through} were purged; re-read the claims, then read on from since={exc.purged_through}",
+        )
+    return changes.feed(rows, since)
+
+
+# -------------------------------------
+# Claim attachments (EOBs, itemized bills, scans)
+# -------------------------------------
+# Each query gives its connection back right away (attachments.released_async), so none is held during a transfer.
+@other_router.post("/claims/{claim_id}/attachments", response_model=schemas.Attachment, status_code=201)
+async def upload_claim_attachment(
+    claim_id: int,
+    request: Request,
+    filename: Optional[str] = Query(None, max_length=1024, description="Name of the file, sent back when it is downloaded"),
+    content_type: str = Header(attachments.DEFAULT_CONTENT_TYPE, alias="Content-Type", max_length=255),
+    content_length: Optional[int] = Header(None, alias="Content-Length"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint attaches a file to a claim; the request body is the file itself, streamed to the attachment store.
+    """
+    if content_length is not None and content_length > attachments.store.max_bytes:
+        raise HTTPException(status_code=413, detail=f"Attachments are limited to {attachments.store.max_bytes} bytes")
+    if not await attachments.released_async(db, crud_async.claim_exists, claim_id):
+        raise HTTPException(status_code=404, detail="Claim not found")
+    try:
+        stored = await attachments.store.save(request.stream())
+    except attachments.AttachmentTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except attachments.EmptyAttachment as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return await attachments.released_async(
+        db, crud_async.create_attachment,
+        claim_id, attachments.clean_filename(filename), content_type, stored.sha256, stored.size,
+    )
+
+
+@other_router.get("/claims/{claim_id}/attachments", response_model=list[schemas.Attachment])
+async def read_claim_attachments(claim_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    This endpoint lists the files attached to a claim (metadata only), oldest first.
+    """
+    found = await crud_async.get_attachments(db, claim_id)
+    if not found and not await crud_async.claim_exists(db, claim_id):
+        raise HTTPException(status_code=404, detail="Claim not found")
+    return found
+
+
+@other_router.api_route("/claims/{claim_id}/attachments/{attachment_id}", methods=["GET", "HEAD"], response_class=Response)
+async def download_claim_attachment(claim_id: int, attachment_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    This endpoint sends an attached file, with Range requests (206) and If-Range on the ETag.
+    """
+    attachment = await attachments.released_async(db, crud_async.get_attachment, claim_id, attachment_id)
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    try:
+        stat_result = await asyncio.to_thread(os.stat, attachments.store.path(attachment.sha256))
+    except FileNotFoundError:
+        logger.error("Attachment %d is missing its file %s", attachment.id, attachment.sha256)
+        raise HTTPException(status_code=404, detail="Attachment content not found")
+    return attachments.file_response(attachment, stat_result)
+
+
+# -------------------------------------
+# POST route to change the status of many claims at once (adjudication runs)
+# -------------------------------------
+@other_router.post("/claims/status-transitions", response_model=schemas.StatusTransitionResult)
+async def transition_claim_statuses(request: schemas.StatusTransitionRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    This endpoint changes the status of many claims with set-based UPDATEs ('transitions', or a 'filter' and 'target_status').
+    """
+    if request.transitions is not None:
+        return await crud_async.transition_claims(db, request.transitions)
+    return await crud_async.transition_matching_claims(db, request.filter, request.target_status)
+
+
+# -------------------------------------
+# GET routes for claim statistics and exact amount totals
+# -------------------------------------
+@other_router.get("/claims/stats", response_model=list[schemas.ClaimStatsRow], response_model_exclude_none=True)
+async def read_claim_stats(
+    group_by: list[str] = Query(["status"], description="Any of: status, day, hour (day and hour are exclusive)"),
+    submitted_from: Optional[datetime] = Query(None, description="Submitted at or after this time (hour granularity)"),
+    submitted_to: Optional[datetime] = Query(None, description="Submitted before this time (hour granularity)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint returns claim counts and amount totals from the pre-aggregated 'claim_stats' table.
+    """
+    unknown = set(group_by) - {"status", "day", "hour"}
+    if unknown or {"day", "hour"} <= set(group_by):
+        raise HTTPException(status_code=400, detail="group_by accepts status, and either day or hour")
+
+    period = "day" if "day" in group_by else "hour" if "hour" in group_by else None
+    return await crud_async.get_claim_stats(
+        db, by_status="status" in group_by, period=period, submitted_from=submitted_from, submitted_to=submitted_to,
+    )
+
+
+@other_router.get("/claims/totals", response_model=list[schemas.ClaimTotalsRow], response_model_exclude_none=True)
+async def read_claim_totals(
+    by_status: bool = Query(True, description="One total per status (false: a single total)"),
+    claim_status: Optional[schemas.ClaimStatus] = Query(None, alias="status", description="Only claims with this status"),
+    min_amount: Optional[float] = Query(None, ge=0, description="Minimum claim amount (inclusive)"),
+    max_amount: Optional[float] = Query(None, ge=0, description="Maximum claim amount (inclusive)"),
+    submitted_from: Optional[datetime] = Query(None, description="Submitted at or after this time"),
+    submitted_to: Optional[datetime] = Query(None, description="Submitted before this time"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    This endpoint returns claim counts and exact amount totals for the claims matching the filters.
+    """
+    return await crud_async.get_claim_totals(
+        db,
+        by_status=by_status,
+        status=claim_status,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        submitted_from=submitted_from,
+        submitted_to=submitted_to,
+    )
+
+
+@other_router.get("/claims/totals/reconcile", response_model=schemas.Reconciliation)
+async def read_claim_totals_reconciliation(db: AsyncSession = Depends(get_async_db)):
+    """
+    This endpoint checks that the pre-aggregated statistics agree with the claims, per status.
+    """
+    return await crud_async.reconcile(db)
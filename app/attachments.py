@@ -0,0 +1,214 @@
+# Claim attachments (EOBs, itemized bills, scans): content-addressed file store
+#
+#   POST /claims/{claim_id}/attachments?filename=eob.pdf     (the file is the request body, sent as is)
+#   GET  /claims/{claim_id}/attachments                      (metadata)
+#   GET  /claims/{claim_id}/attachments/{attachment_id}      (the file; Range requests supported)
+#
+# File contents never go through the database or SQLAlchemy: the upload is streamed chunk by chunk into a temporary
+# file while its SHA-256 is computed, then moved to ATTACHMENT_DIR/sha256/<2 hex>/<2 hex>/<digest>. A file that
+# is already stored (the same EOB attached to two claims) is kept once. 'claim_attachments' only holds the metadata
+# row that points at the digest. At most ATTACHMENT_CHUNK_SIZE bytes of an upload are in memory at a time.
+#
+# Downloads are sent from the file on disk, in ATTACHMENT_CHUNK_SIZE pieces. With ATTACHMENT_ACCEL_REDIRECT set,
+# the app only answers with an X-Accel-Redirect header and nginx sends the file itself (sendfile, Range included).
+# The Content-Type is the uploader's, so downloads are always 'Content-Disposition: attachment' and 'nosniff':
+# a browser saves an uploaded text/html or SVG file instead of running its scripts on the API's origin.
+
+import hashlib
+import logging
+import os
+import tempfile
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+import anyio
+from sqlalchemy.orm import Session
+from starlette.responses import FileResponse, Response
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+DEFAULT_FILENAME = "attachment"  # Sent in Content-Disposition when the upload had no name
+MAX_FILENAME_LENGTH = 255
+
+uploaded_bytes = metrics.registry.register(metrics.Counter("attachment_uploaded_bytes_total", "Bytes received in attachment uploads"))
+deduplicated = metrics.registry.register(metrics.Counter("attachment_deduplicated_total", "Uploads whose content was already stored"))
+
+
+class AttachmentTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Attachments are limited to {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class EmptyAttachment(ValueError):
+    pass
+
+
+@dataclass
+class StoredFile:
+    sha256: str  # Hex digest: the file's name in the store
+    size: int
+    deduplicated: bool  # The content was already stored; this upload was discarded
+
+
+# -----------------------------
+# Content-addressed store
+# -----------------------------
+class AttachmentStore:
+    """
+    Files under 'root', named by the SHA-256 of their content. Files are written to 'root/tmp' first and renamed
+    into place once complete, so a file under 'root/sha256' is always whole; concurrent uploads of the same content
+    rename identical files onto the same name.
+    """
+
+    def __init__(self, root: str, chunk_size: int = 1024 * 1024, max_bytes: int = 100 * 1024 * 1024):
+        self.root, self.chunk_size, self.max_bytes = Path(root), chunk_size, max_bytes
+
+    def path(self, sha256: str) -> Path:
+        # Two directory levels keep any one directory to a manageable number of entries
+        return self.root / "sha256" / sha256[:2] / sha256[2:4] / sha256
+
+    def relative_path(self, sha256: str) -> str:
+        return self.path(sha256).relative_to(self.root).as_posix()
+
+    async def save(self, chunks: AsyncIterator[bytes]) -> StoredFile:
+        """
+        Store the content read from 'chunks' (e.g. Request.stream()). Raises AttachmentTooLarge past 'max_bytes'
+        and EmptyAttachment for no content; nothing is kept in either case.
+        """
+        temporary = await anyio.to_thread.run_sync(self._open_temporary)
+        digest, size, buffer = hashlib.sha256(), 0, bytearray()
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise AttachmentTooLarge(self.max_bytes)
+                buffer += chunk
+                if len(buffer) >= self.chunk_size:
+                    # Hashing and writing release the GIL, so they run in a worker thread off the event loop
+                    await anyio.to_thread.run_sync(_write, temporary, digest, buffer)
+                    buffer = bytearray()
+            if size == 0:
+                raise EmptyAttachment("The attachment is empty")
+            await anyio.to_thread.run_sync(_write, temporary, digest, buffer)
+            sha256 = digest.hexdigest()
+            stored = await anyio.to_thread.run_sync(self._finish, temporary, sha256)
+        except BaseException:
+            await anyio.to_thread.run_sync(_discard, temporary)
+            raise
+        uploaded_bytes.inc(size)
+        if not stored:
+            deduplicated.inc()
+        return StoredFile(sha256=sha256, size=size, deduplicated=not stored)
+
+    def _open_temporary(self):
+        directory = self.root / "tmp"
+        directory.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=directory, prefix="upload-", delete=False)
+
+    def _finish(self, temporary, sha256: str) -> bool:
+        """
+        Move the complete upload to its place; returns False if that content was already stored.
+        """
+        temporary.flush()
+        os.fsync(temporary.fileno())  # On disk before it is visible under its digest
+        temporary.close()
+        target = self.path(sha256)
+        if target.exists():
+            os.unlink(temporary.name)
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temporary.name, target)  # Atomic: readers see the whole file or none
+        return True
+
+
+def _write(temporary, digest, data: bytes) -> None:
+    digest.update(data)
+    temporary.write(data)
+
+
+def _discard(temporary) -> None:
+    temporary.close()
+    try:
+        os.unlink(temporary.name)
+    except FileNotFoundError:
+        pass
+
+
+def clean_filename(filename: Optional[str]) -> Optional[str]:
+    """
+    The name to send back in Content-Disposition: no directories and no control characters.
+    """
+    if not filename:
+        return None
+    name = filename.replace("\\", "/").rsplit("/", 1)[-1]
+    name = "".join(char for char in name if unicodedata.category(char)[0] != "C").strip()
+    return name[:MAX_FILENAME_LENGTH] or None
+
+
+def released(db: Session, function, *args):
+    """
+    Run 'function(db, *args)', then give the session's connection back to the pool. The routes call this in a worker
+    thread around each query, so no connection is held while an upload or download is in progress.
+    """
+    try:
+        return function(db, *args)
+    finally:
+        db.close()  # The session stays usable; it checks a connection out again on its next query
+
+
+async def released_async(db, function, *args):
+    """
+    'released' for the async routes: await 'function(db, *args)' (a crud_async function), then close the AsyncSession.
+    """
+    try:
+        return await function(db, *args)
+    finally:
+        await db.close()
+
+
+# -----------------------------
+# Downloads
+# -----------------------------
+class AttachmentFileResponse(FileResponse):
+    # Fewer, larger reads than Starlette's 64 KB (each read is a trip to a worker thread)
+    chunk_size = settings.attachment_chunk_size
+
+
+def content_disposition(filename: str) -> str:
+    # As FileResponse writes it: RFC 5987 encoding for names that aren't plain ASCII
+    quoted = quote(filename)
+    return f'attachment; filename="{filename}"' if quoted == filename else f"attachment; filename*=utf-8''{quoted}"
+
+
+def file_response(attachment, stat_result: Optional[os.stat_result] = None) -> Response:
+    """
+    The download of 'attachment' (a claim_attachments row). Its digest is its ETag, which also makes
+    If-Range work for resumed downloads.
+    """
+    headers = {
+        "ETag": f'"{attachment.sha256}"',
+        "Cache-Control": "private, max-age=86400, immutable",
+        "X-Content-Type-Options": "nosniff",  # The browser keeps to the Content-Type (see the top of the file)
+    }
+    filename = attachment.filename or DEFAULT_FILENAME  # Always a download, never displayed inline
+    if settings.attachment_accel_redirect:
+        # nginx serves the file from an 'internal' location mapped to ATTACHMENT_DIR
+        headers["X-Accel-Redirect"] = settings.attachment_accel_redirect.rstrip("/") + "/" + store.relative_path(attachment.sha256)
+        headers["Content-Disposition"] = content_disposition(filename)
+        return Response(media_type=attachment.content_type, headers=headers)
+    return AttachmentFileResponse(
+        store.path(attachment.sha256), media_type=attachment.content_type, filename=filename,
+        headers=headers, stat_result=stat_result,
+    )
+
+
+# Shared store used by the routes in main.py
+store = AttachmentStore(settings.attachment_dir, settings.attachment_chunk_size, settings.attachment_max_bytes)
@@ -0,0 +1,155 @@
+# Read-through cache for single claims (GET /claims/{claim_id})
+# Entries hold the claim's version and its serialized schemas.Claim JSON ("<version> <json>"), so a hit is
+# returned with its ETag without touching the database or re-running Pydantic. Writes through
+# crud.update_claim / crud.delete_claim refresh or drop the entry.
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+cache_hits = metrics.registry.register(metrics.Counter("claim_cache_hits_total", "Claim cache lookups answered from the cache"))
+cache_misses = metrics.registry.register(metrics.Counter("claim_cache_misses_total", "Claim cache lookups that went to the database"))
+cache_evictions = metrics.registry.register(metrics.Counter("claim_cache_evictions_total", "Entries dropped because the cache was full or the entry expired"))
+
+
+# -----------------------------
+# Cache interface
+# -----------------------------
+class ClaimCache:
+    """
+    Base class for cache backends; this one caches nothing (CLAIM_CACHE_BACKEND=none).
+    """
+
+    name = "none"
+
+    def get(self, claim_id: int) -> Optional[str]:
+        return None
+
+    def set(self, claim_id: int, value: str) -> None:
+        pass
+
+    def delete(self, claim_id: int) -> None:
+        pass
+
+    # Counters are kept per backend so they can be compared when switching
+    def _hit(self):
+        cache_hits.inc(backend=self.name)
+
+    def _miss(self):
+        cache_misses.inc(backend=self.name)
+
+
+# -----------------------------
+# In-process LRU with TTL
+# -----------------------------
+class LRUCache(ClaimCache):
+    """
+    Keeps up to 'max_entries' claims in this process, each for at most 'ttl' seconds.
+    Each worker process has its own copy, so a write handled by one worker only
+    invalidates that worker's entry; keep the TTL short when running several workers.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 30, clock=time.monotonic):
+        self.max_entries, self.ttl, self.clock = max_entries, ttl, clock
+        self._entries = OrderedDict()  # claim_id -> (expires_at, json), least recently used first
+        self._lock = threading.Lock()  # Sync routes run on a threadpool
+
+    def get(self, claim_id: int) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(claim_id)
+            if entry is not None and entry[0] <= self.clock():
+                # Expired: drop it and treat as a miss
+                del self._entries[claim_id]
+                cache_evictions.inc(backend=self.name)
+                entry = None
+            if entry is None:
+                self._miss()
+                return None
+            self._entries.move_to_end(claim_id)
+            self._hit()
+            return entry[1]
+
+    def set(self, claim_id: int, value: str) -> None:
+        with self._lock:
+            self._entries[claim_id] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(claim_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # Least recently used
+                cache_evictions.inc(backend=self.name)
+
+    def delete(self, claim_id: int) -> None:
+        with self._lock:
+            self._entries.pop(claim_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# -----------------------------
+# Redis backend (shared by every worker)
+# -----------------------------
+class RedisCache(ClaimCache):
+    """
+    Stores entries in Redis with a TTL, so all workers share them and see each other's invalidations.
+    Redis errors are logged and treated as misses, so an outage only costs cache hits.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl: float = 30, prefix: str = "claim:", client=None):
+        if client is None:
+            import redis  # Only needed when this backend is selected
+            client = redis.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        self.client, self.ttl, self.prefix = client, ttl, prefix
+
+    def _key(self, claim_id: int) -> str:
+        return f"{self.prefix}{claim_id}"
+
+    def get(self, claim_id: int) -> Optional[str]:
+        try:
+            value = self.client.get(self._key(claim_id))
+        except Exception:
+            logger.warning("Claim cache read failed", exc_info=True)
+            value = None
+        if value is None:
+            self._miss()
+            return None
+        self._hit()
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, claim_id: int, value: str) -> None:
+        try:
+            self.client.set(self._key(claim_id), value, ex=max(1, int(self.ttl)))
+        except Exception:
+            logger.warning("Claim cache write failed", exc_info=True)
+
+    def delete(self, claim_id: int) -> None:
+        try:
+            self.client.delete(self._key(claim_id))
+        except Exception:
+            # The entry may now outlive the change by up to 'ttl' seconds
+            logger.warning("Claim cache invalidation failed", exc_info=True)
+
+
+def build_cache() -> ClaimCache:
+    """
+    Create the cache backend selected by CLAIM_CACHE_BACKEND.
+    """
+    if settings.claim_cache_backend == "memory":
+        return LRUCache(max_entries=settings.claim_cache_max_entries, ttl=settings.claim_cache_ttl)
+    if settings.claim_cache_backend == "redis":
+        return RedisCache(url=settings.redis_url, ttl=settings.claim_cache_ttl)
+    return ClaimCache()
+
+
+# Shared cache instance used by crud.py
+claim_cache = build_cache()
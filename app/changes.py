@@ -0,0 +1,282 @@
+# Change feed of claim events (GET /claims/changes)
+#
+# Transactional outbox: every write path in crud.py and crud_async.py (and the archival job) adds one
+# 'claim_events' row per claim it creates, updates or deletes, in the same transaction as the change itself,
+# so an event exists exactly when its change was committed. The relay then publishes new events in batches
+# by numbering them with consecutive feed positions. The API workers run it every CHANGE_RELAY_INTERVAL seconds,
+# one at a time (an advisory lock on PostgreSQL, see main.run_exclusively); with CHANGE_RELAY_INTERVAL=0 run it
+# on its own instead:
+#   python -m app.changes
+#
+# Consumers (billing, fraud, ...) tail the feed from the last position they processed:
+#   GET /claims/changes?since=1042&wait=25
+# Each request reads only the events after 'since' (an index range scan), never the claims table; 'wait'
+# holds the request open until something new is published (long poll).
+#
+# Why positions and not the event ids: ids are handed out when a transaction inserts its events, but
+# transactions commit in a different order. A reader going by id could move past an id whose transaction
+# hadn't committed yet, and miss that event for good. The relay numbers events while holding the lock on
+# the 'change_feed_state' row, in the order it sees them committed, so positions only appear in order.
+#
+# Published events are purged after CHANGE_FEED_RETENTION_DAYS. A consumer that fell further behind than that
+# gets 410: it re-reads the claims, then tails again from the position in the response.
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import export, models, schemas
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+FEED_STATE_ID = 1           # The one row of 'change_feed_state'
+FEED_PAGE_SIZE = 100        # Events per GET /claims/changes response by default
+MAX_FEED_PAGE_SIZE = 1000
+MAX_WAIT = 30               # Longest long poll in seconds (below the usual load balancer idle timeouts)
+POLL_INTERVAL = 0.5         # Seconds between checks for new events while a long poll waits
+PURGE_CHUNK_SIZE = 1000     # Events deleted per statement and transaction
+
+
+class ChangesPurged(Exception):
+    """
+    The events after the requested position were purged; the consumer has to start over from 'purged_through'.
+    """
+
+    def __init__(self, purged_through: int):
+        super().__init__(f"Changes up to position {purged_through} were purged")
+        self.purged_through = purged_through
+
+
+# -----------------------------
+# Writing events (called by the write paths, inside their transaction)
+# -----------------------------
+def record_statement():
+    return insert(models.ClaimEvent.__table__)
+
+
+def event_rows(change_type: schemas.ChangeType, claims, now: Optional[datetime] = None) -> list[dict]:
+    """
+    Parameters for 'record_statement': one event per claim row (ORM object or Core row, after the change).
+    """
+    now = now or datetime.utcnow()
+    return [
+        {
+            "change_type": change_type.value,
+            "claim_id": claim.id,
+            "claim_version": getattr(claim, "version", None),
+            "claim": json.dumps(export.claim_object(claim)),
+            "occurred_at": now,
+        }
+        for claim in claims
+    ]
+
+
+def record(db: Session, change_type: schemas.ChangeType, claims) -> None:
+    """
+    Add the events of 'claims' to the current transaction (nothing is committed here).
+    """
+    rows = event_rows(change_type, claims)
+    if rows:
+        # One multi-row INSERT however many claims the write touched
+        db.execute(record_statement(), rows)
+
+
+# -----------------------------
+# Relay: publishing events
+# -----------------------------
+def publish(db: Session, batch_size: int = 1000, now: Optional[datetime] = None) -> int:
+    """
+    Give the oldest unpublished events (up to 'batch_size') the next feed positions, in one transaction.
+    Returns the number of events published.
+    """
+    events, state = models.ClaimEvent.__table__, models.ChangeFeedState.__table__
+
+    # Lock the state row before looking for events: a second relay waits here until this one commits,
+    # then sees these events as published (on SQLite the UPDATE takes the database's write lock)
+    last_position = db.execute(
+        update(state)
+        .where(state.c.id == FEED_STATE_ID)
+        .values(last_position=state.c.last_position)
+        .returning(state.c.last_position)
+    ).scalar_one()
+
+    ids = db.scalars(
+        select(events.c.id).where(events.c.position.is_(None)).order_by(events.c.id).limit(batch_size)
+    ).all()
+    if not ids:
+        db.rollback()
+        return 0
+
+    now = now or datetime.utcnow()
+    db.execute(
+        update(events).where(events.c.id == bindparam("event_id")).values(position=bindparam("event_position"), published_at=now),
+        [{"event_id": event_id, "event_position": last_position + offset} for offset, event_id in enumerate(ids, 1)],
+    )
+    db.execute(update(state).where(state.c.id == FEED_STATE_ID).values(last_position=last_position + len(ids)))
+    db.commit()
+    return len(ids)
+
+
+def relay(session_factory: Callable, batch_size: int = 1000) -> int:
+    """
+    Publish every pending event, one batch per transaction. Returns the number of events published.
+    """
+    published = 0
+    with session_factory() as db:
+        while True:
+            count = publish(db, batch_size)
+            published += count
+            if count < batch_size:
+                return published
+
+
+def purge(db: Session, retention_days: int, chunk_size: int = PURGE_CHUNK_SIZE, now: Optional[datetime] = None) -> int:
+    """
+    Delete events published more than 'retention_days' ago, oldest first. Returns how many were deleted.
+    """
+    events, state = models.ClaimEvent.__table__, models.ChangeFeedState.__table__
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        # Positions are handed out in publishing order, so the expired events are the lowest positions
+        chunk = (
+            select(events.c.id)
+            .where(events.c.position.is_not(None), events.c.published_at < cutoff)
+            .order_by(events.c.position)
+            .limit(chunk_size)
+        )
+        positions = db.scalars(delete(events).where(events.c.id.in_(chunk)).returning(events.c.position)).all()
+        if positions:
+            db.execute(
+                update(state)
+                .where(state.c.id == FEED_STATE_ID, state.c.purged_through < max(positions))
+                .values(purged_through=max(positions))
+            )
+        db.commit()
+        purged += len(positions)
+        if len(positions) < chunk_size:
+            return purged
+
+
+# -----------------------------
+# Reading the feed
+# -----------------------------
+def read_changes(db: Session, since: int, limit: int = FEED_PAGE_SIZE) -> list:
+    """
+    The published events after position 'since', in order (at most 'limit').
+    Raises ChangesPurged if some of the events right after 'since' were purged.
+    """
+    rows = db.execute(read_changes_statement(since, limit)).all()
+    if may_be_purged(rows, since):
+        check_not_purged(since, db.scalar(purged_through_statement()))
+    return rows
+
+
+def read_changes_statement(since: int, limit: int):
+    events = models.ClaimEvent.__table__
+    return select(events).where(events.c.position > since).order_by(events.c.position).limit(limit)
+
+
+def may_be_purged(rows: list, since: int) -> bool:
+    # Positions are gapless, so the next event is always 'since + 1'; only check the state when it isn't there
+    return not rows or rows[0].position != since + 1
+
+
+def purged_through_statement():
+    state = models.ChangeFeedState.__table__
+    return select(state.c.purged_through).where(state.c.id == FEED_STATE_ID)
+
+
+def check_not_purged(since: int, purged_through: Optional[int]) -> None:
+    # Raises ChangesPurged if the events right after 'since' are gone
+    if since < (purged_through or 0):
+        raise ChangesPurged(purged_through)
+
+
+async def poll_changes(db: Session, since: int, limit: int = FEED_PAGE_SIZE, wait: float = 0) -> list:
+    """
+    'read_changes', waiting up to 'wait' seconds for the first new event (long poll).
+    The session gives its connection back to the pool between checks, so a waiting consumer doesn't hold one.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        rows = await asyncio.to_thread(_read_and_release, db, since, limit)
+        remaining = deadline - loop.time()
+        if rows or remaining <= 0:
+            return rows
+        await asyncio.sleep(min(POLL_INTERVAL, remaining))
+
+
+def _read_and_release(db: Session, since: int, limit: int) -> list:
+    try:
+        return read_changes(db, since, limit)
+    finally:
+        db.close()  # The session stays usable; it checks a connection out again on its next query
+
+
+def feed(rows, since: int) -> dict:
+    """
+    The body of a ChangeFeed response for the rows of 'read_changes'.
+    """
+    return {
+        "changes": [
+            {
+                "position": row.position,
+                "type": row.change_type,
+                "claim_id": row.claim_id,
+                "version": row.claim_version,
+                "occurred_at": row.occurred_at,
+                "claim": json.loads(row.claim),
+            }
+            for row in rows
+        ],
+        "next_since": rows[-1].position if rows else since,
+    }
+
+
+def main() -> None:
+    """
+    Entry point of 'python -m app.changes': run the relay (and the purge) until SIGINT/SIGTERM,
+    for deployments that set CHANGE_RELAY_INTERVAL=0 on the API workers.
+    """
+    parser = argparse.ArgumentParser(description="Publish claim events to the change feed")
+    parser.add_argument("--interval", type=float, default=settings.change_relay_interval or 1.0, help="Seconds between relay runs")
+    parser.add_argument("--batch-size", type=int, default=settings.change_relay_batch_size, help="Events published per transaction (CHANGE_RELAY_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    from .database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    last_purge = 0.0
+    while not stopping.is_set():
+        try:
+            published = relay(SessionLocal, args.batch_size)
+            if published:
+                logger.info("Published %d claim events", published)
+            now = datetime.utcnow().timestamp()
+            if settings.change_purge_interval > 0 and now - last_purge >= settings.change_purge_interval:
+                with SessionLocal() as db:
+                    purge(db, settings.change_retention_days)
+                last_purge = now
+        except SQLAlchemyError:
+            logger.exception("Relaying claim events failed; retrying")  # Unpublished events stay pending
+        stopping.wait(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,19 @@
 # CRUD operations for interacting with the Claim model (Create, Read, Update, Delete)
 
-from sqlalchemy.orm import Session  # Import Session for interacting with the database
-from . import models, schemas       # Import models and schemas for interacting with DB and validating data
-from datetime import datetime, timezone
+import base64                       # Used to encode pagination cursors as URL-safe strings
+import hashlib                      # Fingerprints of idempotent requests
+import json
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, or_, select, tuple_, update  # Single-statement writes with RETURNING, streaming reads and keyset pagination
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload  # Import Session for interacting with the database, and the loader for claim lines
+from sqlalchemy.orm.attributes import set_committed_value  # Hands loaded lines to their claims without marking them changed
+from . import cache, fastjson, models, money, schemas, search  # Import the claim cache, the fast JSON encoders, exact amounts, the name search, models and schemas for interacting with DB and validating data
+from . import changes as change_feed  # Outbox of claim changes ('changes' is also patch_claim's argument)
+from . import replicas  # Whether a session reads from a replica
+from .export import EXPORT_COLUMNS  # Columns written by the streaming export
+from datetime import datetime, timedelta, timezone
 
 submitted_at = datetime.now(timezone.utc)
 
@@ -20,22 +31,298 @@ def create_claim(db: Session, claim: schemas.ClaimCreate) -> models.Claim:
         claimant_name=claim.claimant_name,  # Map the 'client_name' from the schema to the model's 'claimant_name'
         amount=claim.amount,              # Map the 'amount' from the schema to the model's 'amount'
         status=claim.status.value,        # Convert Enum 'status' to its string value for the model
-        submitted_at=datetime.utcnow()    # Set the current timestamp when the claim is created
+        submitted_at=datetime.utcnow(),   # Set the current timestamp when the claim is created
+        lines=claim_lines(claim),         # Its service lines, inserted right after it with one executemany INSERT
     )
     
     # Add the newly created claim to the database session (staging it for commit)
     db.add(db_claim)  
+
+    # Send the INSERT now (without committing) so the claim has its 'id' for the change event,
+    # which is written in the same transaction (see changes.py)
+    db.flush()
+    change_feed.record(db, schemas.ChangeType.created, [db_claim])
     
-    # Commit the changes to the database, which saves the new claim record
+    # Commit the changes to the database, which saves the new claim record, its lines and its event
     db.commit()  
     
-    # Refresh the db_claim instance to load DB-generated fields like 'id'
+    # Refresh the db_claim instance to load DB-generated fields like 'id', then its lines (one SELECT for all of them)
     db.refresh(db_claim)  
+    db.refresh(db_claim, ["lines"])
     
     # Return the newly created claim object with its 'id' and other fields
     return db_claim  
 
 
+def claim_lines(claim: schemas.ClaimCreate) -> list[models.ClaimLine]:
+    """
+    The ClaimLine objects of a new claim, numbered from 1 in the order they were sent.
+    """
+    return [models.ClaimLine(line_number=number, **line.model_dump()) for number, line in enumerate(claim.lines, 1)]
+
+
+def claim_line_rows(created: list, claims: list[schemas.ClaimCreate]) -> list[dict]:
+    """
+    Parameter dicts for 'claim_lines_insert_statement': the lines of 'claims', keyed to the rows 'bulk_insert_statement'
+    returned for them (same order).
+    """
+    return [
+        {"claim_id": row.id, "line_number": number, **line.model_dump()}
+        for row, claim in zip(created, claims)
+        for number, line in enumerate(claim.lines, 1)
+    ]
+
+
+def claim_lines_insert_statement():
+    return insert(models.ClaimLine.__table__)
+
+
+def insert_claim_lines(db: Session, created: list, claims: list[schemas.ClaimCreate]) -> None:
+    """
+    INSERT the lines of claims just inserted with 'bulk_insert_statement', in the same transaction.
+    One executemany for all of them, however many claims and lines there are.
+    """
+    rows = claim_line_rows(created, claims)
+    if rows:
+        db.execute(claim_lines_insert_statement(), rows)
+
+
+# -----------------------------
+# Create many claims at once (bulk ingestion)
+# -----------------------------
+BULK_CHUNK_SIZE = 1000  # Rows written per INSERT ... RETURNING and per transaction
+MAX_BULK_CLAIMS = 10000  # Upper bound on records accepted by a single bulk request
+
+
+def create_claims_bulk(
+    db: Session, claims: list[schemas.ClaimCreate], chunk_size: int = BULK_CHUNK_SIZE
+) -> tuple[list, list[tuple[int, str]]]:
+    """
+    Insert many already-validated claims using multi-row INSERT ... RETURNING, one transaction per chunk.
+    Returns the created rows (in input order) and a list of (index, error message) for rows the DB rejected.
+    A failing chunk is retried row by row, so one bad row doesn't abort the rest of the batch.
+    """
+    stmt = bulk_insert_statement()
+    rows = bulk_insert_rows(claims)
+
+    created, failed = [], []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            # executemany with RETURNING is sent as batched multi-row INSERT statements
+            inserted = db.execute(stmt, chunk).all()
+            insert_claim_lines(db, inserted, claims[start:start + chunk_size])
+            change_feed.record(db, schemas.ChangeType.created, inserted)
+            db.commit()
+            created.extend(inserted)
+        except SQLAlchemyError:
+            db.rollback()
+            # Isolate the bad rows: each row gets its own savepoint inside a single transaction
+            for offset, row in enumerate(chunk):
+                try:
+                    with db.begin_nested():
+                        inserted = db.execute(stmt, [row]).all()
+                        insert_claim_lines(db, inserted, [claims[start + offset]])
+                        change_feed.record(db, schemas.ChangeType.created, inserted)
+                    created.extend(inserted)
+                except SQLAlchemyError as exc:
+                    failed.append((start + offset, str(getattr(exc, "orig", None) or exc)))
+            db.commit()
+
+    return created, failed
+
+
+def bulk_insert_statement():
+    """
+    Core INSERT ... RETURNING statement used by the bulk paths.
+    """
+    table = models.Claim.__table__
+    # RETURNING gives back the generated ids in the same order as the input rows
+    return insert(table).returning(*table.c, sort_by_parameter_order=True)
+
+
+def bulk_insert_rows(claims: list[schemas.ClaimCreate]) -> list[dict]:
+    """
+    Map validated claims to plain parameter dicts for 'bulk_insert_statement'.
+    """
+    now = datetime.utcnow()  # One submission timestamp for the whole batch
+    return [
+        {
+            "claimant_name": claim.claimant_name,
+            "amount": claim.amount,
+            "status": claim.status.value,
+            "submitted_at": now,
+        }
+        for claim in claims
+    ]
+
+
+# -----------------------------
+# Create a claim once per Idempotency-Key (client retries)
+# -----------------------------
+class IdempotencyKeyReused(ValueError):
+    """
+    The Idempotency-Key was already used for a different claim.
+    """
+
+
+class IdempotencyKeyConflict(ValueError):
+    """
+    The Idempotency-Key was used before, but its claim can't be returned (it was deleted since).
+    """
+
+
+def create_claim_idempotent(db: Session, claim: schemas.ClaimCreate, key: str, ttl: int) -> tuple:
+    """
+    Create a claim unless 'key' was already used in the last 'ttl' seconds, in which case the claim
+    created by the first request is returned instead. Returns (claim row, True if it was a replay).
+    A new claim and its key are written in the same transaction, so a claim never exists without its key.
+    """
+    request_hash = claim_request_hash(claim)
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=ttl)
+
+    # Retries are answered with one primary-key probe (joined to the claim)
+    found = db.execute(idempotency_lookup_statement(key, cutoff)).first()
+    if found is not None:
+        return replayed_claim(found, request_hash), True
+
+    db_claim = db.execute(bulk_insert_statement(), bulk_insert_rows([claim])).first()
+    insert_claim_lines(db, [db_claim], [claim])
+    stored = db.execute(store_idempotency_key_statement(
+        db.get_bind().dialect.name, key, db_claim.id, request_hash, now, cutoff
+    )).first()
+    if stored is None:
+        # A concurrent request with the same key committed first: drop this claim and answer with theirs
+        db.rollback()
+        found = db.execute(idempotency_lookup_statement(key, cutoff)).first()
+        return replayed_claim(found, request_hash), True
+
+    change_feed.record(db, schemas.ChangeType.created, [db_claim])
+    db.commit()
+    return db_claim, False
+
+
+def claim_request_hash(claim: schemas.ClaimCreate) -> str:
+    """
+    Fingerprint of the validated claim (insensitive to JSON formatting and key order).
+    """
+    return hashlib.sha256(json.dumps(claim.model_dump(mode="json"), sort_keys=True).encode()).hexdigest()
+
+
+def replayed_claim(found, request_hash: str):
+    """
+    Check a stored key against the retried request and return its claim row.
+    """
+    if found is None or found.id is None:
+        raise IdempotencyKeyConflict("The claim created with this Idempotency-Key no longer exists")
+    if found.request_hash != request_hash:
+        raise IdempotencyKeyReused("This Idempotency-Key was already used for a different claim")
+    return found
+
+
+def idempotency_lookup_statement(key: str, cutoff: datetime):
+    """
+    SELECT the unexpired key with the columns of its claim (claim columns are NULL if the claim was deleted).
+    """
+    keys, claims = models.IdempotencyKey.__table__, models.Claim.__table__
+    return (
+        select(keys.c.request_hash, *claims.c)
+        .select_from(keys.outerjoin(claims, claims.c.id == keys.c.claim_id))
+        .where(keys.c.key == key, keys.c.created_at >= cutoff)
+    )
+
+
+def store_idempotency_key_statement(dialect_name: str, key: str, claim_id: int, request_hash: str, now: datetime, cutoff: datetime):
+    """
+    INSERT the key, taking over an expired row with the same key. Returns no row if an unexpired key already exists.
+    """
+    keys = models.IdempotencyKey.__table__
+    stmt = dialect_insert(dialect_name)(keys).values(key=key, claim_id=claim_id, request_hash=request_hash, created_at=now)
+    return stmt.on_conflict_do_update(
+        index_elements=[keys.c.key],
+        set_={"claim_id": stmt.excluded.claim_id, "request_hash": stmt.excluded.request_hash, "created_at": stmt.excluded.created_at},
+        where=keys.c.created_at < cutoff,
+    ).returning(keys.c.key)
+
+
+def purge_idempotency_keys(db: Session, ttl: int, chunk_size: int = 1000) -> int:
+    """
+    Delete keys older than 'ttl' seconds, 'chunk_size' rows per statement and transaction. Returns how many were deleted.
+    """
+    keys = models.IdempotencyKey.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    purged = 0
+    while True:
+        chunk = select(keys.c.key).where(keys.c.created_at < cutoff).limit(chunk_size)
+        deleted = db.execute(delete(keys).where(keys.c.key.in_(chunk))).rowcount
+        db.commit()
+        purged += deleted
+        if deleted < chunk_size:
+            return purged
+
+
+# -----------------------------
+# Write claims taken off the Kafka intake topic (see intake.py)
+# -----------------------------
+def create_intake_claims(db: Session, items: list[tuple[str, schemas.ClaimCreate]]) -> list:
+    """
+    Insert one micro-batch of queued claims with a single multi-row INSERT, in one transaction.
+    Kafka delivers at least once, so a batch can come back after a crash; tracking IDs that were already
+    written are skipped (their row in intake_tracking_ids already exists). Returns the rows actually inserted.
+    """
+    if not items:
+        return []
+    # Record the tracking IDs first (ON CONFLICT DO NOTHING): only the ones that come back are new
+    now = datetime.utcnow()
+    new_ids = set(db.scalars(
+        intake_tracking_insert_statement(db.get_bind().dialect.name),
+        [{"tracking_id": tracking_id, "written_at": now} for tracking_id in dict.fromkeys(t for t, _ in items)],
+    ))
+    fresh = [(tracking_id, claim) for tracking_id, claim in items if tracking_id in new_ids]
+    if not fresh:
+        db.commit()
+        return []
+
+    rows = bulk_insert_rows([claim for _, claim in fresh])
+    for row, (tracking_id, _) in zip(rows, fresh):
+        row["tracking_id"] = tracking_id
+    created = db.execute(bulk_insert_statement(), rows).all()
+    insert_claim_lines(db, created, [claim for _, claim in fresh])
+    change_feed.record(db, schemas.ChangeType.created, created)
+    db.commit()
+    return created
+
+
+def dialect_insert(dialect_name: str):
+    """
+    The 'insert' construct with ON CONFLICT support for the given dialect (PostgreSQL or SQLite).
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    else:
+        raise ValueError(f"ON CONFLICT is not supported on {dialect_name!r}")
+    return upsert
+
+
+def intake_tracking_insert_statement(dialect_name: str):
+    """
+    INSERT INTO intake_tracking_ids ... ON CONFLICT (tracking_id) DO NOTHING RETURNING tracking_id.
+    """
+    table = models.IntakeTrackingId.__table__
+    return dialect_insert(dialect_name)(table).on_conflict_do_nothing(index_elements=[table.c.tracking_id]).returning(table.c.tracking_id)
+
+
+def get_claim_by_tracking_id(db: Session, tracking_id: str):
+    """
+    Fetch the claim written for an intake tracking ID (None while it is still queued, or if the ID is unknown).
+    """
+    table = models.Claim.__table__
+    return db.execute(select(*table.c).where(table.c.tracking_id == tracking_id)).first()
+
+
 # -----------------------------
 # Retrieve all claims from the database
 # -----------------------------
@@ -51,6 +338,228 @@ def get_all_claims(db: Session):
 
 
 
+# -----------------------------
+# Stream every claim in chunks (for exports)
+# -----------------------------
+def stream_claims(db: Session, chunk_size: int = 1000):
+    """
+    Yield lists of plain rows (one list per chunk) covering the whole claims table, ordered by id.
+    Uses a server-side cursor where the driver supports it, so memory stays flat regardless of table size.
+    """
+    stmt = export_statement(chunk_size)
+    result = db.execute(stmt)
+    try:
+        # 'partitions()' hands back one chunk of rows at a time without loading the rest
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def export_statement(chunk_size: int):
+    """
+    SELECT over the exported columns, configured to stream 'chunk_size' rows at a time.
+    """
+    table = models.Claim.__table__
+    return (
+        select(*(table.c[name] for name in EXPORT_COLUMNS))
+        .order_by(table.c.id)
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    )
+
+
+# -----------------------------
+# Keyset pagination helpers
+# -----------------------------
+def encode_cursor(claim: models.Claim) -> str:
+    """
+    Build an opaque cursor pointing just after the given claim in (submitted_at, id) order.
+    """
+    raw = f"{claim.submitted_at.isoformat()}|{claim.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Turn a cursor produced by 'encode_cursor' back into its (submitted_at, id) pair.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        submitted_at, claim_id = raw.split("|")
+        return datetime.fromisoformat(submitted_at), int(claim_id)
+    except Exception as exc:  # bad base64, missing separator, bad date or id
+        raise ValueError("Invalid cursor") from exc
+
+
+def as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    'submitted_at' is stored as naive UTC, so timezone-aware filter values are converted first.
+    """
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# -----------------------------
+# Retrieve one page of claims (keyset pagination + filters)
+# -----------------------------
+DEFAULT_PAGE_SIZE = 100   # Page size used when the client doesn't pass 'limit'
+MAX_PAGE_SIZE = 1000      # Upper bound so a single request can't pull the whole table
+
+
+def get_claims_page(
+    db: Session,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> tuple[list[models.Claim], Optional[str]]:
+    """
+    Fetch one page of claims ordered by (submitted_at, id), applying the optional filters in SQL.
+    Returns the page, with the lines of its claims loaded, and the cursor for the next page (None when this is the last page).
+    """
+    stmt = claims_page_statement(
+        limit, cursor, status, min_amount, max_amount, submitted_from, submitted_to
+    )
+    claims, next_cursor = split_page(db.scalars(stmt).all(), limit)
+    load_lines(db, claims)
+    return claims, next_cursor
+
+
+def load_lines(db: Session, claims: list[models.Claim]) -> None:
+    """
+    Load the lines of a page of claims with one more SELECT (claim_id IN (...)), however many claims are on it.
+    This is what selectinload does, except that selectinload sends at most 500 IDs per SELECT (3 statements for
+    a page of MAX_PAGE_SIZE) and would also load the lines of the extra row 'split_page' drops.
+    """
+    set_lines(claims, db.scalars(claim_lines_statement([claim.id for claim in claims])).all() if claims else [])
+
+
+def set_lines(claims: list[models.Claim], lines: list[models.ClaimLine]) -> None:
+    # Give every claim its loaded lines (in line order), as if a loader had set them
+    by_claim = {}
+    for line in lines:
+        by_claim.setdefault(line.claim_id, []).append(line)
+    for claim in claims:
+        set_committed_value(claim, "lines", by_claim.get(claim.id, []))
+
+
+def get_claims_page_rows(
+    db: Session,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> tuple[list, Optional[str]]:
+    """
+    Same as 'get_claims_page', but returns plain Core rows holding the Claim schema's fields (for fastjson.py).
+    """
+    stmt = claims_page_statement(
+        limit, cursor, status, min_amount, max_amount, submitted_from, submitted_to, columns=fastjson.claim_columns()
+    )
+    return split_page(db.execute(stmt).all(), limit)
+
+
+def claims_page_statement(
+    limit: int,
+    cursor: Optional[str] = None,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+    columns: Optional[list] = None,
+):
+    """
+    Build the SELECT for one page of claims (ORM objects, or just 'columns' if given).
+    Raises ValueError for a malformed cursor.
+    """
+    # Server-side filters; status and the submitted_at window are covered by the composite indexes
+    stmt = (select(*columns) if columns is not None else select(models.Claim)).where(
+        *claim_filter_conditions(status, min_amount, max_amount, submitted_from, submitted_to)
+    )
+
+    # Seek past the last row of the previous page instead of using OFFSET
+    if cursor:
+        last_submitted_at, last_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(models.Claim.submitted_at, models.Claim.id) > (last_submitted_at, last_id),
+            # Implied by the row comparison, but PostgreSQL only prunes partitions on plain submitted_at conditions
+            models.Claim.submitted_at >= last_submitted_at,
+        )
+
+    # Fetch one extra row to find out whether another page exists
+    return stmt.order_by(models.Claim.submitted_at, models.Claim.id).limit(limit + 1)
+
+
+def claim_filter_conditions(
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> list:
+    """
+    WHERE conditions for the optional claim filters (combined with AND).
+    """
+    conditions = []
+    if status is not None:
+        conditions.append(models.Claim.status == status.value)
+    # Amounts are whole cents, so the bounds are rounded inwards to cents (same matches, exact comparison)
+    if min_amount is not None:
+        conditions.append(models.Claim.amount >= money.at_least(min_amount))
+    if max_amount is not None:
+        conditions.append(models.Claim.amount <= money.at_most(max_amount))
+    if submitted_from is not None:
+        conditions.append(models.Claim.submitted_at >= as_naive_utc(submitted_from))
+    if submitted_to is not None:
+        conditions.append(models.Claim.submitted_at < as_naive_utc(submitted_to))
+    return conditions
+
+
+def split_page(rows: list, limit: int) -> tuple[list, Optional[str]]:
+    """
+    Trim the extra row fetched by 'claims_page_statement' and build the next cursor if there was one.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+# -----------------------------
+# Search claims by claimant name (ranked, paginated)
+# -----------------------------
+def search_claims(
+    db: Session,
+    q: str,
+    limit: int = search.SEARCH_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    min_similarity: float = 0.3,
+    fast: bool = False,
+) -> tuple[list, Optional[str]]:
+    """
+    Fetch one page of claims whose claimant name matches 'q' (partially or misspelled), best match first.
+    Returns the page and the cursor for the next page; ORM objects, or Core rows for fastjson.py when 'fast' is set.
+    Raises ValueError for a malformed cursor.
+    """
+    offset = search.decode_search_cursor(cursor) if cursor else 0
+    dialect_name = db.get_bind().dialect.name
+    stmt = search.search_statement(dialect_name, q, limit, offset, columns=fastjson.claim_columns() if fast else None)
+    if stmt is None:
+        return [], None
+    if dialect_name == "postgresql":
+        db.execute(search.similarity_threshold_statement(min_similarity))
+    rows = db.execute(stmt).all() if fast else db.scalars(stmt).all()
+    return search.split_results(rows, limit, offset)
+
+
 # -----------------------------
 # Retrieve a specific claim by ID
 # -----------------------------
@@ -64,45 +573,428 @@ def get_claim_by_id(db: Session, claim_id: int):
     # '.first()' returns the first result that matches or None if not found
 
 
+def get_claim_with_lines(db: Session, claim_id: int) -> Optional[models.Claim]:
+    """
+    Fetch a claim with its lines loaded (two SELECTs, however many lines it has), or None if it doesn't exist.
+    """
+    return db.scalar(select(models.Claim).options(selectinload(models.Claim.lines)).where(models.Claim.id == claim_id))
+
+
+def get_claim_line_rows(db: Session, claims: list) -> dict[int, list]:
+    """
+    The lines of 'claims' (rows or objects with an 'id') as Core rows for fastjson.py, by claim ID.
+    One SELECT for the whole list, like selectinload does for ORM objects.
+    """
+    if not claims:
+        return {}
+    rows = db.execute(claim_lines_statement([claim.id for claim in claims], columns=fastjson.line_columns())).all()
+    return fastjson.lines_by_claim(rows)
+
+
+def with_lines(db: Session, claim) -> dict:
+    """
+    A claim row (as the idempotent create returns it) with its lines, for response_model=schemas.ClaimWithLines.
+    """
+    lines = db.scalars(claim_lines_statement([claim.id])).all()
+    return {**claim._mapping, "lines": lines}
+
+
+# -----------------------------
+# Retrieve a specific claim as JSON, through the claim cache
+# -----------------------------
+def get_claim_json(db: Session, claim_id: int, fast: bool = False) -> Optional[str]:
+    """
+    Return the claim serialized with the ClaimWithLines schema, from the cache when possible. Returns None if not found.
+    """
+    entry = get_claim_entry(db, claim_id, fast)
+    return None if entry is None else entry[0]
+
+
+def get_claim_entry(db: Session, claim_id: int, fast: bool = False) -> Optional[tuple[str, int]]:
+    """
+    Return (the claim serialized with the ClaimWithLines schema, its version), from the cache when possible.
+    On a miss the claim is loaded with 'get_claim_with_lines' and stored in the cache. Returns None if not found.
+    With 'fast', a miss selects a Core row and encodes it with orjson instead (same JSON, see fastjson.py).
+    """
+    cached = cache.claim_cache.get(claim_id)
+    if cached is not None:
+        return split_cache_entry(cached)
+
+    if fast:
+        row = db.execute(fastjson.select_claim_row(claim_id)).first()
+        if row is None:
+            return None
+        body, version = fastjson.encode_claim(row, get_claim_line_rows(db, [row]).get(row.id, [])).decode(), row.version
+    else:
+        db_claim = get_claim_with_lines(db, claim_id)
+        if db_claim is None:
+            return None  # Missing claims aren't cached, so a later create is seen right away
+        body, version = schemas.ClaimWithLines.model_validate(db_claim, from_attributes=True).model_dump_json(), db_claim.version
+
+    # A replica can be behind a write that already dropped the entry: caching its copy would make it outlive the lag
+    if not replicas.reads_from_replica(db):
+        cache.claim_cache.set(claim_id, cache_entry(body, version))
+    return body, version
+
+
+def cache_entry(body: str, version: int) -> str:
+    # Entries are "<version> <json>", so the ETag comes with the body
+    return f"{version} {body}"
+
+
+def split_cache_entry(cached: str) -> tuple[str, int]:
+    version, _, body = cached.partition(" ")
+    return body, int(version)
+
+
 # -----------------------------
 # Update a claim in the database by its ID
 # -----------------------------
-def update_claim(db: Session, claim_id: int, updated_data: schemas.ClaimUpdate):
+class StaleClaimVersion(ValueError):
+    """
+    The claim exists, but it was changed since the client read it (its version isn't one the client expected).
+    """
+
+    def __init__(self, current_version: int):
+        super().__init__(f"The claim is at version {current_version}")
+        self.current_version = current_version
+
+
+class ClaimLinesMismatch(ValueError):
+    """
+    The new amount isn't what the claim's service lines add up to (lines are set at creation, so the amount stays with them).
+    """
+
+    def __init__(self, lines_total):
+        super().__init__(f"The claim's service lines add up to {lines_total}; its amount can't be changed to anything else")
+        self.lines_total = lines_total
+
+
+def update_claim(db: Session, claim_id: int, updated_data: schemas.ClaimUpdate, expected_versions: Optional[list[int]] = None):
+    """
+    Replace the fields of an existing claim with a single UPDATE ... RETURNING statement.
+    Returns the updated row, or None if no claim has this ID (see 'patch_claim' for 'expected_versions').
+    """
+    return patch_claim(db, claim_id, {
+        "claimant_name": updated_data.claimant_name,
+        "amount": updated_data.amount,
+        "status": updated_data.status,
+    }, expected_versions)
+
+
+# -----------------------------
+# Partially update a claim (only the given columns)
+# -----------------------------
+def patch_claim(db: Session, claim_id: int, changes: dict, expected_versions: Optional[list[int]] = None):
     """
-    Update an existing claim in the database by its ID with the provided updated data.
+    Update only the columns in 'changes' with a single UPDATE ... RETURNING statement, incrementing the version.
+    Returns the updated row, or None if no claim has this ID.
+    With 'expected_versions' (from If-Match) the claim is only changed if its version is one of them;
+    otherwise StaleClaimVersion is raised. The check is in the UPDATE's WHERE clause, so no lock is taken beforehand.
+    A new amount must still be the sum of the claim's line charges (if it has lines), or ClaimLinesMismatch is raised.
     """
-    # Query the 'Claim' table and filter by the claim's 'id' to find the claim to update
-    db_claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()
+    if not changes:
+        # Nothing to write; just return the current row
+        db_claim = db.execute(select_claim_statement(claim_id)).first()
+        if db_claim is not None and expected_versions is not None and db_claim.version not in expected_versions:
+            raise StaleClaimVersion(db_claim.version)
+        return db_claim
 
-    # Check if the claim was found in the database
-    if db_claim:
-        # Update the fields of the found claim using the provided updated data
-        db_claim.claimant_name = updated_data.claimant_name  # Corrected: 'client_name' → 'claimant_name'
-        db_claim.amount = updated_data.amount                # Set the 'amount' to the new value
-        db_claim.status = updated_data.status.value          # Convert the Enum 'status' to a string and update
-        db.commit()                                          # Save the changes to the database
-        db.refresh(db_claim)                                 # Refresh the claim object to get updated data from DB
+    # The UPDATE both changes the row and sends it back, so there's no SELECT before or refresh after
+    db_claim = db.execute(update_claim_statement(claim_id, changes, expected_versions)).first()
+    missed = None
+    if db_claim is not None:
+        change_feed.record(db, schemas.ChangeType.updated, [db_claim])
+    elif expected_versions is not None or "amount" in changes:
+        # Only when the conditional write missed: tell a missing claim (404) from a changed one (412)
+        # and from an amount its lines don't add up to (409)
+        missed = db.execute(update_missed_statement(claim_id)).first()
+    db.commit()
+    check_update_missed(missed, expected_versions)
+    if db_claim is not None:
+        cache.claim_cache.delete(claim_id)  # Drop the cached copy; the next read reloads it
 
     # Return the updated claim (or None if not found)
     return db_claim
 
+
+def check_claim_version(current_version: Optional[int]) -> None:
+    """
+    Raise StaleClaimVersion if a conditional write found no row although the claim exists (its current version).
+    Called after the transaction ends, so a failed write holds nothing.
+    """
+    if current_version is not None:
+        raise StaleClaimVersion(current_version)
+
+
 # -----------------------------
 # Delete a claim by ID
 # -----------------------------
-def delete_claim(db: Session, claim_id: int):
+def delete_claim(db: Session, claim_id: int, expected_versions: Optional[list[int]] = None):
     """
-    Delete a claim from the database by its ID.
+    Delete a claim with a single DELETE ... RETURNING statement.
+    Returns the deleted row, or None if no claim has this ID. Raises StaleClaimVersion like 'patch_claim'.
     """
-    # Query the 'Claim' table and filter by 'id' to find the claim to delete
-    db_claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()
-    
-    # Check if the claim was found in the database
-    if db_claim:
-        # If found, delete the claim from the session (marks it for deletion)
-        db.delete(db_claim)  
-        
-        # Commit the changes to the database, which removes the claim permanently
-        db.commit()  
+    db_claim = db.execute(delete_claim_statement(claim_id, expected_versions)).first()
+    current_version = None
+    if db_claim is not None:
+        change_feed.record(db, schemas.ChangeType.deleted, [db_claim])
+        db.execute(delete_claim_lines_statement([claim_id]))  # Its lines go with it, in the same transaction
+        db.execute(delete_claim_attachments_statement([claim_id]))  # And its attachments (the files stay in the store)
+    elif expected_versions is not None:
+        current_version = db.execute(select_claim_version_statement(claim_id)).scalar()
+    db.commit()
+    check_claim_version(current_version)
+    if db_claim is not None:
+        # Drop the cached copy so the deleted claim isn't served any more
+        cache.claim_cache.delete(claim_id)
 
     # Return the deleted claim (or None if not found)
-    return db_claim  
+    return db_claim
+
+
+# -----------------------------
+# Claim attachments (metadata only; the files are in attachments.store)
+# -----------------------------
+def claim_exists(db: Session, claim_id: int) -> bool:
+    return db.scalar(select(models.Claim.id).where(models.Claim.id == claim_id)) is not None
+
+
+def create_attachment(db: Session, claim_id: int, filename: Optional[str], content_type: str, sha256: str, size: int) -> models.ClaimAttachment:
+    """
+    Record a stored file as an attachment of the claim.
+    """
+    attachment = models.ClaimAttachment(
+        claim_id=claim_id, filename=filename, content_type=content_type, sha256=sha256, size=size, uploaded_at=datetime.utcnow(),
+    )
+    db.add(attachment)
+    db.commit()
+    db.refresh(attachment)
+    return attachment
+
+
+def get_attachments(db: Session, claim_id: int) -> list[models.ClaimAttachment]:
+    return db.scalars(
+        select(models.ClaimAttachment).where(models.ClaimAttachment.claim_id == claim_id).order_by(models.ClaimAttachment.id)
+    ).all()
+
+
+def get_attachment(db: Session, claim_id: int, attachment_id: int) -> Optional[models.ClaimAttachment]:
+    return db.scalar(
+        select(models.ClaimAttachment).where(models.ClaimAttachment.id == attachment_id, models.ClaimAttachment.claim_id == claim_id)
+    )
+
+
+# -----------------------------
+# Single-row statements shared with crud_async.py
+# -----------------------------
+def select_claim_statement(claim_id: int):
+    table = models.Claim.__table__
+    return select(*table.c).where(table.c.id == claim_id)
+
+
+def select_claim_version_statement(claim_id: int):
+    table = models.Claim.__table__
+    return select(table.c.version).where(table.c.id == claim_id)
+
+
+def claim_lines_statement(claim_ids: list[int], columns: Optional[list] = None):
+    """
+    SELECT the lines of the given claims (ClaimLine objects, or just 'columns'), in claim and line order.
+    """
+    return (
+        (select(*columns) if columns is not None else select(models.ClaimLine))
+        .where(models.ClaimLine.claim_id.in_(claim_ids))
+        .order_by(models.ClaimLine.claim_id, models.ClaimLine.line_number)
+    )
+
+
+def delete_claim_lines_statement(claim_ids: list[int]):
+    """
+    DELETE the lines of the given claims, RETURNING them (the archive keeps them with the claim).
+    """
+    table = models.ClaimLine.__table__
+    return delete(table).where(table.c.claim_id.in_(claim_ids)).returning(*table.c)
+
+
+def delete_claim_attachments_statement(claim_ids: list[int]):
+    """
+    DELETE the attachment rows of the given claims, RETURNING them (the archive keeps them with the claim).
+    The files stay in attachments.store: another claim may have the same content.
+    """
+    table = models.ClaimAttachment.__table__
+    return delete(table).where(table.c.claim_id.in_(claim_ids)).returning(*table.c)
+
+
+def claim_conditions(claim_id: int, expected_versions: Optional[list[int]] = None) -> list:
+    # The claim, and with If-Match only at one of the versions the client has seen
+    table = models.Claim.__table__
+    conditions = [table.c.id == claim_id]
+    if expected_versions is not None:
+        conditions.append(table.c.version.in_(expected_versions))
+    return conditions
+
+
+def update_claim_statement(claim_id: int, changes: dict, expected_versions: Optional[list[int]] = None):
+    """
+    UPDATE of the given columns and the version, returning the whole updated row (no row if the ID doesn't exist,
+    its version isn't one of 'expected_versions', or a new amount isn't the sum of the claim's line charges).
+    """
+    table = models.Claim.__table__
+    values = {
+        column: value.value if isinstance(value, schemas.ClaimStatus) else value  # Enum -> stored string
+        for column, value in changes.items()
+    }
+    conditions = claim_conditions(claim_id, expected_versions)
+    if "amount" in changes:
+        # A claim with lines keeps an amount equal to their charges (checked in the same statement, so no lock)
+        lines_total = lines_total_subquery(claim_id)
+        conditions.append(or_(lines_total.is_(None), lines_total == values["amount"]))
+    return (
+        update(table)
+        .where(*conditions)
+        .values(**values, version=table.c.version + 1)
+        .returning(*table.c)
+    )
+
+
+def lines_total_subquery(claim_id: int):
+    # SUM of the claim's line charges (Money, like the amount); NULL if it has no lines
+    line = models.ClaimLine.__table__
+    return select(func.sum(line.c.charge)).where(line.c.claim_id == claim_id).scalar_subquery()
+
+
+def update_missed_statement(claim_id: int):
+    """
+    The claim's version and lines total, after 'update_claim_statement' returned no row (no row: no such claim).
+    """
+    table = models.Claim.__table__
+    return select(table.c.version, lines_total_subquery(claim_id).label("lines_total")).where(table.c.id == claim_id)
+
+
+def check_update_missed(missed, expected_versions: Optional[list[int]]) -> None:
+    """
+    Raise why an update found no row although the claim exists ('missed', from 'update_missed_statement'):
+    StaleClaimVersion if it changed since the client read it, else ClaimLinesMismatch. Called after the transaction ends.
+    """
+    if missed is None:
+        return
+    if expected_versions is not None and missed.version not in expected_versions:
+        raise StaleClaimVersion(missed.version)
+    raise ClaimLinesMismatch(missed.lines_total)
+
+
+def delete_claim_statement(claim_id: int, expected_versions: Optional[list[int]] = None):
+    """
+    DELETE returning the removed row (no row if the ID doesn't exist, or its version isn't one of 'expected_versions').
+    """
+    table = models.Claim.__table__
+    return delete(table).where(*claim_conditions(claim_id, expected_versions)).returning(*table.c)
+
+
+# -----------------------------
+# Batch status transitions (adjudication runs)
+# -----------------------------
+TRANSITION_CHUNK_SIZE = 1000  # Claims changed per UPDATE and per transaction
+
+
+def transition_claims(
+    db: Session, transitions: list[schemas.StatusTransition], chunk_size: int = TRANSITION_CHUNK_SIZE
+) -> dict:
+    """
+    Apply many (id, new status) changes with set-based UPDATEs, one transaction per chunk of IDs.
+    Each UPDATE only touches claims whose current status may move to the target (see schemas.CLAIM_STATUS_TRANSITIONS).
+    Returns the body of a StatusTransitionResult: updated IDs, missing IDs and rejected changes.
+    """
+    table = models.Claim.__table__
+    updated, missing, rejected = [], [], []
+
+    # Claims going to the same status are updated together
+    by_target = {}
+    for item in transitions:
+        by_target.setdefault(item.status, []).append(item.id)
+
+    for target, ids in by_target.items():
+        sources = [source.value for source in schemas.allowed_sources(target)]
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+
+            # One UPDATE for the whole chunk; the status condition enforces the transition table
+            done = set()
+            if sources:
+                rows = db.execute(transition_statement(chunk, target, sources)).all()
+                change_feed.record(db, schemas.ChangeType.updated, rows)
+                done = {row.id for row in rows}
+
+            # Claims that weren't updated either don't exist or are in a status that can't move to the target
+            leftover = [claim_id for claim_id in chunk if claim_id not in done]
+            current = {}
+            if leftover:
+                current = dict(db.execute(current_status_statement(leftover)).all())
+            db.commit()
+
+            sort_transitions(chunk, done, leftover, current, target, updated, missing, rejected)
+            for claim_id in done:
+                cache.claim_cache.delete(claim_id)
+
+    return {"updated": updated, "missing": missing, "rejected": rejected}
+
+
+def transition_statement(ids, target: schemas.ClaimStatus, sources: Optional[list[str]] = None):
+    """
+    UPDATE the claims in 'ids' (a list, or a subquery of IDs) to 'target', RETURNING the whole rows for the change events.
+    With 'sources', only the claims currently in one of those statuses are changed.
+    """
+    table = models.Claim.__table__
+    stmt = update(table).where(table.c.id.in_(ids))
+    if sources is not None:
+        stmt = stmt.where(table.c.status.in_(sources))
+    # Bumping the version outdates the ETags clients hold
+    return stmt.values(status=target.value, version=table.c.version + 1).returning(*table.c)
+
+
+def current_status_statement(ids: list[int]):
+    table = models.Claim.__table__
+    return select(table.c.id, table.c.status).where(table.c.id.in_(ids))
+
+
+def sort_transitions(chunk, done, leftover, current, target, updated, missing, rejected) -> None:
+    # Add the outcome of one chunk of 'transition_claims' to the lists of its result
+    updated.extend(claim_id for claim_id in chunk if claim_id in done)
+    for claim_id in leftover:
+        if claim_id in current:
+            rejected.append({"id": claim_id, "from_status": current[claim_id], "to_status": target})
+        else:
+            missing.append(claim_id)
+
+
+def transition_matching_claims(
+    db: Session, claim_filter: schemas.ClaimFilter, target: schemas.ClaimStatus, chunk_size: int = TRANSITION_CHUNK_SIZE
+) -> dict:
+    """
+    Move every claim matching 'claim_filter' to 'target', in chunks of 'chunk_size' claims per UPDATE and transaction.
+    Claims whose current status can't move to the target are left alone.
+    """
+    sources = [source.value for source in schemas.allowed_sources(target)]
+    chunk = matching_chunk_statement(claim_filter, sources, chunk_size)
+
+    updated = []
+    while sources:
+        rows = db.execute(transition_statement(chunk, target)).all()
+        change_feed.record(db, schemas.ChangeType.updated, rows)
+        db.commit()
+        done = [row.id for row in rows]
+        updated.extend(done)
+        for claim_id in done:
+            cache.claim_cache.delete(claim_id)
+        if len(done) < chunk_size:
+            break
+
+    return {"updated": sorted(updated)}
+
+
+def matching_chunk_statement(claim_filter: schemas.ClaimFilter, sources: list[str], chunk_size: int):
+    # The next chunk by primary key; claims already moved no longer match the status condition
+    table = models.Claim.__table__
+    conditions = claim_filter_conditions(**claim_filter.model_dump()) + [table.c.status.in_(sources)]
+    return select(table.c.id).where(*conditions).order_by(table.c.id).limit(chunk_size)
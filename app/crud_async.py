@@ -0,0 +1,558 @@
+# Async CRUD operations for the Claim model (used when CLAIMS_DB_MODE=async)
+# Each function mirrors the one with the same name in crud.py, using an AsyncSession instead of a Session.
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import cache, fastjson, models, replicas, schemas, search, stats
+from . import changes as change_feed  # Outbox of claim changes ('changes' is also patch_claim's argument)
+from .crud import (
+    BULK_CHUNK_SIZE,
+    DEFAULT_PAGE_SIZE,
+    TRANSITION_CHUNK_SIZE,
+    StaleClaimVersion,
+    bulk_insert_rows,
+    bulk_insert_statement,
+    cache_entry,
+    check_claim_version,
+    check_update_missed,
+    claim_line_rows,
+    claim_lines,
+    claim_lines_insert_statement,
+    claim_lines_statement,
+    claim_request_hash,
+    claims_page_statement,
+    current_status_statement,
+    delete_claim_attachments_statement,
+    delete_claim_lines_statement,
+    delete_claim_statement,
+    export_statement,
+    idempotency_lookup_statement,
+    matching_chunk_statement,
+    replayed_claim,
+    select_claim_statement,
+    select_claim_version_statement,
+    set_lines,
+    sort_transitions,
+    split_cache_entry,
+    split_page,
+    store_idempotency_key_statement,
+    transition_statement,
+    update_claim_statement,
+    update_missed_statement,
+)
+
+
+# -----------------------------
+# Create a new claim in the database
+# -----------------------------
+async def create_claim(db: AsyncSession, claim: schemas.ClaimCreate) -> models.Claim:
+    """
+    Create a new claim and return it with its generated 'id'.
+    """
+    db_claim = models.Claim(
+        claimant_name=claim.claimant_name,
+        amount=claim.amount,
+        status=claim.status.value,
+        submitted_at=datetime.utcnow(),
+        lines=claim_lines(claim),  # Inserted right after the claim with one executemany INSERT
+    )
+    db.add(db_claim)
+    await db.flush()  # The 'id' for the change event, written in the same transaction
+    await record_changes(db, schemas.ChangeType.created, [db_claim])
+    await db.commit()
+    await db.refresh(db_claim)  # Load DB-generated fields like 'id'
+    await db.refresh(db_claim, ["lines"])
+    return db_claim
+
+
+async def insert_claim_lines(db: AsyncSession, created: list, claims: list[schemas.ClaimCreate]) -> None:
+    """
+    Async version of crud.insert_claim_lines: one executemany for the lines of all the claims.
+    """
+    rows = claim_line_rows(created, claims)
+    if rows:
+        await db.execute(claim_lines_insert_statement(), rows)
+
+
+# -----------------------------
+# Create a claim once per Idempotency-Key (client retries)
+# -----------------------------
+async def create_claim_idempotent(db: AsyncSession, claim: schemas.ClaimCreate, key: str, ttl: int) -> tuple:
+    """
+    Async version of crud.create_claim_idempotent: returns (claim row, True if it was a replay).
+    """
+    request_hash = claim_request_hash(claim)
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=ttl)
+
+    found = (await db.execute(idempotency_lookup_statement(key, cutoff))).first()
+    if found is not None:
+        return replayed_claim(found, request_hash), True
+
+    db_claim = (await db.execute(bulk_insert_statement(), bulk_insert_rows([claim]))).first()
+    await insert_claim_lines(db, [db_claim], [claim])
+    stored = (await db.execute(store_idempotency_key_statement(
+        db.get_bind().dialect.name, key, db_claim.id, request_hash, now, cutoff
+    ))).first()
+    if stored is None:
+        # A concurrent request with the same key committed first: drop this claim and answer with theirs
+        await db.rollback()
+        found = (await db.execute(idempotency_lookup_statement(key, cutoff))).first()
+        return replayed_claim(found, request_hash), True
+
+    await record_changes(db, schemas.ChangeType.created, [db_claim])
+    await db.commit()
+    return db_claim, False
+
+
+# -----------------------------
+# Create many claims at once (bulk ingestion)
+# -----------------------------
+async def create_claims_bulk(
+    db: AsyncSession, claims: list[schemas.ClaimCreate], chunk_size: int = BULK_CHUNK_SIZE
+) -> tuple[list, list[tuple[int, str]]]:
+    """
+    Async version of crud.create_claims_bulk: multi-row INSERT ... RETURNING, one transaction per chunk.
+    """
+    stmt = bulk_insert_statement()
+    rows = bulk_insert_rows(claims)
+
+    created, failed = [], []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            inserted = (await db.execute(stmt, chunk)).all()
+            await insert_claim_lines(db, inserted, claims[start:start + chunk_size])
+            await record_changes(db, schemas.ChangeType.created, inserted)
+            await db.commit()
+            created.extend(inserted)
+        except SQLAlchemyError:
+            await db.rollback()
+            # Isolate the bad rows: each row gets its own savepoint inside a single transaction
+            for offset, row in enumerate(chunk):
+                try:
+                    async with db.begin_nested():
+                        inserted = (await db.execute(stmt, [row])).all()
+                        await insert_claim_lines(db, inserted, [claims[start + offset]])
+                        await record_changes(db, schemas.ChangeType.created, inserted)
+                    created.extend(inserted)
+                except SQLAlchemyError as exc:
+                    failed.append((start + offset, str(getattr(exc, "orig", None) or exc)))
+            await db.commit()
+
+    return created, failed
+
+
+# -----------------------------
+# Stream every claim in chunks (for exports)
+# -----------------------------
+async def stream_claims(db: AsyncSession, chunk_size: int = 1000):
+    """
+    Async version of crud.stream_claims: yields lists of plain rows, one list per chunk.
+    """
+    result = await db.stream(export_statement(chunk_size))
+    try:
+        async for rows in result.partitions():
+            yield rows
+    finally:
+        await result.close()
+
+
+# -----------------------------
+# Retrieve one page of claims (keyset pagination + filters)
+# -----------------------------
+async def get_claims_page(
+    db: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> tuple[list[models.Claim], Optional[str]]:
+    """
+    Fetch one page of claims with their lines, and the cursor for the next page (None when this is the last page).
+    """
+    stmt = claims_page_statement(
+        limit, cursor, status, min_amount, max_amount, submitted_from, submitted_to
+    )
+    claims, next_cursor = split_page((await db.scalars(stmt)).all(), limit)
+    await load_lines(db, claims)
+    return claims, next_cursor
+
+
+async def load_lines(db: AsyncSession, claims: list[models.Claim]) -> None:
+    """
+    Load the lines of a page of claims with one more SELECT (see crud.load_lines).
+    """
+    set_lines(claims, (await db.scalars(claim_lines_statement([claim.id for claim in claims]))).all() if claims else [])
+
+
+async def get_claims_page_rows(
+    db: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> tuple[list, Optional[str]]:
+    """
+    Same as 'get_claims_page', but returns plain Core rows for fastjson.py.
+    """
+    stmt = claims_page_statement(
+        limit, cursor, status, min_amount, max_amount, submitted_from, submitted_to, columns=fastjson.claim_columns()
+    )
+    return split_page((await db.execute(stmt)).all(), limit)
+
+
+# -----------------------------
+# Search claims by claimant name
+# -----------------------------
+async def search_claims(
+    db: AsyncSession,
+    q: str,
+    limit: int = search.SEARCH_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    min_similarity: float = 0.3,
+    fast: bool = False,
+) -> tuple[list, Optional[str]]:
+    """
+    One ranked page of claims whose claimant name matches 'q' (see crud.search_claims).
+    """
+    offset = search.decode_search_cursor(cursor) if cursor else 0
+    dialect_name = db.get_bind().dialect.name
+    stmt = search.search_statement(dialect_name, q, limit, offset, columns=fastjson.claim_columns() if fast else None)
+    if stmt is None:
+        return [], None
+    if dialect_name == "postgresql":
+        await db.execute(search.similarity_threshold_statement(min_similarity))
+    rows = (await db.execute(stmt)).all() if fast else (await db.scalars(stmt)).all()
+    return search.split_results(rows, limit, offset)
+
+
+# -----------------------------
+# Retrieve a specific claim by ID
+# -----------------------------
+async def get_claim_by_id(db: AsyncSession, claim_id: int):
+    """
+    Fetch a specific claim by its ID with its lines loaded, or None if it doesn't exist.
+    """
+    return await db.get(models.Claim, claim_id, options=[selectinload(models.Claim.lines)])
+
+
+async def get_claim_row(db: AsyncSession, claim_id: int):
+    """
+    Fetch a claim as a plain Core row for fastjson.py, or None if it doesn't exist.
+    """
+    return (await db.execute(fastjson.select_claim_row(claim_id))).first()
+
+
+async def get_claim_line_rows(db: AsyncSession, claims: list) -> dict[int, list]:
+    """
+    The lines of 'claims' as Core rows for fastjson.py, by claim ID (one SELECT, see crud.get_claim_line_rows).
+    """
+    if not claims:
+        return {}
+    rows = (await db.execute(claim_lines_statement([claim.id for claim in claims], columns=fastjson.line_columns()))).all()
+    return fastjson.lines_by_claim(rows)
+
+
+async def with_lines(db: AsyncSession, claim) -> dict:
+    """
+    A claim row with its lines (see crud.with_lines).
+    """
+    lines = (await db.scalars(claim_lines_statement([claim.id]))).all()
+    return {**claim._mapping, "lines": lines}
+
+
+# -----------------------------
+# Retrieve a specific claim as JSON, through the claim cache
+# -----------------------------
+async def get_claim_entry(db: AsyncSession, claim_id: int, fast: bool = False) -> Optional[tuple[str, int]]:
+    """
+    Async version of crud.get_claim_entry: (the claim serialized with the ClaimWithLines schema, its version),
+    from the cache when possible, else loaded and stored in the cache. Returns None if not found.
+    """
+    cached = await _cache_call(cache.claim_cache.get, claim_id)
+    if cached is not None:
+        return split_cache_entry(cached)
+
+    if fast:
+        row = await get_claim_row(db, claim_id)
+        if row is None:
+            return None
+        lines = await get_claim_line_rows(db, [row])
+        body, version = fastjson.encode_claim(row, lines.get(row.id, [])).decode(), row.version
+    else:
+        db_claim = await get_claim_by_id(db, claim_id)
+        if db_claim is None:
+            return None  # Missing claims aren't cached, so a later create is seen right away
+        body, version = schemas.ClaimWithLines.model_validate(db_claim, from_attributes=True).model_dump_json(), db_claim.version
+
+    # As in crud.get_claim_entry: a replica's copy may predate a write that already dropped the entry
+    if not replicas.reads_from_replica(db):
+        await _cache_call(cache.claim_cache.set, claim_id, cache_entry(body, version))
+    return body, version
+
+
+# -----------------------------
+# Update a claim in the database by its ID
+# -----------------------------
+async def update_claim(db: AsyncSession, claim_id: int, updated_data: schemas.ClaimUpdate, expected_versions: Optional[list[int]] = None):
+    """
+    Replace the fields of a claim with one UPDATE ... RETURNING. Returns the updated row, or None if not found.
+    """
+    return await patch_claim(db, claim_id, {
+        "claimant_name": updated_data.claimant_name,
+        "amount": updated_data.amount,
+        "status": updated_data.status,
+    }, expected_versions)
+
+
+# -----------------------------
+# Partially update a claim (only the given columns)
+# -----------------------------
+async def patch_claim(db: AsyncSession, claim_id: int, changes: dict, expected_versions: Optional[list[int]] = None):
+    """
+    Update only the columns in 'changes' with one UPDATE ... RETURNING. Returns the updated row, or None if not found.
+    Raises StaleClaimVersion if the claim's version isn't one of 'expected_versions', and ClaimLinesMismatch
+    for an amount its lines don't add up to (see crud.patch_claim).
+    """
+    if not changes:
+        db_claim = (await db.execute(select_claim_statement(claim_id))).first()
+        if db_claim is not None and expected_versions is not None and db_claim.version not in expected_versions:
+            raise StaleClaimVersion(db_claim.version)
+        return db_claim
+
+    db_claim = (await db.execute(update_claim_statement(claim_id, changes, expected_versions))).first()
+    missed = None
+    if db_claim is not None:
+        await record_changes(db, schemas.ChangeType.updated, [db_claim])
+    elif expected_versions is not None or "amount" in changes:
+        missed = (await db.execute(update_missed_statement(claim_id))).first()
+    await db.commit()
+    check_update_missed(missed, expected_versions)
+    if db_claim is not None:
+        await _invalidate(claim_id)
+    return db_claim
+
+
+# -----------------------------
+# Delete a claim by ID
+# -----------------------------
+async def delete_claim(db: AsyncSession, claim_id: int, expected_versions: Optional[list[int]] = None):
+    """
+    Delete a claim with one DELETE ... RETURNING. Returns the deleted row, or None if not found.
+    Raises StaleClaimVersion like 'patch_claim'.
+    """
+    db_claim = (await db.execute(delete_claim_statement(claim_id, expected_versions))).first()
+    current_version = None
+    if db_claim is not None:
+        await record_changes(db, schemas.ChangeType.deleted, [db_claim])
+        await db.execute(delete_claim_lines_statement([claim_id]))
+        await db.execute(delete_claim_attachments_statement([claim_id]))
+    elif expected_versions is not None:
+        current_version = (await db.execute(select_claim_version_statement(claim_id))).scalar()
+    await db.commit()
+    check_claim_version(current_version)
+    if db_claim is not None:
+        await _invalidate(claim_id)
+    return db_claim
+
+
+# -----------------------------
+# Claim attachments (metadata only; the files are in attachments.store)
+# -----------------------------
+async def claim_exists(db: AsyncSession, claim_id: int) -> bool:
+    return await db.scalar(select(models.Claim.id).where(models.Claim.id == claim_id)) is not None
+
+
+async def create_attachment(db: AsyncSession, claim_id: int, filename: Optional[str], content_type: str, sha256: str, size: int) -> models.ClaimAttachment:
+    """
+    Record a stored file as an attachment of the claim (see crud.create_attachment).
+    """
+    attachment = models.ClaimAttachment(
+        claim_id=claim_id, filename=filename, content_type=content_type, sha256=sha256, size=size, uploaded_at=datetime.utcnow(),
+    )
+    db.add(attachment)
+    await db.commit()
+    await db.refresh(attachment)
+    return attachment
+
+
+async def get_attachments(db: AsyncSession, claim_id: int) -> list[models.ClaimAttachment]:
+    return (await db.scalars(
+        select(models.ClaimAttachment).where(models.ClaimAttachment.claim_id == claim_id).order_by(models.ClaimAttachment.id)
+    )).all()
+
+
+async def get_attachment(db: AsyncSession, claim_id: int, attachment_id: int) -> Optional[models.ClaimAttachment]:
+    return await db.scalar(
+        select(models.ClaimAttachment).where(models.ClaimAttachment.id == attachment_id, models.ClaimAttachment.claim_id == claim_id)
+    )
+
+
+# -----------------------------
+# Claims written by the Kafka intake consumer
+# -----------------------------
+async def get_claim_by_tracking_id(db: AsyncSession, tracking_id: str):
+    """
+    Fetch the claim written for an intake tracking ID (None while it is still queued, or if the ID is unknown).
+    """
+    table = models.Claim.__table__
+    return (await db.execute(select(*table.c).where(table.c.tracking_id == tracking_id))).first()
+
+
+# -----------------------------
+# Batch status transitions (adjudication runs)
+# -----------------------------
+async def transition_claims(
+    db: AsyncSession, transitions: list[schemas.StatusTransition], chunk_size: int = TRANSITION_CHUNK_SIZE
+) -> dict:
+    """
+    Async version of crud.transition_claims: set-based UPDATEs, one transaction per chunk of IDs.
+    """
+    updated, missing, rejected = [], [], []
+    by_target = {}
+    for item in transitions:
+        by_target.setdefault(item.status, []).append(item.id)
+
+    for target, ids in by_target.items():
+        sources = [source.value for source in schemas.allowed_sources(target)]
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            done = set()
+            if sources:
+                rows = (await db.execute(transition_statement(chunk, target, sources))).all()
+                await record_changes(db, schemas.ChangeType.updated, rows)
+                done = {row.id for row in rows}
+            leftover = [claim_id for claim_id in chunk if claim_id not in done]
+            current = {}
+            if leftover:
+                current = dict((await db.execute(current_status_statement(leftover))).all())
+            await db.commit()
+            sort_transitions(chunk, done, leftover, current, target, updated, missing, rejected)
+            await _invalidate(*done)
+
+    return {"updated": updated, "missing": missing, "rejected": rejected}
+
+
+async def transition_matching_claims(
+    db: AsyncSession, claim_filter: schemas.ClaimFilter, target: schemas.ClaimStatus, chunk_size: int = TRANSITION_CHUNK_SIZE
+) -> dict:
+    """
+    Async version of crud.transition_matching_claims: every matching claim, 'chunk_size' claims per UPDATE and transaction.
+    """
+    sources = [source.value for source in schemas.allowed_sources(target)]
+    chunk = matching_chunk_statement(claim_filter, sources, chunk_size)
+
+    updated = []
+    while sources:
+        rows = (await db.execute(transition_statement(chunk, target))).all()
+        await record_changes(db, schemas.ChangeType.updated, rows)
+        await db.commit()
+        done = [row.id for row in rows]
+        updated.extend(done)
+        await _invalidate(*done)
+        if len(done) < chunk_size:
+            break
+
+    return {"updated": sorted(updated)}
+
+
+# -----------------------------
+# Claim statistics and exact totals (see stats.py)
+# -----------------------------
+async def get_claim_stats(
+    db: AsyncSession,
+    by_status: bool = True,
+    period: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> list[dict]:
+    stmt = stats.claim_stats_statement(by_status, period, submitted_from, submitted_to)
+    return stats.claim_stats_rows(await db.execute(stmt), by_status, period)
+
+
+async def get_claim_totals(
+    db: AsyncSession,
+    by_status: bool = True,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> list[dict]:
+    stmt = stats.claim_totals_statement(by_status, status, min_amount, max_amount, submitted_from, submitted_to)
+    return stats.claim_totals_rows(await db.execute(stmt), by_status)
+
+
+async def reconcile(db: AsyncSession) -> dict:
+    claims_statement, stats_statement = stats.reconcile_statements()
+    return stats.reconciliation(await db.execute(claims_statement), await db.execute(stats_statement))
+
+
+# -----------------------------
+# Reading the change feed (see changes.py)
+# -----------------------------
+async def read_changes(db: AsyncSession, since: int, limit: int = change_feed.FEED_PAGE_SIZE) -> list:
+    """
+    Async version of changes.read_changes. Raises ChangesPurged if some of the events right after 'since' were purged.
+    """
+    rows = (await db.execute(change_feed.read_changes_statement(since, limit))).all()
+    if change_feed.may_be_purged(rows, since):
+        change_feed.check_not_purged(since, await db.scalar(change_feed.purged_through_statement()))
+    return rows
+
+
+async def poll_changes(db: AsyncSession, since: int, limit: int = change_feed.FEED_PAGE_SIZE, wait: float = 0) -> list:
+    """
+    Async version of changes.poll_changes: 'read_changes', waiting up to 'wait' seconds for the first new event.
+    The session gives its connection back to the pool between checks.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        try:
+            rows = await read_changes(db, since, limit)
+        finally:
+            await db.close()  # The session stays usable; it checks a connection out again on its next query
+        remaining = deadline - loop.time()
+        if rows or remaining <= 0:
+            return rows
+        await asyncio.sleep(min(change_feed.POLL_INTERVAL, remaining))
+
+
+async def record_changes(db: AsyncSession, change_type: schemas.ChangeType, claims) -> None:
+    # Async version of changes.record: the events join the current transaction
+    rows = change_feed.event_rows(change_type, claims)
+    if rows:
+        await db.execute(change_feed.record_statement(), rows)
+
+
+async def _cache_call(method, *args):
+    # The Redis client is blocking, so its calls run in a worker thread; the in-process backends answer right away
+    if cache.claim_cache.name == "redis":
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+async def _invalidate(*claim_ids: int):
+    # Drop the cached copies of claims that were just changed
+    if claim_ids:
+        await _cache_call(_delete_cached, claim_ids)
+
+
+def _delete_cached(claim_ids) -> None:
+    for claim_id in claim_ids:
+        cache.claim_cache.delete(claim_id)
@@ -0,0 +1,64 @@
+# ETags and conditional requests on single claims (optimistic concurrency control)
+#
+# Every claim has a 'version' that each write increments, sent as the claim's ETag ("7") by GET, POST, PUT and PATCH.
+# A client that sends it back in If-Match on PUT, PATCH or DELETE only changes the claim if nobody else changed
+# it in the meantime. The check is part of the write itself (UPDATE/DELETE ... WHERE id = ? AND version = ?),
+# so no row lock is held between reading a claim and writing it back; a stale write gets 412 Precondition Failed
+# with the current ETag, and the client reads the claim again and retries.
+#
+# GET /claims/{claim_id} with If-None-Match answers 304 Not Modified when the claim hasn't changed.
+
+import re
+from typing import Optional
+
+from fastapi import HTTPException
+
+from .config import settings
+
+# A strong entity tag holding a version: "7" (If-Match uses the strong comparison, so W/"7" never matches)
+_VERSION_TAG = re.compile(r'"(\d{1,18})"', re.ASCII)
+
+
+def format_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(value: Optional[str]) -> Optional[list[int]]:
+    """
+    The versions listed in an If-Match header, or None when it sets no condition (no header, or '*').
+    Weak or malformed entity tags can't match any version, so they are left out (an empty list fails for every claim).
+    """
+    if value is None or value.strip() == "*":
+        return None
+    return [int(match.group(1)) for match in map(_VERSION_TAG.fullmatch, (tag.strip() for tag in value.split(","))) if match]
+
+
+def not_modified(if_none_match: Optional[str], version: int) -> bool:
+    """
+    True when an If-None-Match header lists the claim's current ETag (weak comparison) or is '*'.
+    """
+    if if_none_match is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or format_etag(version) in tags
+
+
+def write_condition(if_match: Optional[str]) -> Optional[list[int]]:
+    """
+    The versions a PUT, PATCH or DELETE may overwrite (None: any). Raises 428 when REQUIRE_IF_MATCH is on and
+    the request has no If-Match header.
+    """
+    if if_match is None and settings.require_if_match:
+        raise HTTPException(status_code=428, detail="Send the claim's ETag in an If-Match header")
+    return parse_if_match(if_match)
+
+
+def precondition_failed(current_version: int) -> HTTPException:
+    """
+    412 for a write whose If-Match doesn't hold the claim's current version, with the current ETag.
+    """
+    return HTTPException(
+        status_code=412,
+        detail="The claim was changed since it was read; get it again and retry",
+        headers={"ETag": format_etag(current_version)},
+    )
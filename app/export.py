@@ -0,0 +1,100 @@
+# Encoders for the streaming claims export (GET /claims/export)
+# Rows come straight from SQL (no Pydantic objects); values are written the same way as schemas.Claim
+# (amounts are exact Decimals in the rows, written as JSON numbers like the API does).
+
+import csv
+import io
+import json
+
+# Same fields, in the same order, as schemas.Claim
+EXPORT_COLUMNS = ("id", "claimant_name", "amount", "status", "submitted_at")
+
+# Media type sent for each supported format
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _submitted_at(row):
+    # Datetimes are written in ISO 8601, like the JSON API
+    return row.submitted_at.isoformat() if row.submitted_at else None
+
+
+# -----------------------------
+# NDJSON: one JSON object per line
+# -----------------------------
+def claim_object(row) -> dict:
+    """
+    The JSON object of one claim, as schemas.Claim writes it (also the claim in change feed events).
+    """
+    return {
+        "id": row.id,
+        "claimant_name": row.claimant_name,
+        "amount": float(row.amount),
+        "status": row.status,
+        "submitted_at": _submitted_at(row),
+    }
+
+
+def ndjson_chunk(rows) -> str:
+    """
+    Encode one chunk of rows as NDJSON lines.
+    """
+    return "".join(json.dumps(claim_object(row)) + "\n" for row in rows)
+
+
+# -----------------------------
+# CSV: header row, then one row per claim
+# -----------------------------
+def csv_header() -> str:
+    """
+    Return the CSV header line.
+    """
+    return csv_rows([EXPORT_COLUMNS])
+
+
+def csv_chunk(rows) -> str:
+    """
+    Encode one chunk of rows as CSV lines.
+    """
+    return csv_rows(
+        [row.id, row.claimant_name, float(row.amount), row.status, _submitted_at(row) or ""]
+        for row in rows
+    )
+
+
+def csv_rows(values) -> str:
+    # The csv module writes to a file-like object, so collect the chunk in a small buffer
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(values)
+    return buffer.getvalue()
+
+
+# -----------------------------
+# Whole-stream encoders
+# -----------------------------
+def encode(format: str, chunks):
+    """
+    Turn an iterable of row chunks into an iterable of text blocks in the given format.
+    """
+    if format == "csv":
+        yield csv_header()
+        for rows in chunks:
+            yield csv_chunk(rows)
+    else:
+        for rows in chunks:
+            yield ndjson_chunk(rows)
+
+
+async def encode_async(format: str, chunks):
+    """
+    Same as 'encode', for an async iterable of row chunks.
+    """
+    if format == "csv":
+        yield csv_header()
+        async for rows in chunks:
+            yield csv_chunk(rows)
+    else:
+        async for rows in chunks:
+            yield ndjson_chunk(rows)
@@ -0,0 +1,156 @@
+# Per-request timing and SQL instrumentation
+# Every request gets a RequestTimings object (held in a context variable) that the SQLAlchemy cursor events
+# and the pool checkout timer add to. The middleware turns it into a Server-Timing header and /metrics histograms,
+# so a slow request can be split into pool wait, SQL time and everything else (validation, serialization, ...).
+
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+
+from . import metrics
+from .config import settings
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+request_seconds = metrics.registry.register(metrics.Histogram(
+    "http_request_duration_seconds", "Time to produce the response, by route",
+))
+request_sql_seconds = metrics.registry.register(metrics.Histogram(
+    "http_request_sql_seconds", "Time spent executing SQL per request, by route",
+))
+request_sql_statements = metrics.registry.register(metrics.Histogram(
+    "http_request_sql_statements", "SQL statements executed per request, by route",
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+))
+statement_seconds = metrics.registry.register(metrics.Histogram(
+    "db_statement_seconds", "Execution time of single SQL statements",
+))
+slow_queries = metrics.registry.register(metrics.Counter(
+    "db_slow_queries_total", "Statements that took longer than SLOW_QUERY_MS",
+))
+
+
+@dataclass
+class RequestTimings:
+    sql_statements: int = 0
+    sql_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+
+
+# The timings of the request being handled (None outside requests, e.g. in the intake worker).
+# Starlette copies the context into the threadpool, so sync routes add to the same object.
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+def record_pool_wait(seconds: float) -> None:
+    """
+    Called by the pool checkout timer in database.py.
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        timings.pool_wait_seconds += seconds
+
+
+# -----------------------------
+# SQL statement timing (SQLAlchemy cursor events)
+# -----------------------------
+def parameter_shape(parameters) -> str:
+    """
+    Describe bound parameters by type only, so slow-query logs don't leak claimant data.
+    e.g. {'id': int, 'status': str}, or '1000 x {...}' for executemany.
+    """
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"{len(parameters)} x {parameter_shape(parameters[0])}"  # executemany
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()  # One execution context per statement
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    statement_seconds.observe(elapsed)
+
+    timings = current_timings.get()
+    if timings is not None:
+        timings.sql_statements += 1
+        timings.sql_seconds += elapsed
+
+    if settings.slow_query_ms > 0 and elapsed * 1000 >= settings.slow_query_ms:
+        slow_queries.inc()
+        slow_query_logger.warning(
+            "Slow query (%.1f ms): %s params=%s",
+            elapsed * 1000, " ".join(statement.split())[:1000], parameter_shape(parameters),
+        )
+
+
+def instrument_engine(engine) -> None:
+    """
+    Time every statement run on 'engine' (for an AsyncEngine, pass 'async_engine.sync_engine').
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# -----------------------------
+# ASGI middleware
+# -----------------------------
+class TimingMiddleware:
+    """
+    Measures each HTTP request. Adds a Server-Timing header (total, db, pool) when SERVER_TIMING is on,
+    and records the duration, SQL time and statement count per route in /metrics.
+    SQL run while a streaming body is sent (GET /claims/export) counts in /metrics but not in the header,
+    which is sent before the body.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if settings.server_timing:
+                    header = server_timing_header(time.perf_counter() - started, timings)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timings.reset(token)
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": route.path if route is not None else "unmatched"}
+            request_seconds.observe(time.perf_counter() - started, status=status[0], **labels)
+            request_sql_seconds.observe(timings.sql_seconds, **labels)
+            request_sql_statements.observe(timings.sql_statements, **labels)
+
+
+def server_timing_header(total_seconds: float, timings: RequestTimings) -> str:
+    """
+    e.g. 'total;dur=12.4, db;dur=3.1;desc="2 queries", pool;dur=0.0' (durations in milliseconds).
+    """
+    return (
+        f"total;dur={total_seconds * 1000:.1f}, "
+        f'db;dur={timings.sql_seconds * 1000:.1f};desc="{timings.sql_statements} queries", '
+        f"pool;dur={timings.pool_wait_seconds * 1000:.1f}"
+    )
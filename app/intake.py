@@ -0,0 +1,342 @@
+# Kafka-driven claim intake (CLAIMS_INTAKE_MODE=kafka)
+# POST /claims only validates the claim and appends it to a topic, then answers 202 with a tracking ID.
+# The intake worker ('python -m app.intake') drains the topic in micro-batches and writes each batch
+# with one multi-row INSERT, so write throughput no longer depends on how many requests are in flight.
+
+import json
+import logging
+import signal
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import crud, metrics, schemas
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+intake_enqueued = metrics.registry.register(metrics.Counter(
+    "claims_intake_enqueued_total", "Claims accepted by POST /claims and appended to the intake topic"
+))
+intake_failed = metrics.registry.register(metrics.Counter(
+    "claims_intake_enqueue_failures_total", "Claims that couldn't be appended to the intake topic (answered 503)"
+))
+
+
+class IntakeUnavailable(Exception):
+    """
+    Raised when a claim can't be appended to the intake topic (broker down, send timed out, ...).
+    """
+
+
+# -----------------------------
+# In-process broker (tests and local development)
+# -----------------------------
+class InMemoryBroker:
+    """
+    A tiny stand-in for Kafka: append-only topics and committed offsets per consumer group.
+    Like Kafka, records a consumer has read but not committed are delivered again to the next consumer.
+    """
+
+    def __init__(self):
+        self._topics = defaultdict(list)    # topic -> list of (key, value)
+        self._committed = {}                # (group, topic) -> next offset to read
+        self._changed = threading.Condition()
+
+    def producer(self, topic: str) -> "InMemoryProducer":
+        return InMemoryProducer(self, topic)
+
+    def consumer(self, topic: str, group: str) -> "InMemoryConsumer":
+        return InMemoryConsumer(self, topic, group)
+
+    def append(self, topic: str, key: str, value: bytes) -> None:
+        with self._changed:
+            self._topics[topic].append((key, value))
+            self._changed.notify_all()
+
+    def read(self, topic: str, offset: int, max_records: int, timeout: float) -> list[bytes]:
+        with self._changed:
+            self._changed.wait_for(lambda: len(self._topics[topic]) > offset, timeout=timeout)
+            return [value for _, value in self._topics[topic][offset:offset + max_records]]
+
+
+class InMemoryProducer:
+    def __init__(self, broker: InMemoryBroker, topic: str):
+        self.broker, self.topic = broker, topic
+
+    def send(self, key: str, value: bytes) -> None:
+        self.broker.append(self.topic, key, value)
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryConsumer:
+    def __init__(self, broker: InMemoryBroker, topic: str, group: str):
+        self.broker, self.topic, self.group = broker, topic, group
+        self.position = broker._committed.get((group, topic), 0)
+
+    def poll(self, max_records: int, timeout: float) -> list[bytes]:
+        records = self.broker.read(self.topic, self.position, max_records, timeout)
+        self.position += len(records)
+        return records
+
+    def commit(self) -> None:
+        self.broker._committed[(self.group, self.topic)] = self.position
+
+    def rewind(self) -> None:
+        # Go back to the last committed offset, so uncommitted records are read again
+        self.position = self.broker._committed.get((self.group, self.topic), 0)
+
+    def close(self) -> None:
+        pass
+
+
+# -----------------------------
+# Kafka backend (kafka-python, only imported when this mode is used)
+# -----------------------------
+class KafkaIntakeProducer:
+    """
+    Appends claims to the intake topic and waits for the broker's acknowledgement (acks=all),
+    so a 202 is only sent once the claim is stored on every in-sync replica.
+    """
+
+    def __init__(self, bootstrap_servers: str, topic: str, send_timeout: float = 10.0):
+        from kafka import KafkaProducer
+        from kafka.errors import KafkaError
+
+        self.topic, self.send_timeout = topic, send_timeout
+        try:
+            # A short linger lets concurrent requests share one produce request without delaying any of them much
+            self.producer = KafkaProducer(bootstrap_servers=bootstrap_servers.split(","), acks="all", linger_ms=5)
+        except KafkaError as exc:  # e.g. no broker reachable
+            raise IntakeUnavailable(str(exc)) from exc
+
+    def send(self, key: str, value: bytes) -> None:
+        from kafka.errors import KafkaError
+
+        try:
+            self.producer.send(self.topic, key=key.encode(), value=value).get(timeout=self.send_timeout)
+        except KafkaError as exc:
+            raise IntakeUnavailable(str(exc)) from exc
+
+    def close(self) -> None:
+        self.producer.close()
+
+
+class KafkaIntakeConsumer:
+    """
+    Reads the intake topic as part of a consumer group, committing offsets by hand after each batch is written.
+    """
+
+    def __init__(self, bootstrap_servers: str, topic: str, group: str):
+        from kafka import KafkaConsumer
+
+        self.consumer = KafkaConsumer(
+            topic,
+            bootstrap_servers=bootstrap_servers.split(","),
+            group_id=group,
+            enable_auto_commit=False,      # Offsets are committed only once the claims are in the database
+            auto_offset_reset="earliest",
+        )
+
+    def poll(self, max_records: int, timeout: float) -> list[bytes]:
+        batches = self.consumer.poll(timeout_ms=int(timeout * 1000), max_records=max_records)
+        return [record.value for records in batches.values() for record in records]
+
+    def commit(self) -> None:
+        self.consumer.commit()
+
+    def rewind(self) -> None:
+        for partition in self.consumer.assignment():
+            committed = self.consumer.committed(partition)
+            if committed is None:
+                self.consumer.seek_to_beginning(partition)
+            else:
+                self.consumer.seek(partition, committed)
+
+    def close(self) -> None:
+        self.consumer.close()
+
+
+# -----------------------------
+# Producer side, used by POST /claims
+# -----------------------------
+_producer = None
+_producer_lock = threading.Lock()
+
+# Namespace for tracking IDs derived from client Idempotency-Key headers
+INTAKE_KEY_NAMESPACE = uuid.UUID("5b0f6a4e-3c1d-4f7e-9a2b-8d6c1e0f4a37")
+
+
+def get_producer():
+    """
+    Return the process-wide intake producer, connecting to Kafka on first use.
+    """
+    global _producer
+    if _producer is None:
+        with _producer_lock:
+            if _producer is None:
+                _producer = KafkaIntakeProducer(settings.kafka_bootstrap_servers, settings.intake_topic)
+    return _producer
+
+
+def close_producer() -> None:
+    """
+    Flush and close the producer, if one was created (at shutdown).
+    """
+    global _producer
+    if _producer is not None:
+        _producer.close()
+        _producer = None
+
+
+def enqueue_claim(claim: schemas.ClaimCreate, idempotency_key: Optional[str] = None) -> schemas.IntakeReceipt:
+    """
+    Append a validated claim to the intake topic and return its tracking ID.
+    The tracking ID is also the message key and the idempotency key used by the worker.
+    With a client Idempotency-Key the tracking ID is derived from it, so a retried request gets the same
+    tracking ID and its claim is written only once (the first payload wins).
+    Raises IntakeUnavailable if the broker didn't acknowledge the message.
+    """
+    if idempotency_key is not None:
+        tracking_id = str(uuid.uuid5(INTAKE_KEY_NAMESPACE, idempotency_key))
+    else:
+        tracking_id = str(uuid.uuid4())
+    message = {"tracking_id": tracking_id, "claim": claim.model_dump(mode="json")}
+    try:
+        get_producer().send(tracking_id, json.dumps(message).encode())
+    except IntakeUnavailable:
+        intake_failed.inc()
+        raise
+    intake_enqueued.inc()
+    return schemas.IntakeReceipt(tracking_id=tracking_id)
+
+
+# Extra response documented on POST /claims
+INTAKE_RESPONSES = {202: {"model": schemas.IntakeReceipt, "description": "Claim queued (CLAIMS_INTAKE_MODE=kafka)"}}
+
+
+def intake_response(claim: schemas.ClaimCreate, idempotency_key: Optional[str] = None) -> JSONResponse:
+    """
+    The 202 response of POST /claims in Kafka intake mode (503 if the claim couldn't be queued).
+    """
+    try:
+        receipt = enqueue_claim(claim, idempotency_key)
+    except IntakeUnavailable:
+        raise HTTPException(status_code=503, detail="Claim intake is unavailable, try again later")
+    return JSONResponse(receipt.model_dump(), status_code=202)
+
+
+# -----------------------------
+# Consumer side: the intake worker
+# -----------------------------
+class IntakeWorker:
+    """
+    Drains the intake topic in micro-batches: a batch is written as soon as it holds 'batch_size' claims,
+    or 'linger_ms' after its first claim arrived, whichever comes first.
+    Offsets are committed after the batch is committed to the database (at-least-once delivery);
+    the unique tracking ID makes a redelivered batch a no-op.
+    """
+
+    def __init__(
+        self,
+        consumer,
+        session_factory: Callable,
+        batch_size: int = 500,
+        linger_ms: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.consumer, self.session_factory = consumer, session_factory
+        self.batch_size, self.linger = batch_size, linger_ms / 1000
+        self.clock = clock
+        self._stopping = threading.Event()
+
+    def next_batch(self, idle_timeout: float = 1.0) -> list[bytes]:
+        """
+        Wait up to 'idle_timeout' seconds for a first record, then keep reading until the batch is full or lingered long enough.
+        """
+        batch = self.consumer.poll(self.batch_size, idle_timeout)
+        if not batch:
+            return batch
+        deadline = self.clock() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                break
+            batch.extend(self.consumer.poll(self.batch_size - len(batch), remaining))
+        return batch
+
+    def process(self, batch: list[bytes]) -> int:
+        """
+        Write one batch and commit its offsets. Returns the number of claims inserted.
+        Malformed messages are logged and skipped; duplicates (same tracking ID) are written once.
+        """
+        items = {}
+        for value in batch:
+            try:
+                message = json.loads(value)
+                tracking_id = str(message["tracking_id"])
+                claim = schemas.ClaimCreate(**message["claim"])
+            except (ValueError, KeyError, TypeError, ValidationError):
+                logger.warning("Skipping malformed intake message: %r", value[:200])
+                continue
+            items.setdefault(tracking_id, claim)
+
+        db = self.session_factory()
+        try:
+            created = crud.create_intake_claims(db, list(items.items()))
+        finally:
+            db.close()
+        self.consumer.commit()
+
+        logger.info("Intake batch: %d messages, %d claims written", len(batch), len(created))
+        return len(created)
+
+    def run_once(self, idle_timeout: float = 1.0) -> int:
+        batch = self.next_batch(idle_timeout)
+        return self.process(batch) if batch else 0
+
+    def run(self, retry_delay: float = 1.0) -> None:
+        """
+        Process batches until 'stop()' is called. A batch that fails to write is read again after 'retry_delay' seconds.
+        """
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except SQLAlchemyError:
+                logger.exception("Intake batch failed; it will be retried")
+                self.consumer.rewind()
+                self._stopping.wait(retry_delay)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+
+def main() -> None:
+    """
+    Entry point of 'python -m app.intake': run one worker until SIGINT/SIGTERM.
+    Start several (same CLAIMS_INTAKE_GROUP) to spread the topic's partitions over them.
+    """
+    from .database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    consumer = KafkaIntakeConsumer(settings.kafka_bootstrap_servers, settings.intake_topic, settings.intake_group)
+    worker = IntakeWorker(consumer, SessionLocal, settings.intake_batch_size, settings.intake_linger_ms)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    try:
+        worker.run()  # The batch in progress is finished before the loop stops
+    finally:
+        consumer.close()
+
+
+if __name__ == "__main__":
+    main()
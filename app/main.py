@@ -18,147 +18,653 @@
 
 # Import necessary libraries and modules for the FastAPI application
 
-from fastapi import FastAPI, Depends, HTTPException,Body, status  # FastAPI framework for building the API, dependency injection, and HTTP exception handling
+import asyncio  # Runs the blocking pool warm-up off the event loop
+import logging
+import os  # Checks an attachment's file before sending it
+from contextlib import asynccontextmanager  # The app's lifespan hook
+from fastapi import APIRouter, FastAPI, Depends, HTTPException,Body, Header, Query, Request, Response, status  # FastAPI framework for building the API, dependency injection, and HTTP exception handling
+from fastapi.responses import PlainTextResponse, StreamingResponse  # Metrics text, and the export body sent chunk by chunk
+from typing import Any, Optional  # Optional query parameters
+from datetime import datetime  # Used for the submitted_at filters
+from sqlalchemy import text  # Advisory locks of the background jobs
 from sqlalchemy.orm import Session  # SQLAlchemy's Session object for interacting with the database
-from . import models, schemas, crud  # Import the models (ORM), schemas (Pydantic validation), and CRUD functions
-from app.database import SessionLocal, engine  # Import the database session creator and engine for connecting to the DB
+from . import models, schemas, crud, etags, export, fastjson, search  # Import the models (ORM), schemas (Pydantic validation), CRUD functions, ETags, export encoders, the fast JSON path and the name search
+from .config import settings  # Application settings (sync or async mode, ...)
+from app import database  # Pool warm-up and shutdown
+from app.database import get_db  # The one session dependency shared by every route (tests override it)
+from . import metrics, stats  # Prometheus-format metrics, and the pre-aggregated claim statistics
+from . import intake  # Kafka claim intake (CLAIMS_INTAKE_MODE=kafka)
+from . import instrumentation  # Request timing middleware
+from . import partitions  # Monthly partitions of the claims table (PostgreSQL)
+from . import changes  # Change feed of claim events (outbox relay and GET /claims/changes)
+from . import ratelimit  # Per-client rate limits and the in-flight cap
+from . import attachments  # Content-addressed store of claim attachments
 
 
 
-# Create all tables in the database if they don't exist yet. This ensures that the DB schema is updated based on the models defined in 'models.py'.
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# The schema is no longer created here: run 'python -m app.migrate' before starting the app (see migrate.py).
+# Importing this module doesn't open any database connection.
 
-# Initialize the FastAPI application instance
-app = FastAPI()
 
-# Dependency function to get a new DB session per request.
-def get_db():
+# -------------------------------------
+# Startup and shutdown
+# -------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    This function ensures that a new database session is created for each request,
-    and that it is closed after the request has been processed.
+    Open the pool's connections before the first request, and close them at shutdown.
     """
-    db = SessionLocal()  # Open a new session using the SessionLocal object (defined in database.py)
-    try:
-        yield db  # Yield the session to be used in the route functions
-    finally:
-        db.close()  # Close the session after the request is handled to release the connection
+    if settings.db_mode == "async":
+        await database.warm_async_pool(database.warm_count())
+    else:
+        # Connecting blocks, so it runs in a worker thread
+        await asyncio.to_thread(database.warm_pool, database.warm_count())
+    background = []
+    if database.replicas:
+        # Replicas get reads once they pass a lag check
+        await asyncio.to_thread(database.replicas.check_lag)
+        background.append(asyncio.create_task(run_periodically(
+            settings.replica_lag_check_interval, database.replicas.check_lag, "Checking replica lag",
+        )))
+    # Database-wide jobs: one worker at a time runs each of them (see run_exclusively)
+    if settings.idempotency_cleanup_interval > 0:
+        background.append(asyncio.create_task(run_periodically(
+            settings.idempotency_cleanup_interval, purge_expired_idempotency_keys, "Purging expired idempotency keys",
+            JOB_LOCK_KEYS["idempotency_purge"],
+        )))
+    if settings.partition_maintenance_interval > 0:
+        background.append(asyncio.create_task(run_periodically(
+            settings.partition_maintenance_interval, maintain_partitions, "Creating claims partitions",
+            JOB_LOCK_KEYS["partition_maintenance"],
+        )))
+    if settings.change_relay_interval > 0:
+        background.append(asyncio.create_task(run_periodically(
+            settings.change_relay_interval, relay_claim_events, "Publishing claim events",
+            JOB_LOCK_KEYS["change_relay"],
+        )))
+    if settings.change_purge_interval > 0:
+        background.append(asyncio.create_task(run_periodically(
+            settings.change_purge_interval, purge_claim_events, "Purging old claim events",
+            JOB_LOCK_KEYS["change_purge"],
+        )))
+    yield
+    for task in background:
+        task.cancel()
+    intake.close_producer()
+    await database.dispose_engines()
+
+
+# Arbitrary keys for the PostgreSQL advisory locks that let only one worker at a time run each job
+JOB_LOCK_KEYS = {
+    "idempotency_purge": 72194001,
+    "partition_maintenance": 72194002,
+    "change_relay": 72194003,
+    "change_purge": 72194004,
+}
+
+
+async def run_periodically(interval: float, job, description: str, lock_key: Optional[int] = None):
+    """
+    Run the blocking 'job' in a worker thread every 'interval' seconds, for as long as the app runs.
+    Every worker process schedules its own copy; with a 'lock_key', a turn is skipped while another worker
+    (on any host) is running the job.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_exclusively, lock_key, job)
+        except Exception:
+            logger.warning("%s failed", description, exc_info=True)
+
+
+def run_exclusively(lock_key: Optional[int], job):
+    """
+    Run 'job' if no other worker holds the advisory lock 'lock_key', and return its result (None when skipped).
+    The lock is a session lock (pg_try_advisory_lock: it never waits) on a connection of its own, held while the
+    job runs its own transactions. Other databases have no advisory locks: there, every worker runs the job.
+    With a transaction-mode pooler (DB_EXTERNAL_POOLER) session locks don't hold, so set the job intervals to 0
+    and run the jobs on their own instead (e.g. 'python -m app.changes').
+    """
+    if lock_key is None or database.engine.dialect.name != "postgresql":
+        return job()
+    with database.engine.connect() as connection:
+        if not connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": lock_key}).scalar():
+            return None
+        connection.commit()  # The lock outlives the transaction; don't sit idle in one while the job runs
+        try:
+            return job()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": lock_key})
+            connection.commit()
+
+
+def purge_expired_idempotency_keys() -> int:
+    # Deleting the same expired keys twice is harmless
+    with database.SessionLocal() as db:
+        return crud.purge_idempotency_keys(db, settings.idempotency_key_ttl)
+
+
+def maintain_partitions() -> list[str]:
+    # Serialized by an advisory lock; a no-op unless 'claims' is partitioned (PostgreSQL)
+    created = partitions.maintain(database.engine)
+    if created:
+        logger.info("Created claims partitions: %s", ", ".join(created))
+    return created
+
+
+def relay_claim_events() -> int:
+    # The change_feed_state row lock still keeps this from overlapping a 'python -m app.changes' relay
+    return changes.relay(database.SessionLocal, settings.change_relay_batch_size)
+
+
+def purge_claim_events() -> int:
+    with database.SessionLocal() as db:
+        return changes.purge(db, settings.change_retention_days)
+
+
+# Initialize the FastAPI application instance
+app = FastAPI(lifespan=lifespan)
+
+# Time every request: Server-Timing header, per-route metrics and SQL statement counts (see instrumentation.py)
+app.add_middleware(instrumentation.TimingMiddleware)
+
+# Per-client rate limits (429) and the in-flight cap (503), checked outside everything else so a rejected request
+# costs no routing, no dependency and no database session (see ratelimit.py). Both are off by default.
+app.add_middleware(ratelimit.RateLimitMiddleware, routes=app.router.routes)
+
+# Claim routes for the sync mode (plain 'def' handlers with a blocking Session).
+# The async mode registers the same routes from 'async_routes.py' instead; see the bottom of this file.
+router = APIRouter()
+
+# The other routes that use the database (intake lookup, change feed, attachments, status transitions, stats and totals),
+# in both modes. Included ahead of 'router', so paths like /claims/stats aren't read as a claim ID.
+other_router = APIRouter()
 
 
 # -------------------------------------
 # POST route to create a new claim
 # -------------------------------------
-@app.post("/claims", response_model=schemas.Claim, status_code=201)  # The route handles POST requests at /claims and expects a 'Claim' schema as the response.
-def create_claim(claim: schemas.ClaimCreate, db: Session = Depends(get_db)):  # Accept claim data from the request and inject the DB session
+@router.post("/claims", response_model=schemas.ClaimWithLines, status_code=201, responses=intake.INTAKE_RESPONSES)  # The route handles POST requests at /claims and returns the created claim with its lines.
+def create_claim(
+    claim: schemas.ClaimCreate,  # Accept claim data from the request
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", min_length=1, max_length=255),
+    db: Session = Depends(get_db),  # Inject the DB session
+):
     """
-    This endpoint creates a new claim in the database.
+    This endpoint creates a new claim in the database, with its service lines if 'lines' is sent.
+    With an 'Idempotency-Key' header, a retry with the same key returns the claim created the first time
+    (with an 'Idempotent-Replayed: true' header) instead of creating another one.
+    With CLAIMS_INTAKE_MODE=kafka it queues the claim instead and answers 202 with a tracking ID.
     """
+    if settings.intake_mode == "kafka":
+        return intake.intake_response(claim, idempotency_key)
+
+    if idempotency_key is not None:
+        try:
+            db_claim, replayed = crud.create_claim_idempotent(db, claim, idempotency_key, settings.idempotency_key_ttl)
+        except crud.IdempotencyKeyReused as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        except crud.IdempotencyKeyConflict as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        response.headers["ETag"] = etags.format_etag(db_claim.version)
+        return crud.with_lines(db, db_claim)
+
     # Call the 'create_claim' function from 'crud.py', passing in the DB session and the claim data to create a new record.
-    return crud.create_claim(db=db, claim=claim)  # Return the created claim object
+    db_claim = crud.create_claim(db=db, claim=claim)
+    response.headers["ETag"] = etags.format_etag(db_claim.version)  # Send it back in If-Match to update the claim safely
+    return db_claim  # Return the created claim object
+
+
+# -------------------------------------
+# POST route to create many claims in one request
+# -------------------------------------
+@router.post("/claims/bulk", response_model=schemas.BulkClaimResult)
+def create_claims_bulk(
+    records: list[dict[str, Any]] = Body(..., max_length=crud.MAX_BULK_CLAIMS),  # Raw records, validated one by one below
+    db: Session = Depends(get_db),
+):
+    """
+    This endpoint creates many claims at once.
+    Each record is validated on its own; invalid records are reported in 'errors' and the rest are still created.
+    """
+    # Validate the whole batch up front so the DB only ever sees clean rows
+    valid_claims, valid_indexes, errors = schemas.split_valid_claims(records)
+
+    # Write the valid claims in chunks; rows rejected by the DB come back with their position in 'valid_claims'
+    created, failed = crud.create_claims_bulk(db, valid_claims)
+    return schemas.bulk_result(created, errors, failed, valid_indexes)
+
+
+# -------------------------------------
+# GET route to fetch claims, one page at a time
+# -------------------------------------
+@router.get("/claims", response_model=list[schemas.ClaimWithLines])  # The route handles GET requests at /claims and returns a list of claims with their lines.
+def read_claims(
+    response: Response,  # Used to return the next-page cursor as a header
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    claim_status: Optional[schemas.ClaimStatus] = Query(None, alias="status", description="Only claims with this status"),
+    min_amount: Optional[float] = Query(None, ge=0, description="Minimum claim amount (inclusive)"),
+    max_amount: Optional[float] = Query(None, ge=0, description="Maximum claim amount (inclusive)"),
+    submitted_from: Optional[datetime] = Query(None, description="Submitted at or after this time"),
+    submitted_to: Optional[datetime] = Query(None, description="Submitted before this time"),
+    db: Session = Depends(get_db),  # This route gets a DB session injected
+):
+    """
+    This endpoint fetches claims one page at a time, ordered by submission time, each with its service lines.
+    The lines of the whole page are loaded with one more query, however many claims are on it.
+    When more claims are available, the cursor for the next page is returned in the 'X-Next-Cursor' header.
+    """
+    try:
+        # FAST_JSON: plain rows, encoded below without re-validating them against the response model
+        get_page = crud.get_claims_page_rows if settings.fast_json else crud.get_claims_page
+        claims, next_cursor = get_page(
+            db,
+            limit=limit,
+            cursor=cursor,
+            status=claim_status,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            submitted_from=submitted_from,
+            submitted_to=submitted_to,
+        )
+    except ValueError:
+        # The cursor couldn't be decoded, so the client sent something we never issued
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if settings.fast_json:
+        # The rows already have the Claim schema's fields; send the same JSON the response model would produce
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        lines = crud.get_claim_line_rows(db, claims)
+        return Response(fastjson.encode_claim_list(claims, lines), media_type="application/json", headers=headers)
+
+    # Only set the header when there is another page to fetch
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return claims  # Return this page of claims
 
 
 # -------------------------------------
-# GET route to fetch all claims
+# GET route to search claims by claimant name
 # -------------------------------------
-@app.get("/claims", response_model=list[schemas.Claim])  # The route handles GET requests at /claims and returns a list of claims.
-def read_claims(db: Session = Depends(get_db)):  # This route gets a DB session injected
+@router.get("/claims/search", response_model=list[schemas.Claim])  # Declared before /claims/{claim_id} so 'search' isn't read as an ID
+def search_claims(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=100, description="Full, partial or misspelled claimant name"),
+    limit: int = Query(search.SEARCH_PAGE_SIZE, ge=1, le=search.MAX_SEARCH_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    db: Session = Depends(get_db),
+):
     """
-    This endpoint fetches all claims stored in the database.
+    This endpoint finds claims whose claimant name matches 'q', best match first.
+    Pages work like GET /claims: the cursor for the next page is returned in the 'X-Next-Cursor' header.
     """
-    # Call the 'get_all_claims' function from 'crud.py' to retrieve all claims.
-    return crud.get_all_claims(db)  # Return the list of claims
+    try:
+        claims, next_cursor = crud.search_claims(
+            db, q, limit=limit, cursor=cursor, min_similarity=settings.search_min_similarity, fast=settings.fast_json
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if settings.fast_json:
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+        return Response(fastjson.encode_claim_list(claims), media_type="application/json", headers=headers)
+
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return claims
+
+
+# -------------------------------------
+# GET route to export every claim as a stream (NDJSON or CSV)
+# -------------------------------------
+@router.get("/claims/export")  # Declared before /claims/{claim_id} so 'export' isn't read as an ID
+def export_claims(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format: ndjson or csv"),
+    db: Session = Depends(get_db),
+):
+    """
+    This endpoint streams every claim as NDJSON or CSV without building the whole list in memory.
+    """
+    def body():
+        # The session stays open until the last chunk has been sent
+        try:
+            yield from export.encode(format, crud.stream_claims(db))
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        body(),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="claims.{format}"'},
+    )
 
 
 # -------------------------------------
 # GET route to fetch a single claim by ID
 # -------------------------------------
-@app.get("/claims/{claim_id}", response_model=schemas.Claim)  # Route accepts a claim_id in the URL path and returns a single claim object.
-def read_claim(claim_id: int, db: Session = Depends(get_db)):  # 'claim_id' is a path parameter
+@router.get("/claims/{claim_id}", response_model=schemas.ClaimWithLines)  # Route accepts a claim_id in the URL path and returns a single claim object with its lines.
+def read_claim(
+    claim_id: int,  # 'claim_id' is a path parameter
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match", description="ETag of a copy the client has: 304 if it is still current"),
+    db: Session = Depends(get_db),
+):
     """
-    This endpoint fetches a specific claim by its ID.
+    This endpoint fetches a specific claim by its ID, with its version in the 'ETag' header.
+    Claims are served from the claim cache when possible (see cache.py).
     """
-    # Fetch the claim from the database using 'crud.get_claim_by_id' by passing the DB session and claim ID.
-    db_claim = crud.get_claim_by_id(db, claim_id)
+    # Fetch the claim as ready-to-send JSON, from the cache or through 'crud.get_claim_with_lines' on a miss.
+    entry = crud.get_claim_entry(db, claim_id, fast=settings.fast_json)
     
     # If no claim is found, raise an HTTPException with a 404 status code (Not Found).
-    if db_claim is None:  # If the claim is not found, return a 404 error.
+    if entry is None:  # If the claim is not found, return a 404 error.
         raise HTTPException(status_code=404, detail="Claim not found")  
-    
-    # If the claim is found, return it as a response.
-    return db_claim
+    body, version = entry
+    headers = {"ETag": etags.format_etag(version)}
+    if etags.not_modified(if_none_match, version):
+        return Response(status_code=304, headers=headers)
+
+    # The JSON was produced by the ClaimWithLines schema already, so send it as-is.
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # -------------------------------------
 # PUT route to update an existing claim by ID
 # -------------------------------------
-@app.put("/claims/{claim_id}", response_model=schemas.Claim)  # Route to update a specific claim by ID.
+@router.put("/claims/{claim_id}", response_model=schemas.Claim)  # Route to update a specific claim by ID.
 def update_claim(
     claim_id: int,  # Path parameter: the ID of the claim to be updated.
-    updated_claim: schemas.ClaimCreate,  # Request body: contains new claim data, validated with ClaimCreate schema.
+    updated_claim: schemas.ClaimUpdate,  # Request body: contains new claim data, validated with ClaimUpdate schema (lines are set at creation only).
+    response: Response,  # Used to return the new ETag
+    if_match: Optional[str] = Header(None, alias="If-Match", description="The claim's ETag as last read: only write if nobody changed it since"),
     db: Session = Depends(get_db)  # Inject a DB session using FastAPI's dependency system.
 ):
     """
     This endpoint updates a claim with the given claim ID using new data provided in the request body.
+    The update is a single UPDATE ... RETURNING statement; no row coming back means the claim doesn't exist.
+    With If-Match, the UPDATE only applies to the version the client read, and a stale write gets 412 (see etags.py).
     """
-
-    # Fetch the claim from the database using the provided claim ID.
-    db_claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()
+    try:
+        db_claim = crud.update_claim(db, claim_id, updated_claim, etags.write_condition(if_match))
+    except crud.StaleClaimVersion as exc:
+        raise etags.precondition_failed(exc.current_version)
+    except crud.ClaimLinesMismatch as exc:
+        # The claim has service lines, and they don't add up to the new amount
+        raise HTTPException(status_code=409, detail=str(exc))
 
     # If no claim is found with the given ID, raise a 404 Not Found error.
     if db_claim is None:
         raise HTTPException(status_code=404, detail="Claim not found")
 
-    # Validate that the status provided is one of the allowed Enum values.
-    if updated_claim.status not in [status.value for status in schemas.ClaimStatus]:
-        raise HTTPException(status_code=400, detail="Invalid status value")
+    # Return the updated claim, which will be serialized using the Claim schema.
+    response.headers["ETag"] = etags.format_etag(db_claim.version)
+    return db_claim
+
+
+# -------------------------------------
+# PATCH route to change only some fields of a claim
+# -------------------------------------
+@router.patch("/claims/{claim_id}", response_model=schemas.Claim)
+def patch_claim(
+    claim_id: int,  # Path parameter: the ID of the claim to be updated.
+    changes: schemas.ClaimPatch,  # Request body: only the fields to change.
+    response: Response,
+    if_match: Optional[str] = Header(None, alias="If-Match", description="The claim's ETag as last read: only write if nobody changed it since"),
+    db: Session = Depends(get_db),
+):
+    """
+    This endpoint updates only the fields sent in the request body; the other fields keep their values.
+    If-Match works as for PUT.
+    """
+    try:
+        db_claim = crud.patch_claim(db, claim_id, changes.changes(), etags.write_condition(if_match))
+    except crud.StaleClaimVersion as exc:
+        raise etags.precondition_failed(exc.current_version)
+    except crud.ClaimLinesMismatch as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if db_claim is None:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    response.headers["ETag"] = etags.format_etag(db_claim.version)
+    return db_claim
+
 
-    # Update fields with the data received from the request.
-    db_claim.claimant_name = updated_claim.claimant_name
-    db_claim.amount = updated_claim.amount
-    db_claim.status = updated_claim.status  # Assign a valid Enum value (as string).
+# -------------------------------------
+# DELETE route to remove a claim by ID
+# -------------------------------------
+@router.delete("/claims/{claim_id}", status_code=204)  
+# 'status_code=204' tells FastAPI to return a 204 No Content response if successful (no body in the response).
+def delete_claim(
+    claim_id: int,
+    if_match: Optional[str] = Header(None, alias="If-Match", description="The claim's ETag as last read: only write if nobody changed it since"),
+    db: Session = Depends(get_db),
+):  
+    """
+    This endpoint deletes a claim with a single DELETE ... RETURNING statement.
+    If-Match works as for PUT.
+    """
+    # No row coming back from the DELETE means there was no claim with this ID.
+    try:
+        deleted = crud.delete_claim(db, claim_id, etags.write_condition(if_match))
+    except crud.StaleClaimVersion as exc:
+        raise etags.precondition_failed(exc.current_version)
+    if deleted is None:
+        raise HTTPException(status_code=404, detail="Claim not found")  
 
-    # Save the updated claim to the database.
-    db.commit()
+    # Return nothing; FastAPI sends an empty 204 No Content response.
+    return
 
-    # Refresh the claim instance to reflect updated DB state.
-    db.refresh(db_claim)
 
-    # Return the updated claim, which will be serialized using the Claim schema.
+# -------------------------------------
+# GET route to look up a claim queued through the Kafka intake
+# -------------------------------------
+@other_router.get("/claims/intake/{tracking_id}", response_model=schemas.Claim)
+def read_intake_claim(tracking_id: str, db: Session = Depends(get_db)):
+    """
+    This endpoint returns the claim written for a tracking ID handed out by POST /claims in Kafka intake mode.
+    It answers 404 while the claim is still queued (or if the tracking ID is unknown).
+    """
+    db_claim = crud.get_claim_by_tracking_id(db, tracking_id)
+    if db_claim is None:
+        raise HTTPException(status_code=404, detail="Claim not written yet")
     return db_claim
 
 
-@app.delete("/claims/{claim_id}", status_code=204)  
-# This line defines a DELETE HTTP route at the path "/claims/{claim_id}".
-# When a DELETE request is made to this path (e.g., /claims/5), this function will be called.
-# 'status_code=204' tells FastAPI to return a 204 No Content response if successful (no body in the response).
+# -------------------------------------
+# GET route to tail claim changes (change feed for downstream systems)
+# -------------------------------------
+@other_router.get("/claims/changes", response_model=schemas.ChangeFeed)
+async def read_claim_changes(
+    since: int = Query(0, ge=0, description="Position of the last change already processed (0 = from the start)"),
+    limit: int = Query(changes.FEED_PAGE_SIZE, ge=1, le=changes.MAX_FEED_PAGE_SIZE, description="Most changes returned"),
+    wait: float = Query(0, ge=0, le=changes.MAX_WAIT, description="Seconds to wait for a change when there is none yet (long poll)"),
+    db: Session = Depends(get_db),
+):
+    """
+    This endpoint returns the claims created, updated, deleted or archived after position 'since', in order,
+    each with the claim as it was after the change. Send 'next_since' back as 'since' to read on.
+    With 'wait', the request is held open until a change is published or 'wait' seconds pass.
+    Answers 410 when the changes right after 'since' were already purged (see CHANGE_FEED_RETENTION_DAYS).
+    """
+    try:
+        rows = await changes.poll_changes(db, since, limit, wait)
+    except changes.ChangesPurged as exc:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Changes up to position {exc.purged_through} were purged; re-read the claims, then read on from since={exc.purged_through}",
+        )
+    return changes.feed(rows, since)
+
+
+# -------------------------------------
+# Claim attachments (EOBs, itemized bills, scans)
+# -------------------------------------
+# The routes are 'async def' so the upload can be read chunk by chunk; each query runs in a worker thread and gives
+# its connection back right away (attachments.released), so no database connection is held while a file is sent or received.
+@other_router.post("/claims/{claim_id}/attachments", response_model=schemas.Attachment, status_code=201)
+async def upload_claim_attachment(
+    claim_id: int,
+    request: Request,
+    filename: Optional[str] = Query(None, max_length=1024, description="Name of the file, sent back when it is downloaded"),
+    content_type: str = Header(attachments.DEFAULT_CONTENT_TYPE, alias="Content-Type", max_length=255),
+    content_length: Optional[int] = Header(None, alias="Content-Length"),
+    db: Session = Depends(get_db),
+):
+    """
+    This endpoint attaches a file to a claim. The request body is the file itself (not a multipart form),
+    with its media type as Content-Type, e.g.
+      curl --data-binary @eob.pdf -H 'Content-Type: application/pdf' '.../claims/7/attachments?filename=eob.pdf'
+    The body is streamed to the attachment store (see attachments.py); answers 413 past ATTACHMENT_MAX_BYTES.
+    """
+    if content_length is not None and content_length > attachments.store.max_bytes:
+        # Refused before reading any of the body
+        raise HTTPException(status_code=413, detail=f"Attachments are limited to {attachments.store.max_bytes} bytes")
+    if not await asyncio.to_thread(attachments.released, db, crud.claim_exists, claim_id):
+        raise HTTPException(status_code=404, detail="Claim not found")
+    try:
+        stored = await attachments.store.save(request.stream())
+    except attachments.AttachmentTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except attachments.EmptyAttachment as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return await asyncio.to_thread(
+        attachments.released, db, crud.create_attachment,
+        claim_id, attachments.clean_filename(filename), content_type, stored.sha256, stored.size,
+    )
+
+
+@other_router.get("/claims/{claim_id}/attachments", response_model=list[schemas.Attachment])
+def read_claim_attachments(claim_id: int, db: Session = Depends(get_db)):
+    """
+    This endpoint lists the files attached to a claim (metadata only), oldest first.
+    """
+    found = crud.get_attachments(db, claim_id)
+    if not found and not crud.claim_exists(db, claim_id):
+        raise HTTPException(status_code=404, detail="Claim not found")
+    return found
 
-def delete_claim(claim_id: int, db: Session = Depends(get_db)):  
-    # This is the route handler function.
-    # 'claim_id: int' is a path parameter extracted from the URL.
-    # 'db: Session = Depends(get_db)' injects a database session using FastAPI's dependency system.
-    # 'Depends(get_db)' means FastAPI will automatically call the 'get_db' function and pass its result here.
 
-    db_claim = db.query(models.Claim).filter(models.Claim.id == claim_id).first()  
-    # This line queries the database to find a claim with the given claim_id.
-    # 'db.query(models.Claim)' creates a query for the Claim table.
-    # '.filter(models.Claim.id == claim_id)' filters records where 'id' matches the path parameter.
-    # '.first()' returns the first match or None if not found.
+@other_router.api_route("/claims/{claim_id}/attachments/{attachment_id}", methods=["GET", "HEAD"], response_class=Response)
+async def download_claim_attachment(claim_id: int, attachment_id: int, db: Session = Depends(get_db)):
+    """
+    This endpoint sends an attached file. Range requests (206) are supported, with If-Range on the ETag,
+    so interrupted downloads of large scans can be resumed.
+    """
+    attachment = await asyncio.to_thread(attachments.released, db, crud.get_attachment, claim_id, attachment_id)
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    try:
+        stat_result = await asyncio.to_thread(os.stat, attachments.store.path(attachment.sha256))
+    except FileNotFoundError:
+        logger.error("Attachment %d is missing its file %s", attachment.id, attachment.sha256)
+        raise HTTPException(status_code=404, detail="Attachment content not found")
+    return attachments.file_response(attachment, stat_result)
 
-    if db_claim is None:  
-        # If no claim was found (i.e., claim_id doesn't exist), then:
-        raise HTTPException(status_code=404, detail="Claim not found")  
-        # Raise an HTTP 404 Not Found error with a custom error message.
-        # This stops the function and sends the error as the response.
 
-    db.delete(db_claim)  
-    # Delete the found claim object from the database session.
-    # Note: It doesn't delete it in the database yet — it just marks it for deletion.
+# -------------------------------------
+# POST route to change the status of many claims at once (adjudication runs)
+# -------------------------------------
+@other_router.post("/claims/status-transitions", response_model=schemas.StatusTransitionResult)
+def transition_claim_statuses(request: schemas.StatusTransitionRequest, db: Session = Depends(get_db)):
+    """
+    This endpoint changes the status of many claims with set-based UPDATEs.
+    Send either 'transitions' (a list of {id, status}) or a 'filter' with a 'target_status'.
+    Changes the transition table doesn't allow (e.g. out of 'closed') are reported in 'rejected',
+    and IDs that don't exist in 'missing'.
+    """
+    if request.transitions is not None:
+        return crud.transition_claims(db, request.transitions)
+    return crud.transition_matching_claims(db, request.filter, request.target_status)
+
 
-    db.commit()  
-    # Commits the current transaction, which includes the deletion of the claim.
-    # Now the claim is permanently removed from the database.
+# -------------------------------------
+# GET route for claim counts and amount totals (dashboards)
+# -------------------------------------
+@other_router.get("/claims/stats", response_model=list[schemas.ClaimStatsRow], response_model_exclude_none=True)
+def read_claim_stats(
+    group_by: list[str] = Query(["status"], description="Any of: status, day, hour (day and hour are exclusive)"),
+    submitted_from: Optional[datetime] = Query(None, description="Submitted at or after this time (hour granularity)"),
+    submitted_to: Optional[datetime] = Query(None, description="Submitted before this time (hour granularity)"),
+    db: Session = Depends(get_db),
+):
+    """
+    This endpoint returns claim counts and amount totals grouped by status and/or submission day or hour.
+    It reads the pre-aggregated 'claim_stats' table, so its cost depends on the number of groups, not of claims.
+    """
+    unknown = set(group_by) - {"status", "day", "hour"}
+    if unknown or {"day", "hour"} <= set(group_by):
+        raise HTTPException(status_code=400, detail="group_by accepts status, and either day or hour")
 
-    return  
-    # Return nothing. Since the route is defined with 'status_code=204',
-    # FastAPI will return an empty response with HTTP 204 status (No Content).
+    period = "day" if "day" in group_by else "hour" if "hour" in group_by else None
+    return stats.get_claim_stats(
+        db,
+        by_status="status" in group_by,
+        period=period,
+        submitted_from=submitted_from,
+        submitted_to=submitted_to,
+    )
 
 
+# -------------------------------------
+# GET routes for exact amount totals (finance and reconciliation)
+# -------------------------------------
+@other_router.get("/claims/totals", response_model=list[schemas.ClaimTotalsRow], response_model_exclude_none=True)
+def read_claim_totals(
+    by_status: bool = Query(True, description="One total per status (false: a single total)"),
+    claim_status: Optional[schemas.ClaimStatus] = Query(None, alias="status", description="Only claims with this status"),
+    min_amount: Optional[float] = Query(None, ge=0, description="Minimum claim amount (inclusive)"),
+    max_amount: Optional[float] = Query(None, ge=0, description="Maximum claim amount (inclusive)"),
+    submitted_from: Optional[datetime] = Query(None, description="Submitted at or after this time"),
+    submitted_to: Optional[datetime] = Query(None, description="Submitted before this time"),
+    db: Session = Depends(get_db),
+):
+    """
+    This endpoint returns claim counts and exact amount totals for the claims matching the same filters as GET /claims.
+    The sums are computed in SQL over whole cents; 'amount_total_cents' is exact however large the total grows.
+    """
+    return stats.get_claim_totals(
+        db,
+        by_status=by_status,
+        status=claim_status,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        submitted_from=submitted_from,
+        submitted_to=submitted_to,
+    )
+
+
+@other_router.get("/claims/totals/reconcile", response_model=schemas.Reconciliation)
+def read_claim_totals_reconciliation(db: Session = Depends(get_db)):
+    """
+    This endpoint checks that the pre-aggregated statistics (GET /claims/stats) agree with the claims, per status.
+    'matches' is false if any status's claim count or amount total differs.
+    """
+    return stats.reconcile(db)
+
+
+# -------------------------------------
+# GET route exposing metrics in the Prometheus text format
+# -------------------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """
+    This endpoint returns the process metrics (pool checkout wait time, pool saturation, ...) for Prometheus.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# -------------------------------------
+# Register the claim routes for the configured DB mode
+# -------------------------------------
+if settings.db_mode == "async":
+    # 'async def' handlers with an AsyncSession (see async_routes.py)
+    from .async_routes import other_router as async_other_router, router as async_router
+    app.include_router(async_other_router)
+    app.include_router(async_router)
+else:
+    app.include_router(other_router)
+    app.include_router(router)
@@ -0,0 +1,249 @@
+# Schema management: creates or upgrades the database schema
+#
+# The API doesn't touch the schema when it starts; run this once per deploy, before starting the workers:
+#   python -m app.migrate           # apply pending migrations
+#   python -m app.migrate status    # list applied and pending migrations
+#
+# Applied migrations are recorded in the 'schema_migrations' table. On a new database the first migration
+# creates every table from models.py at its latest shape, so later migrations check what already exists
+# (they must also upgrade databases created by the old create_all-at-import code).
+
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, inspect, select, text
+
+from . import models, partitions, search, stats
+
+# Kept out of models.Base so the tests' create_all/drop_all don't touch it
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary key for the PostgreSQL advisory lock that keeps two deploys from migrating at the same time
+MIGRATION_LOCK_KEY = 7_243_001
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, description: str):
+    """
+    Register the decorated function as migration 'version'. It receives a Connection inside the migration transaction.
+    """
+    def register(apply):
+        MIGRATIONS.append(Migration(version, description, apply))
+        return apply
+    return register
+
+
+# -----------------------------
+# Helpers for idempotent migrations
+# -----------------------------
+def has_column(connection, table_name: str, column_name: str) -> bool:
+    return column_name in {column["name"] for column in inspect(connection).get_columns(table_name)}
+
+
+def column_is_float(connection, table_name: str, column_name: str) -> bool:
+    column = next(column for column in inspect(connection).get_columns(table_name) if column["name"] == column_name)
+    return isinstance(column["type"], Float)
+
+
+def create_missing_indexes(connection, table) -> None:
+    """
+    Create the indexes declared on 'table' that the database doesn't have yet (skipping ones on columns it lacks).
+    """
+    existing = {index["name"] for index in inspect(connection).get_indexes(table.name)}
+    columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    for index in table.indexes:
+        if index.name not in existing and all(column.name in columns for column in index.columns):
+            index.create(connection)
+
+
+# -----------------------------
+# Migrations (append new ones at the end, with the next version number)
+# -----------------------------
+@migration(1, "Create the claims and claim_stats tables, their indexes and the claim_stats triggers")
+def initial_schema(connection):
+    # Creates missing tables; the after_create listener in models.py installs the triggers
+    # and fills claim_stats when it is new
+    models.Base.metadata.create_all(connection)
+    for table in models.Base.metadata.sorted_tables:
+        create_missing_indexes(connection, table)
+    stats.install_triggers(connection)
+
+
+@migration(2, "Add claims.tracking_id, the Kafka intake idempotency key")
+def add_tracking_id(connection):
+    if not has_column(connection, "claims", "tracking_id"):
+        connection.execute(text("ALTER TABLE claims ADD COLUMN tracking_id VARCHAR(36)"))
+    create_missing_indexes(connection, models.Claim.__table__)
+
+
+@migration(3, "Create idempotency_keys (Idempotency-Key support on POST /claims)")
+def create_idempotency_keys(connection):
+    models.Base.metadata.create_all(connection, tables=[models.IdempotencyKey.__table__])
+
+
+@migration(4, "Add the claimant name search index (pg_trgm GiST on PostgreSQL, FTS5 table on SQLite)")
+def add_claimant_name_search(connection):
+    # On a large table this builds the index while holding the migration transaction open (see README)
+    search.install(connection)
+
+
+@migration(5, "Create intake_tracking_ids (Kafka intake deduplication outside the claims table)")
+def create_intake_tracking_ids(connection):
+    models.Base.metadata.create_all(connection, tables=[models.IntakeTrackingId.__table__])
+    connection.execute(text(
+        "INSERT INTO intake_tracking_ids (tracking_id, written_at) "
+        "SELECT tracking_id, COALESCE(min(submitted_at), CURRENT_TIMESTAMP) FROM claims "
+        "WHERE tracking_id IS NOT NULL AND tracking_id NOT IN (SELECT tracking_id FROM intake_tracking_ids) "
+        "GROUP BY tracking_id"
+    ))
+
+
+@migration(6, "Partition claims by month of submitted_at (PostgreSQL only)")
+def partition_claims(connection):
+    # Copies every claim while holding an exclusive lock on the table: plan a maintenance window for large tables
+    partitions.partition_claims_table(connection)
+
+
+@migration(7, "Store claim amounts and claim_stats totals as whole cents (exact money)")
+def amounts_in_cents(connection):
+    # Databases created at the latest shape already have BIGINT cents
+    if not column_is_float(connection, "claims", "amount"):
+        return
+    if connection.dialect.name == "postgresql":
+        # Rewrites the table (and every partition) under an exclusive lock: plan a maintenance window for large tables
+        connection.execute(text("ALTER TABLE claims ALTER COLUMN amount TYPE bigint USING round((amount * 100)::numeric)"))
+        connection.execute(text("ALTER TABLE claim_stats ALTER COLUMN amount_total TYPE bigint USING 0"))
+    else:
+        # SQLite can't change a column's type. The column keeps its FLOAT declaration and stores whole cents as
+        # REAL, which is exact up to 2**53 cents; money.Money reads them back as Decimal. The claim_stats
+        # triggers are dropped meanwhile: they would move every claim between buckets one row at a time.
+        for trigger in ("claim_stats_after_insert", "claim_stats_after_update", "claim_stats_after_delete"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text("UPDATE claims SET amount = round(amount * 100)"))
+        stats.install_triggers(connection)
+    # The float totals carried rounding drift anyway: recompute them exactly from the converted amounts
+    stats.rebuild(connection)
+
+
+@migration(8, "Add claims.version (ETag / If-Match optimistic concurrency)")
+def add_claim_version(connection):
+    # A constant default: PostgreSQL adds the column without rewriting the table (or its partitions)
+    if not has_column(connection, "claims", "version"):
+        connection.execute(text("ALTER TABLE claims ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+
+@migration(9, "Create claim_events and change_feed_state (transactional outbox for GET /claims/changes)")
+def create_claim_events(connection):
+    # The after_create listener in models.py adds the change_feed_state row; changes before this point have no events
+    models.Base.metadata.create_all(connection, tables=[models.ClaimEvent.__table__, models.ChangeFeedState.__table__])
+
+
+@migration(10, "Create claim_attachments (attachment metadata; the files are in ATTACHMENT_DIR)")
+def create_claim_attachments(connection):
+    models.Base.metadata.create_all(connection, tables=[models.ClaimAttachment.__table__])
+
+
+@migration(11, "Create claim_lines (service lines of a claim: CPT/ICD codes, units, charge)")
+def create_claim_lines(connection):
+    models.Base.metadata.create_all(connection, tables=[models.ClaimLine.__table__])
+
+
+@migration(12, "Never reuse claim IDs on SQLite (rebuild claims as AUTOINCREMENT)")
+def claims_autoincrement(connection):
+    # PostgreSQL sequences never hand out an ID twice. SQLite only stops reusing the IDs of deleted claims
+    # once the table is AUTOINCREMENT, which it can't add to an existing table: rebuild it, keeping every ID.
+    if connection.dialect.name != "sqlite":
+        return
+    sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'claims'")).scalar()
+    if "AUTOINCREMENT" in sql.upper():
+        return
+    columns = ", ".join(
+        column["name"] for column in inspect(connection).get_columns("claims") if column["name"] in models.Claim.__table__.c
+    )
+    for index in inspect(connection).get_indexes("claims"):
+        connection.execute(text(f"DROP INDEX {index['name']}"))  # Recreated with the new table
+    connection.execute(text("ALTER TABLE claims RENAME TO claims_reused_ids"))
+    models.Claim.__table__.create(connection)
+    connection.execute(text(f"INSERT INTO claims ({columns}) SELECT {columns} FROM claims_reused_ids"))
+    connection.execute(text("DROP TABLE claims_reused_ids"))  # With its claim_stats and search triggers
+    stats.install_triggers(connection)
+    search.install(connection)
+
+    # New IDs start after every ID still referenced, including those of claims deleted before this migration
+    highest = max(
+        connection.execute(text(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")).scalar()
+        for table, column in (
+            ("claims", "id"), ("claim_events", "claim_id"), ("claim_attachments", "claim_id"),
+            ("claim_lines", "claim_id"), ("idempotency_keys", "claim_id"),
+        )
+    )
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'claims'"))
+    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('claims', :seq)"), {"seq": highest})
+
+
+# -----------------------------
+# Running migrations
+# -----------------------------
+def applied_versions(connection) -> set[int]:
+    schema_migrations.create(connection, checkfirst=True)
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def migrate(engine) -> list[int]:
+    """
+    Apply every pending migration in order, in a single transaction. Returns the versions applied.
+    """
+    applied_now = []
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # Released at commit; a second migrate waits here, then finds nothing left to do
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        done = applied_versions(connection)
+        for step in sorted(MIGRATIONS, key=lambda m: m.version):
+            if step.version in done:
+                continue
+            step.apply(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=step.version, description=step.description, applied_at=datetime.utcnow(),
+            ))
+            applied_now.append(step.version)
+    return applied_now
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create or upgrade the claims database schema (DATABASE_URL)")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"], default="upgrade")
+    args = parser.parse_args()
+
+    from .database import engine
+
+    if args.command == "status":
+        with engine.begin() as connection:
+            done = applied_versions(connection)
+        for step in sorted(MIGRATIONS, key=lambda m: m.version):
+            print(f"{'applied' if step.version in done else 'pending':>8}  {step.version:>3}  {step.description}")
+        return
+
+    applied = migrate(engine)
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
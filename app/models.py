@@ -2,9 +2,11 @@
 # models.py
 
 # SQLAlchemy models (DB table definitions)
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Index, event, insert, text
+from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base  # SQLAlchemy base class
+from .money import Money  # Exact amounts: BIGINT cents in the database, Decimal in Python
 
 # Defining a class that maps to a table called 'claims'
 class Claim(Base):
@@ -12,7 +14,180 @@ class Claim(Base):
 
     id = Column(Integer, primary_key=True, index=True)  # Unique claim ID
     claimant_name = Column(String, nullable=False)  # Name of the claimant
-    amount = Column(Float, nullable=False)  # Amount being claimed
+    amount = Column(Money, nullable=False)  # Amount being claimed (stored in cents)
     status = Column(String, default="submitted")  # Status of the claim
     submitted_at = Column(DateTime, default=datetime.utcnow)  # Timestamp of submission
+    tracking_id = Column(String(36), nullable=True)  # Set for claims received through the Kafka intake (see IntakeTrackingId)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Incremented by every write; the claim's ETag (see etags.py)
     #claim_type = Column(String, nullable=False)
+
+    # Composite indexes that back the keyset-paginated listing (GET /claims).
+    # Pages are ordered by (submitted_at, id), so each page is a range scan that starts
+    # right after the cursor instead of skipping over every earlier row.
+    __table_args__ = (
+        # Unfiltered listing and submitted_at windows
+        Index("ix_claims_submitted_at_id", "submitted_at", "id"),
+        # Listing filtered by status (optionally combined with a submitted_at window)
+        Index("ix_claims_status_submitted_at_id", "status", "submitted_at", "id"),
+        # GET /claims/intake/{tracking_id} (not unique: on PostgreSQL 'claims' is partitioned by submitted_at,
+        # and a unique index there has to include it; intake_tracking_ids does the deduplication)
+        Index("ix_claims_tracking_id", "tracking_id"),
+        # SQLite reuses the highest rowid after a delete unless the table is AUTOINCREMENT. Rows keyed by claim ID
+        # (events, attachments, lines, idempotency keys) must never point at a new claim; PostgreSQL sequences never reuse IDs.
+        {"sqlite_autoincrement": True},
+    )
+
+    # The claim's service lines. No foreign key (see ClaimLine), so the join says which side points at the other.
+    # lazy="raise_on_sql": reads load the lines up front, in one extra SELECT however many claims there are.
+    # Lists use crud.load_lines (one claim_id IN (...) query, see claim_lines_statement); a single claim may use
+    # selectinload. Touching 'lines' that weren't loaded raises instead of quietly running one SELECT per claim.
+    lines = relationship(
+        "ClaimLine",
+        primaryjoin="foreign(ClaimLine.claim_id) == Claim.id",
+        order_by="ClaimLine.line_number",
+        lazy="raise_on_sql",
+    )
+
+
+# Pre-aggregated claim counts and amount totals per (status, hour), read by GET /claims/stats.
+# Maintained by database triggers on 'claims' (see stats.py), never written by the application directly.
+class ClaimStats(Base):
+    __tablename__ = "claim_stats"
+
+    status = Column(String, primary_key=True)  # Claim status
+    bucket = Column(DateTime, primary_key=True)  # submitted_at truncated to the hour
+    shard = Column(Integer, primary_key=True)  # claim id % stats.STATS_SHARDS, spreads concurrent writers
+    claim_count = Column(Integer, nullable=False, default=0)  # Number of claims
+    amount_total = Column(Money, nullable=False, default=0)  # Sum of their amounts (in cents, like claims.amount)
+
+    __table_args__ = (
+        # Time-window queries that don't group by status
+        Index("ix_claim_stats_bucket", "bucket"),
+    )
+
+
+# Idempotency-Key values sent with POST /claims, and the claim each one created.
+# A retry with the same key gets that claim back instead of creating a new one; keys expire after
+# IDEMPOTENCY_KEY_TTL seconds and are purged in the background.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)  # The client's Idempotency-Key header (primary key: lookups are one index probe)
+    claim_id = Column(Integer, nullable=False)  # Claim created by the first request
+    request_hash = Column(String(64), nullable=False)  # SHA-256 of the claim, to catch a key reused for another claim
+    created_at = Column(DateTime, nullable=False)  # When the key was stored; used for expiry
+
+    __table_args__ = (
+        # Purging expired keys
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
+
+
+# Tracking IDs of the claims written by the Kafka intake worker (see intake.py), one row per claim.
+# Kafka delivers at least once; a tracking ID already in this table was written by an earlier delivery.
+class IntakeTrackingId(Base):
+    __tablename__ = "intake_tracking_ids"
+
+    tracking_id = Column(String(36), primary_key=True)  # The message key / claims.tracking_id
+    written_at = Column(DateTime, nullable=False)  # When the worker wrote the claim
+
+
+# Outbox of claim changes: one row per claim created, updated, deleted or archived, written in the same
+# transaction as the change (see changes.py). The relay publishes rows by giving them a feed 'position',
+# which GET /claims/changes reads in order.
+class ClaimEvent(Base):
+    __tablename__ = "claim_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)  # Order the events were written in (not the order they were committed in)
+    position = Column(BigInteger, nullable=True)  # Position in the change feed, set by the relay (NULL until published)
+    change_type = Column(String(16), nullable=False)  # created, updated, deleted or archived
+    claim_id = Column(Integer, nullable=False)  # The claim that changed
+    claim_version = Column(Integer, nullable=True)  # Its version after the change (its ETag)
+    claim = Column(Text, nullable=False)  # The claim as JSON (without its lines), as PUT/PATCH return it after the change (before it, for deletes)
+    occurred_at = Column(DateTime, nullable=False)  # When the change was written
+    published_at = Column(DateTime, nullable=True)  # When the relay published it; used for expiry
+
+    __table_args__ = (
+        # GET /claims/changes?since=... is a range scan from the consumer's position
+        Index("ix_claim_events_position", "position", unique=True),
+        # The relay's next batch: only the events not published yet
+        Index(
+            "ix_claim_events_unpublished", "id",
+            sqlite_where=text("position IS NULL"), postgresql_where=text("position IS NULL"),
+        ),
+    )
+
+
+# The change feed's counters, in a single row. The relay locks it while it numbers a batch, so relays in
+# different workers take turns and positions come out gapless and in order.
+class ChangeFeedState(Base):
+    __tablename__ = "change_feed_state"
+
+    id = Column(Integer, primary_key=True)  # Always changes.FEED_STATE_ID
+    last_position = Column(BigInteger, nullable=False, default=0)  # Position of the last published event
+    purged_through = Column(BigInteger, nullable=False, default=0)  # Events up to this position were purged
+
+
+# Files attached to claims (EOBs, itemized bills, scans). Only the metadata is in the database: the content is a
+# file in the attachment store named by its SHA-256 (see attachments.py), shared by every row with the same digest.
+class ClaimAttachment(Base):
+    __tablename__ = "claim_attachments"
+
+    id = Column(Integer, primary_key=True)
+    claim_id = Column(Integer, nullable=False)  # No foreign key: on PostgreSQL 'claims' is partitioned. Deleted with the claim, or moved into its archive record
+    filename = Column(String(255), nullable=True)  # The name given at upload, sent back in Content-Disposition
+    content_type = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)  # Bytes
+    sha256 = Column(String(64), nullable=False)  # Hex digest of the content: its name in the store, and its ETag
+    uploaded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # GET /claims/{claim_id}/attachments
+        Index("ix_claim_attachments_claim_id", "claim_id"),
+    )
+
+
+# Service lines of a claim (the 837 'service line' loop): what was done (CPT/HCPCS code), for which diagnosis
+# (ICD-10-CM code), how many units, and the line's charge. A claim created with lines has their total as its amount.
+# The primary key starts with claim_id, so the lines of a whole page of claims (claim_id IN (...)) are one index range scan.
+class ClaimLine(Base):
+    __tablename__ = "claim_lines"
+
+    claim_id = Column(Integer, primary_key=True)  # No foreign key: on PostgreSQL 'claims' is partitioned (like claim_attachments)
+    line_number = Column(Integer, primary_key=True)  # 1, 2, ... in the order the lines were sent
+    cpt_code = Column(String(5), nullable=False)  # Procedure: CPT or HCPCS Level II code
+    icd_code = Column(String(8), nullable=False)  # Diagnosis: ICD-10-CM code
+    units = Column(Integer, nullable=False, default=1)  # Units of service
+    charge = Column(Money, nullable=False)  # Line charge (stored in cents, like claims.amount)
+
+
+# Install the triggers that keep 'claim_stats' in sync whenever the schema is created.
+# The first time 'claim_stats' itself is created, it is filled from the existing claims.
+@event.listens_for(Base.metadata, "after_create")
+def _install_claim_stats(target, connection, tables=(), **kw):
+    from . import stats  # Imported here: stats.py imports this module
+    stats.install_triggers(connection)
+    if ClaimStats.__table__ in tables:
+        stats.rebuild(connection)
+
+
+# The change feed's state row is created with its table
+@event.listens_for(Base.metadata, "after_create")
+def _init_change_feed_state(target, connection, tables=(), **kw):
+    if ChangeFeedState.__table__ in tables:
+        connection.execute(insert(ChangeFeedState.__table__).values(id=1, last_position=0, purged_through=0))
+
+
+# Install the claimant name search index (see search.py) whenever the schema is created,
+# and drop the SQLite FTS table along with 'claims'.
+@event.listens_for(Base.metadata, "after_create")
+def _install_search(target, connection, tables=(), **kw):
+    from . import search  # Imported here: search.py imports this module
+    search.install(connection, rebuild=Claim.__table__ in tables)
+
+
+@event.listens_for(Base.metadata, "after_drop")
+def _uninstall_search(target, connection, tables=(), **kw):
+    from . import search
+    if Claim.__table__ in tables:
+        search.uninstall(connection)
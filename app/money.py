@@ -0,0 +1,64 @@
+# Exact money amounts
+#
+# Claim amounts are stored as whole cents in a BIGINT column and handled as Decimal in Python, so sums are
+# exact integer arithmetic in the database (no float rounding drift in totals) and 0.1 + 0.2 stays 0.30.
+# The API still reads and writes amounts as JSON numbers: an amount with at most two decimals and fewer than
+# 15 significant digits survives the float on the wire unchanged (1234.56 is written as 1234.56).
+
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+
+CENT = Decimal("0.01")
+
+# Largest amount accepted by the API (14 digits: 999,999,999,999.99), far below the BIGINT range, and small
+# enough that every amount and every realistic total converts to a float and back exactly
+MAX_DIGITS = 14
+
+
+def to_cents(value, rounding=None) -> int:
+    """
+    Whole cents for a Decimal, int or float amount. Raises ValueError if it has fractions of a cent,
+    unless 'rounding' (e.g. decimal.ROUND_CEILING) says which way to round them.
+    """
+    amount = value if isinstance(value, Decimal) else Decimal(str(value))  # str(): 0.1 is 0.1, not 0.1000000000000000055...
+    cents = amount.scaleb(2)
+    whole = cents.to_integral_value(rounding=rounding or ROUND_FLOOR)
+    if rounding is None and whole != cents:
+        raise ValueError(f"Amount {value} has fractions of a cent")
+    return int(whole)
+
+
+def from_cents(cents) -> Decimal:
+    # Decimal with exactly two places; SQLite returns whole floats from columns created as FLOAT (see migration 7)
+    return Decimal(int(cents)).scaleb(-2).quantize(CENT)
+
+
+def at_least(value) -> Decimal:
+    """
+    Smallest whole-cent amount >= value (an inclusive lower bound that matches exactly the same amounts).
+    """
+    return from_cents(to_cents(value, ROUND_CEILING))
+
+
+def at_most(value) -> Decimal:
+    """
+    Largest whole-cent amount <= value.
+    """
+    return from_cents(to_cents(value, ROUND_FLOOR))
+
+
+class Money(TypeDecorator):
+    """
+    Column type for amounts: BIGINT cents in the database, Decimal('12.34') in Python.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_cents(value)
@@ -0,0 +1,206 @@
+# Monthly partitions of the claims table (PostgreSQL)
+#
+# On PostgreSQL 'claims' is range-partitioned by submitted_at, one partition per month (claims_p202501, ...),
+# plus a default partition (claims_default) that catches rows no monthly partition covers yet, so inserts never fail.
+# Queries that filter on submitted_at only read the partitions they need, and old months can be archived
+# (archive.py) without touching the recent ones. SQLite has no partitioning; everything here is a no-op there.
+#
+# Migration 6 converts an existing table. After that, partitions are created ahead of time:
+#   python -m app.partitions            # create the missing partitions (current month + PARTITION_MONTHS_AHEAD)
+#   python -m app.partitions status     # list the partitions and their row estimates
+# Each API worker also does this every PARTITION_MAINTENANCE_INTERVAL seconds (see main.py).
+
+import argparse
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+from . import models, search, stats
+from .config import settings
+
+DEFAULT_PARTITION = "claims_default"
+
+# Arbitrary key for the PostgreSQL advisory lock that keeps workers from creating the same partition at once
+PARTITION_LOCK_KEY = 7_243_002
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"claims_p{month:%Y%m}"
+
+
+# -----------------------------
+# Inspecting the table
+# -----------------------------
+def is_partitioned(connection) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'claims' AND pg_table_is_visible(c.oid)"
+    )).first() is not None
+
+
+def existing_partitions(connection) -> dict[str, int]:
+    """
+    Partitions of 'claims' and their estimated row counts (from the planner statistics).
+    """
+    rows = connection.execute(text(
+        "SELECT c.relname, c.reltuples::bigint FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'claims' AND pg_table_is_visible(p.oid) ORDER BY c.relname"
+    ))
+    return {name: max(estimate, 0) for name, estimate in rows}
+
+
+# -----------------------------
+# Creating partitions
+# -----------------------------
+def create_partition(connection, month: date) -> bool:
+    """
+    Create the partition for 'month' if it doesn't exist. Returns True if it was created.
+    Rows for that month already in the default partition are moved into it.
+    """
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    if name in existing_partitions(connection):
+        return False
+    bounds = {"start": start, "end": end}
+    strays = connection.execute(
+        text(f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE submitted_at >= :start AND submitted_at < :end LIMIT 1"), bounds
+    ).first()
+
+    if strays is None:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF claims FOR VALUES FROM ('{start}') TO ('{end}')"))
+        return True
+
+    # PostgreSQL refuses a new partition whose range has rows in the default partition, so build it standalone,
+    # move the rows (straight between partitions, so the claim_stats triggers on 'claims' don't see them), then attach it
+    connection.execute(text(f"CREATE TABLE {name} (LIKE claims INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE submitted_at >= :start AND submitted_at < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    connection.execute(text(f"ALTER TABLE claims ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+    return True
+
+
+def ensure_partitions(connection, months_ahead: Optional[int] = None, today: Optional[date] = None) -> list[str]:
+    """
+    Create the partitions for the current month and the next 'months_ahead' (PARTITION_MONTHS_AHEAD).
+    Returns the names of the partitions created. Does nothing unless 'claims' is partitioned.
+    """
+    if not is_partitioned(connection):
+        return []
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    months_ahead = settings.partition_months_ahead if months_ahead is None else months_ahead
+    first = month_start(today or datetime.utcnow())
+    return [
+        partition_name(add_months(first, i))
+        for i in range(months_ahead + 1)
+        if create_partition(connection, add_months(first, i))
+    ]
+
+
+def drop_empty_partitions(connection, before: date) -> list[str]:
+    """
+    Drop the monthly partitions for months before 'before' that hold no rows (e.g. after archive.py ran).
+    Returns the names of the partitions dropped. A claim submitted later for such a month lands in the default partition.
+    """
+    if not is_partitioned(connection):
+        return []
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    dropped = []
+    for name in existing_partitions(connection):
+        if name == DEFAULT_PARTITION or name >= partition_name(before):
+            continue
+        if connection.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is None:
+            connection.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def maintain(engine) -> list[str]:
+    """
+    Run 'ensure_partitions' in its own transaction (called periodically by each API worker).
+    """
+    with engine.begin() as connection:
+        return ensure_partitions(connection)
+
+
+# -----------------------------
+# Converting an existing table (migration 6)
+# -----------------------------
+def partition_claims_table(connection) -> None:
+    """
+    Rebuild 'claims' as a table partitioned by month of submitted_at, keeping its rows, ids and sequence.
+    The primary key becomes (id, submitted_at): PostgreSQL requires the partition key in every unique index.
+    Takes an exclusive lock on 'claims' while the rows are copied.
+    """
+    if connection.dialect.name != "postgresql" or is_partitioned(connection):
+        return
+
+    # The partition key can't be NULL in the primary key (only very old rows can lack a submission time)
+    connection.execute(text("UPDATE claims SET submitted_at = timezone('utc', now()) WHERE submitted_at IS NULL"))
+    first, last = connection.execute(text("SELECT min(submitted_at), max(submitted_at) FROM claims")).one()
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence('claims', 'id')")).scalar()
+
+    connection.execute(text("ALTER TABLE claims RENAME TO claims_unpartitioned"))
+    if sequence is not None:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))  # Or it would be dropped with the old table
+    connection.execute(text(
+        "CREATE TABLE claims (LIKE claims_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (submitted_at)"
+    ))
+    connection.execute(text("ALTER TABLE claims ALTER COLUMN submitted_at SET NOT NULL"))
+    connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF claims DEFAULT"))
+
+    # One partition per month that has claims, and the months up to PARTITION_MONTHS_AHEAD from now
+    month = month_start(first) if first is not None else month_start(datetime.utcnow())
+    last_month = max(month_start(last or datetime.utcnow()), add_months(month_start(datetime.utcnow()), settings.partition_months_ahead))
+    while month <= last_month:
+        create_partition(connection, month)
+        month = add_months(month, 1)
+
+    # Copy the rows before building the indexes (faster), then drop the old table with its indexes and triggers
+    connection.execute(text("INSERT INTO claims SELECT * FROM claims_unpartitioned"))
+    if sequence is not None:
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY claims.id"))
+    connection.execute(text("DROP TABLE claims_unpartitioned"))
+
+    connection.execute(text("ALTER TABLE claims ADD CONSTRAINT claims_pkey PRIMARY KEY (id, submitted_at)"))
+    for index in models.Claim.__table__.indexes:
+        index.create(connection)
+    stats.install_triggers(connection)
+    search.install(connection)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create the monthly partitions of the claims table (PostgreSQL)")
+    parser.add_argument("command", nargs="?", choices=["maintain", "status"], default="maintain")
+    args = parser.parse_args()
+
+    from .database import engine
+
+    if args.command == "status":
+        with engine.begin() as connection:
+            if not is_partitioned(connection):
+                print("'claims' is not partitioned (run 'python -m app.migrate' on PostgreSQL)")
+                return
+            for name, estimate in existing_partitions(connection).items():
+                print(f"{name:<20} ~{estimate} rows")
+        return
+
+    created = maintain(engine)
+    print(f"Created partitions: {', '.join(created)}" if created else "Partitions are up to date")
+
+
+if __name__ == "__main__":
+    main()
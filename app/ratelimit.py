@@ -0,0 +1,311 @@
+# Per-client rate limiting and load shedding (ASGI middleware)
+#
+# Two checks run before routing, so a rejected request never reaches a dependency and never takes a database
+# session from the pool:
+#   - a token bucket per API client and route class: reads and writes get separate buckets (RATE_LIMIT_READ_* /
+#     RATE_LIMIT_WRITE_*), and RATE_LIMIT_ROUTES gives single routes their own. An empty bucket answers 429.
+#   - a cap on the requests in progress in this worker (MAX_IN_FLIGHT). Past it, new requests answer 503 at once
+#     instead of queueing for a pool connection until DB_POOL_TIMEOUT and timing out for every client.
+# Both answers carry Retry-After, in seconds.
+#
+# Clients are told apart by the RATE_LIMIT_CLIENT_HEADER header (X-API-Key), or by their address without it.
+# The header is only believed if it holds one of RATE_LIMIT_API_KEYS, or if RATE_LIMIT_TRUST_CLIENT_HEADER says a
+# proxy authenticated the client and set it: otherwise a client could send a new key with each request and start
+# with a full bucket every time, or send another client's key and use up its quota.
+# The buckets live in this process (RATE_LIMIT_BACKEND=memory, so each worker allows the full rate) or in Redis
+# (RATE_LIMIT_BACKEND=redis, shared by every worker and host).
+
+import functools
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from . import metrics
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Never limited: Prometheus must be able to scrape an overloaded worker
+EXEMPT_PATHS = {"/metrics"}
+# Not counted in MAX_IN_FLIGHT: long polls wait without holding a database connection (see changes.poll_changes)
+IN_FLIGHT_EXEMPT_PATHS = EXEMPT_PATHS | {"/claims/changes"}
+
+rate_limited = metrics.registry.register(metrics.Counter("http_requests_rate_limited_total", "Requests answered 429 because the client's bucket was empty"))
+shed = metrics.registry.register(metrics.Counter("http_requests_shed_total", "Requests answered 503 because MAX_IN_FLIGHT requests were in progress"))
+limiter_errors = metrics.registry.register(metrics.Counter("rate_limiter_errors_total", "Bucket checks that failed and let the request through"))
+
+_in_flight = 0  # Requests in progress in this worker, over every middleware instance (each one caps its own)
+in_flight = metrics.registry.register(metrics.Gauge(
+    "http_requests_in_flight", "Requests in progress in this worker (the ones MAX_IN_FLIGHT counts)", lambda: _in_flight,
+))
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # Tokens added per second (sustained requests per second)
+    burst: int   # Bucket size: requests a client can make at once after being idle
+
+
+def parse_route_limits(spec: str) -> dict:
+    """
+    Parse RATE_LIMIT_ROUTES, e.g. "POST /claims/bulk=1/5, GET /claims/export=0.2/2" (rate/burst per route path,
+    as declared in main.py) into {("POST", "/claims/bulk"): Limit(1.0, 5), ...}.
+    """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            route, values = entry.rsplit("=", 1)
+            method, path = route.split()
+            rate, burst = values.split("/")
+            limits[(method.upper(), path)] = Limit(float(rate), int(burst))
+        except ValueError:
+            raise ValueError(f"RATE_LIMIT_ROUTES entries look like 'POST /claims/bulk=1/5', got {entry!r}") from None
+    return limits
+
+
+# -----------------------------
+# Limiter interface
+# -----------------------------
+class RateLimiter:
+    """
+    Base class for bucket backends; this one never limits (RATE_LIMIT_BACKEND=none).
+    """
+
+    name = "none"
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        """
+        Take one token from bucket 'key'. Returns 0 if there was one, else the seconds until there will be.
+        """
+        return 0.0
+
+
+# -----------------------------
+# In-process token buckets
+# -----------------------------
+class MemoryRateLimiter(RateLimiter):
+    """
+    Keeps the buckets of up to 'max_buckets' clients in this process, least recently used dropped first
+    (a dropped bucket comes back full). Each worker process counts on its own.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_buckets: int = 10000, clock=time.monotonic):
+        self.max_buckets, self.clock = max_buckets, clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        now = self.clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (limit.burst, now))
+            # Refill for the time since the last request, up to the bucket size
+            tokens = min(limit.burst, tokens + (now - updated_at) * limit.rate)
+            if tokens >= 1:
+                tokens, wait = tokens - 1, 0.0
+            else:
+                wait = (1 - tokens) / limit.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# -----------------------------
+# Redis token buckets (shared by every worker)
+# -----------------------------
+# Refill and take in one round trip, atomically. The time comes from the Redis server (TIME before a write needs
+# Redis 5+), so the hosts' clocks don't matter. Buckets expire once they would be full again. Returns the wait as a string (Lua numbers become integers).
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Keeps the buckets in Redis, one hash per client and route class, so the limits hold across all workers.
+    Redis errors are logged and let the request through: an outage turns rate limiting off, it doesn't fail requests.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "ratelimit:", client=None):
+        if client is None:
+            import redis.asyncio  # Only needed when this backend is selected; async so the event loop isn't blocked
+            client = redis.asyncio.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        self.client, self.prefix = client, prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str, limit: Limit) -> float:
+        try:
+            wait = await self._script(keys=[self.prefix + key], args=[limit.rate, limit.burst])
+        except Exception:
+            logger.warning("Rate limit check failed", exc_info=True)
+            limiter_errors.inc(backend=self.name)
+            return 0.0
+        return float(wait.decode() if isinstance(wait, bytes) else wait)
+
+
+def build_limiter() -> RateLimiter:
+    """
+    Create the backend selected by RATE_LIMIT_BACKEND.
+    """
+    if settings.rate_limit_backend == "memory":
+        return MemoryRateLimiter(max_buckets=settings.rate_limit_max_clients)
+    if settings.rate_limit_backend == "redis":
+        return RedisRateLimiter(url=settings.redis_url)
+    return RateLimiter()
+
+
+# -----------------------------
+# ASGI middleware
+# -----------------------------
+class RateLimitMiddleware:
+    """
+    Sheds requests past 'max_in_flight' (0 = no cap) with 503, then takes a token from the client's bucket for
+    the route with 'limiter' and answers 429 if it was empty. 'routes' is the app's route list, used to find the
+    route path (e.g. /claims/{claim_id}) that RATE_LIMIT_ROUTES refers to; routing itself hasn't run yet.
+    Arguments left out come from the settings.
+    """
+
+    def __init__(
+        self,
+        app,
+        routes: list,
+        limiter: Optional[RateLimiter] = None,
+        read_limit: Optional[Limit] = None,
+        write_limit: Optional[Limit] = None,
+        route_limits: Optional[dict] = None,
+        max_in_flight: Optional[int] = None,
+        client_header: Optional[str] = None,
+        api_keys: Optional[list[str]] = None,
+    ):
+        self.app, self.routes = app, routes
+        self.limiter = limiter if limiter is not None else build_limiter()
+        self.read_limit = read_limit or Limit(settings.rate_limit_read_rate, settings.rate_limit_read_burst)
+        self.write_limit = write_limit or Limit(settings.rate_limit_write_rate, settings.rate_limit_write_burst)
+        self.route_limits = route_limits if route_limits is not None else parse_route_limits(settings.rate_limit_routes)
+        self.max_in_flight = max_in_flight if max_in_flight is not None else settings.max_in_flight
+        self.client_header = (client_header or settings.rate_limit_client_header).lower().encode()
+        self.known_keys = trusted_keys() if api_keys is None else key_digests(tuple(api_keys))
+        self.in_flight = 0  # Only changed on the event loop, so no lock
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        counted = scope["path"] not in IN_FLIGHT_EXEMPT_PATHS
+        if counted and 0 < self.max_in_flight <= self.in_flight:
+            shed.inc(method=scope["method"])
+            await reject(scope, receive, send, 503, "The server is busy; retry later", settings.overload_retry_after)
+            return
+
+        if self.limiter.name != "none":
+            route, bucket, limit = self.route_limit(scope)
+            owner = client_key(scope, self.client_header, self.known_keys)
+            wait = await self.limiter.acquire(f"{owner}:{bucket}", limit) if limit.rate > 0 else 0.0
+            if wait > 0:
+                rate_limited.inc(method=scope["method"], route=route)
+                await reject(scope, receive, send, 429, "Rate limit exceeded; retry later", wait)
+                return
+
+        if not counted:
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        self.in_flight += 1
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            _in_flight -= 1
+
+    def route_limit(self, scope) -> tuple[str, str, Limit]:
+        """
+        The path of the route that will handle the request ('unmatched' if none), its bucket name and its limit.
+        Routes in RATE_LIMIT_ROUTES have a bucket of their own; the others share the client's 'read' or 'write' bucket.
+        A rate of 0 turns the limit off.
+        """
+        route = "unmatched"
+        for candidate in self.routes:
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate.path
+                break
+        limit = self.route_limits.get((scope["method"], route))
+        if limit is not None:
+            return route, f"{scope['method']} {route}", limit
+        if scope["method"] in READ_METHODS:
+            return route, "read", self.read_limit
+        return route, "write", self.write_limit
+
+
+def key_digest(key: bytes) -> str:
+    # API keys aren't kept (or stored in Redis) as is
+    return hashlib.sha256(key).hexdigest()[:32]
+
+
+@functools.lru_cache(maxsize=8)
+def key_digests(keys: tuple) -> frozenset:
+    return frozenset(key_digest(key.encode()) for key in keys)
+
+
+def trusted_keys() -> Optional[frozenset]:
+    """
+    The digests of the API keys that name a client (RATE_LIMIT_API_KEYS), or None if any value of the header does
+    (RATE_LIMIT_TRUST_CLIENT_HEADER: a proxy in front of the app authenticated the client and set the header).
+    """
+    if settings.rate_limit_trust_client_header:
+        return None
+    return key_digests(tuple(settings.rate_limit_api_keys))
+
+
+def client_key(scope, header: bytes, known_keys: Optional[frozenset] = frozenset()) -> str:
+    """
+    The bucket owner: a digest of the API key header if it is one of 'known_keys' (any key if None),
+    else the client's address. An unknown key is no identity: anyone can make one up, or send someone else's.
+    """
+    for name, value in scope["headers"]:
+        if name == header and value:
+            digest = key_digest(value)
+            if known_keys is None or digest in known_keys:
+                return "key:" + digest
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+async def reject(scope, receive, send, status_code: int, detail: str, retry_after: float) -> None:
+    # Same body as an HTTPException; Retry-After is whole seconds, rounded up so a retry isn't early
+    response = JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+    await response(scope, receive, send)
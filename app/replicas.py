@@ -0,0 +1,248 @@
+# Read replicas (DATABASE_REPLICA_URLS)
+#
+# The sessions of GET requests read from a replica, taken round-robin among the replicas whose lag is below
+# REPLICA_MAX_LAG; everything else uses the primary. Inside such a session, flushes and INSERT/UPDATE/DELETE
+# statements still go to the primary (RoutingSession), so a write in crud.py can never land on a replica.
+#
+# Reads fall back to the primary when:
+#   - the same client wrote in the last REPLICA_STICKY_SECONDS (read-your-writes: a client that just created a claim
+#     gets it back, even if the replicas haven't replayed the insert yet). Clients are told apart as for rate limiting.
+#   - no replica is within REPLICA_MAX_LAG, or none answered the last lag check (every REPLICA_LAG_CHECK_INTERVAL seconds).
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .config import settings
+from .ratelimit import READ_METHODS, client_key, trusted_keys
+
+logger = logging.getLogger(__name__)
+
+read_sessions = metrics.registry.register(metrics.Counter(
+    "db_read_sessions_total", "Sessions of GET requests by where their reads went (replica, or primary and why)",
+))
+
+# Seconds a PostgreSQL standby is behind: 0 when it has replayed everything it received, else the age of the last
+# transaction it replayed. On a server that isn't a standby both LSNs are NULL and the result is 0.
+POSTGRESQL_LAG_QUERY = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+def measure_lag(engine) -> float:
+    """
+    How many seconds the database behind 'engine' is behind the primary. Raises if it can't be reached.
+    """
+    # Other databases (the SQLite files of the tests) have no replication to measure: only check the connection
+    query = POSTGRESQL_LAG_QUERY if engine.dialect.name == "postgresql" else "SELECT 0"
+    with engine.connect() as connection:
+        return float(connection.execute(text(query)).scalar() or 0)
+
+
+# -----------------------------
+# Sessions that read from a replica
+# -----------------------------
+class RoutingSession(Session):
+    """
+    A session bound to the primary that runs its reads on the engine in info["replica"], when one is set.
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary, and so does anything that doesn't say
+    which statement it is about to run (the ORM's bulk INSERT asks without one).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not self._flushing and clause is not None and not clause.is_dml:
+            return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def reads_from_replica(db) -> bool:
+    """
+    Whether 'db' (a Session or an AsyncSession) reads from a replica; such reads may be up to REPLICA_MAX_LAG old.
+    """
+    return db.info.get("replica") is not None
+
+
+# -----------------------------
+# Read-your-writes: clients that wrote recently
+# -----------------------------
+class StickyClients:
+    """
+    Base class for the stores of recent writers; this one forgets every write (REPLICA_STICKY_SECONDS=0).
+    """
+
+    name = "none"
+
+    def record(self, client: str) -> None:
+        pass
+
+    def is_sticky(self, client: str) -> bool:
+        return False
+
+
+class MemoryStickyClients(StickyClients):
+    """
+    Remembers the clients that wrote in the last 'seconds' in this process (up to 'max_clients'). A client's next
+    request may reach another worker, which doesn't know about the write; use the Redis store with several workers.
+    """
+
+    name = "memory"
+
+    def __init__(self, seconds: float, max_clients: int = 10000, clock=time.monotonic):
+        self.seconds, self.max_clients, self.clock = seconds, max_clients, clock
+        self._writes = OrderedDict()  # client -> time of its last write, oldest first
+        self._lock = threading.Lock()
+
+    def record(self, client: str) -> None:
+        with self._lock:
+            self._writes.pop(client, None)
+            self._writes[client] = self.clock()
+            while len(self._writes) > self.max_clients:
+                self._writes.popitem(last=False)
+
+    def is_sticky(self, client: str) -> bool:
+        written_at = self._writes.get(client)
+        return written_at is not None and self.clock() - written_at < self.seconds
+
+
+class RedisStickyClients(StickyClients):
+    """
+    Keeps one expiring key per recent writer in Redis, so every worker sees the writes of the others.
+    If Redis can't be reached, reads go to the primary: slower, but never stale.
+    """
+
+    name = "redis"
+
+    def __init__(self, seconds: float, url: str = "redis://localhost:6379/0", prefix: str = "wrote:", client=None):
+        if client is None:
+            import redis  # Only needed when this store is selected
+            client = redis.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        self.seconds, self.client, self.prefix = seconds, client, prefix
+
+    def record(self, client: str) -> None:
+        try:
+            self.client.set(self.prefix + client, 1, px=max(1, int(self.seconds * 1000)))
+        except Exception:
+            logger.warning("Recording a write for read-your-writes failed", exc_info=True)
+
+    def is_sticky(self, client: str) -> bool:
+        try:
+            return bool(self.client.exists(self.prefix + client))
+        except Exception:
+            logger.warning("Read-your-writes check failed; reading from the primary", exc_info=True)
+            return True
+
+
+def build_sticky_clients() -> StickyClients:
+    """
+    Create the store selected by REPLICA_STICKY_BACKEND (none when REPLICA_STICKY_SECONDS is 0).
+    """
+    if settings.replica_sticky_seconds <= 0:
+        return StickyClients()
+    if settings.replica_sticky_backend == "redis":
+        return RedisStickyClients(settings.replica_sticky_seconds, url=settings.redis_url)
+    return MemoryStickyClients(settings.replica_sticky_seconds)
+
+
+# -----------------------------
+# The replicas and how reads are routed to them
+# -----------------------------
+class Replica:
+    def __init__(self, url: str, engine, async_engine_factory: Optional[Callable] = None):
+        self.url, self.engine = url, engine
+        self.lag: Optional[float] = None  # Seconds behind at the last check; None = not checked yet, or unreachable
+        self._async_engine_factory, self._async_engine = async_engine_factory, None
+
+    @property
+    def async_engine(self):
+        # Built on first use, like the primary's async engine (CLAIMS_DB_MODE=async)
+        if self._async_engine is None:
+            self._async_engine = self._async_engine_factory(self.url)
+        return self._async_engine
+
+
+class ReplicaSet:
+    """
+    The replicas of the primary, with their lag at the last 'check_lag'. A new set is empty of healthy replicas
+    until it has been checked once.
+    """
+
+    def __init__(self, urls: list[str], engine_factory: Callable, async_engine_factory: Optional[Callable] = None,
+                 max_lag: float = 5.0, sticky: Optional[StickyClients] = None):
+        self.replicas = [Replica(url, engine_factory(url), async_engine_factory) for url in urls]
+        self.max_lag = max_lag
+        self.sticky = sticky or StickyClients()
+        self._turn = itertools.count()  # next() on a count is atomic, so threads share it without a lock
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def check_lag(self) -> None:
+        """
+        Measure every replica's lag; the ones behind by more than 'max_lag', or unreachable, get no reads until
+        a later check finds them caught up.
+        """
+        for replica in self.replicas:
+            was_healthy = self.healthy(replica)
+            try:
+                replica.lag = measure_lag(replica.engine)
+            except Exception:
+                logger.warning("Replica %s is unreachable", replica.engine.url, exc_info=True)
+                replica.lag = None
+            if was_healthy and not self.healthy(replica):
+                logger.warning("Replica %s left the rotation (lag: %s s)", replica.engine.url, replica.lag)
+            elif self.healthy(replica) and not was_healthy:
+                logger.info("Replica %s is in the rotation", replica.engine.url)
+
+    def healthy(self, replica: Replica) -> bool:
+        return replica.lag is not None and replica.lag <= self.max_lag
+
+    def choose(self, scope) -> Optional[Replica]:
+        """
+        The replica the session of this request (an ASGI scope) reads from, or None for the primary.
+        """
+        if not self.replicas or scope["method"] not in READ_METHODS:
+            return None
+        if self.sticky.is_sticky(request_client(scope)):
+            read_sessions.inc(target="primary", reason="recent_write")
+            return None
+        healthy = [replica for replica in self.replicas if self.healthy(replica)]
+        if not healthy:
+            read_sessions.inc(target="primary", reason="replicas_lagging")
+            return None
+        read_sessions.inc(target="replica", reason="round_robin")
+        return healthy[next(self._turn) % len(healthy)]
+
+    def finished(self, scope) -> None:
+        """
+        Called when the session of a request is closed: a client's writes make its next reads go to the primary.
+        """
+        if self.replicas and scope["method"] not in READ_METHODS:
+            self.sticky.record(request_client(scope))
+
+    def dispose(self, close: bool = True) -> None:
+        for replica in self.replicas:
+            replica.engine.dispose(close=close)
+            if replica._async_engine is not None:
+                # Bound to an event loop: a forked child builds its own on first use
+                replica._async_engine.sync_engine.dispose(close=close)
+                replica._async_engine = None
+
+    async def dispose_async(self) -> None:
+        for replica in self.replicas:
+            replica.engine.dispose()
+            if replica._async_engine is not None:
+                await replica._async_engine.dispose()
+
+
+def request_client(scope) -> str:
+    # The same client identity as rate limiting (a trusted RATE_LIMIT_CLIENT_HEADER, else the address)
+    return client_key(scope, settings.rate_limit_client_header.lower().encode(), trusted_keys())
@@ -2,12 +2,16 @@
 # Importing BaseModel from Pydantic to define request/response schemas
 
 # Import necessary modules from Pydantic for data validation
-from pydantic import BaseModel,  Field, field_validator, validator, ConfigDict
+from pydantic import BaseModel,  Field, field_validator, model_validator, validator, ConfigDict, ValidationError, PlainSerializer
 
 # Optional type hint and Enum class for restricting field values
-from typing import Optional
+from typing import Annotated, Any, Optional
 from enum import Enum
 
+# Amounts are exact decimals (see money.py)
+from decimal import Decimal
+from . import money
+
 # For handling timestamps like 'submitted_at'
 from datetime import datetime
 from datetime import datetime, UTC
@@ -24,13 +28,43 @@ class ClaimStatus(str, Enum):
     closed = "closed"
 
 
+# Allowed status changes for the batch status-transition API (POST /claims/status-transitions).
+# 'closed' is final: nothing moves out of it.
+CLAIM_STATUS_TRANSITIONS = {
+    ClaimStatus.submitted: {ClaimStatus.pending, ClaimStatus.approved, ClaimStatus.rejected, ClaimStatus.closed},
+    ClaimStatus.pending: {ClaimStatus.approved, ClaimStatus.rejected, ClaimStatus.closed},
+    ClaimStatus.approved: {ClaimStatus.closed},
+    ClaimStatus.rejected: {ClaimStatus.pending, ClaimStatus.closed},  # A rejected claim can be appealed
+    ClaimStatus.closed: set(),
+}
+
+
+def allowed_sources(target: ClaimStatus) -> list[ClaimStatus]:
+    """
+    Statuses a claim may be in to move to 'target'.
+    """
+    return [source for source, targets in CLAIM_STATUS_TRANSITIONS.items() if target in targets]
+
+
+# A money amount: an exact Decimal with at most two decimal places (whole cents), sent and received as a JSON number.
+# Amounts with fractions of a cent (e.g. 0.30000000000000004) are rejected rather than rounded.
+Amount = Annotated[
+    Decimal,
+    Field(max_digits=money.MAX_DIGITS, decimal_places=2),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
+
+# A sum of amounts (unbounded), also written as a JSON number
+AmountTotal = Annotated[Decimal, PlainSerializer(float, return_type=float, when_used="json")]
+
+
 # Base schema used for both creation and update
 class ClaimBase(BaseModel):
     # claimant_name is required, must have at least 1 character
     claimant_name: str = Field(..., min_length=1, description="Name of the claimant (required)")
 
-    # amount is required, must be a float greater than 0
-    amount: float = Field(..., gt=0, description="Claim amount must be greater than 0")
+    # amount is required, must be greater than 0, in whole cents
+    amount: Amount = Field(..., gt=0, description="Claim amount must be greater than 0 (at most two decimal places)")
 
     # status must be one of the values defined in ClaimStatus Enum
     status: ClaimStatus = Field(..., description="Claim status")
@@ -43,9 +77,33 @@ class ClaimBase(BaseModel):
         return value
 
 
+# Most service lines one claim may carry (an 837P professional claim allows 50)
+MAX_CLAIM_LINES = 50
+
+
+# One service line sent with a new claim
+class ClaimLineCreate(BaseModel):
+    # Codes are stored upper case; ICD-10-CM codes may be sent with or without their dot (J20.9 or J209)
+    cpt_code: str = Field(..., pattern=r"^[0-9A-Z]{5}$", description="CPT or HCPCS procedure code, e.g. 99213")
+    icd_code: str = Field(..., pattern=r"^[A-Z][0-9][0-9A-Z](\.?[0-9A-Z]{1,4})?$", description="ICD-10-CM diagnosis code, e.g. J20.9")
+    units: int = Field(1, ge=1, le=9999, description="Units of service")
+    charge: Amount = Field(..., gt=0, description="Line charge (at most two decimal places)")
+
+    @field_validator('cpt_code', 'icd_code', mode='before')
+    def upper_case_code(cls, value):
+        return value.strip().upper() if isinstance(value, str) else value
+
+
 # Schema used when creating a new claim – inherits from ClaimBase
 class ClaimCreate(ClaimBase):
-    pass  # No additional fields needed, just reuse base fields
+    # Optional service lines, created in the same transaction as the claim
+    lines: list[ClaimLineCreate] = Field([], max_length=MAX_CLAIM_LINES, description="Service lines; their charges must add up to 'amount'")
+
+    @model_validator(mode="after")
+    def lines_add_up(self):
+        if self.lines and sum(line.charge for line in self.lines) != self.amount:
+            raise ValueError("The line charges must add up to the claim amount")
+        return self
 
 
 # Schema used when updating an existing claim – also inherits from ClaimBase
@@ -53,6 +111,24 @@ class ClaimUpdate(ClaimBase):
     pass  # Reuse base fields for updates too
 
 
+# Schema used for partial updates (PATCH) – every field is optional, but a field that is sent must be valid
+class ClaimPatch(BaseModel):
+    # Defaults are None so omitted fields can be told apart; an explicit null is rejected by the types
+    claimant_name: str = Field(None, min_length=1, description="Name of the claimant")
+    amount: Amount = Field(None, gt=0, description="Claim amount must be greater than 0 (at most two decimal places)")
+    status: ClaimStatus = Field(None, description="Claim status")
+
+    @field_validator('claimant_name')
+    def name_cannot_be_empty(cls, value):
+        if not value.strip():
+            raise ValueError('Claimant name cannot be empty or just spaces')
+        return value
+
+    def changes(self) -> dict:
+        # Only the fields present in the request body
+        return self.model_dump(exclude_unset=True)
+
+
 # Schema for returning a full claim, including the auto-generated ID and submitted timestamp
 class Claim(ClaimBase):
     id: int  # Auto-generated ID
@@ -63,3 +139,178 @@ class Claim(ClaimBase):
         model_config = ConfigDict(from_attributes=True)
         #form_attributes = True
         #orm_mode = True
+
+
+# One service line of a claim, as returned with it
+class ClaimLine(ClaimLineCreate):
+    model_config = ConfigDict(from_attributes=True)
+
+    line_number: int  # 1, 2, ... in the order the lines were sent
+
+
+# A claim with its service lines (POST /claims, GET /claims and GET /claims/{claim_id}).
+# The other responses (search, export, PUT/PATCH, bulk, change feed) carry the claim without its lines.
+class ClaimWithLines(Claim):
+    lines: list[ClaimLine] = []
+
+
+# Filters shared by listing and set-based updates (all optional, combined with AND)
+class ClaimFilter(BaseModel):
+    status: Optional[ClaimStatus] = None
+    min_amount: Optional[float] = Field(None, ge=0)
+    max_amount: Optional[float] = Field(None, ge=0)
+    submitted_from: Optional[datetime] = None
+    submitted_to: Optional[datetime] = None
+
+
+# One requested status change
+class StatusTransition(BaseModel):
+    id: int
+    status: ClaimStatus
+
+
+# Body of POST /claims/status-transitions: either a list of (id, status) pairs, or a filter plus a target status
+class StatusTransitionRequest(BaseModel):
+    transitions: Optional[list[StatusTransition]] = Field(None, max_length=100000)
+    filter: Optional[ClaimFilter] = None
+    target_status: Optional[ClaimStatus] = None
+
+    @model_validator(mode="after")
+    def one_mode_only(self):
+        by_id = self.transitions is not None
+        by_filter = self.filter is not None or self.target_status is not None
+        if by_id == by_filter:
+            raise ValueError("Send either 'transitions', or 'filter' together with 'target_status'")
+        if by_filter and (self.filter is None or self.target_status is None):
+            raise ValueError("'filter' and 'target_status' must be sent together")
+        if by_id and len({item.id for item in self.transitions}) != len(self.transitions):
+            raise ValueError("Each claim ID may appear only once in 'transitions'")
+        return self
+
+
+# A requested change that the transition table doesn't allow
+class RejectedTransition(BaseModel):
+    id: int
+    from_status: ClaimStatus
+    to_status: ClaimStatus
+
+
+# Response of POST /claims/status-transitions
+class StatusTransitionResult(BaseModel):
+    updated: list[int]  # IDs whose status was changed
+    missing: list[int] = []  # Requested IDs that don't exist
+    rejected: list[RejectedTransition] = []  # Requested changes not allowed from the claim's current status
+
+
+# One group of GET /claims/stats
+class ClaimStatsRow(BaseModel):
+    status: Optional[ClaimStatus] = None  # Set when grouping by status
+    period: Optional[str] = None  # Day (YYYY-MM-DD) or hour (ISO datetime) when grouping by time
+    claim_count: int
+    amount_total: AmountTotal
+
+
+# One group of GET /claims/totals: exact sums computed from the claims themselves
+class ClaimTotalsRow(BaseModel):
+    status: Optional[ClaimStatus] = None  # Set when grouping by status
+    claim_count: int
+    amount_total: AmountTotal  # JSON number (exact up to about 90 trillion)
+    amount_total_cents: int  # The same total in cents, exact at any size
+
+
+# One status of GET /claims/totals/reconcile: the claims table against the claim_stats aggregates
+class ReconciliationRow(BaseModel):
+    status: ClaimStatus
+    claim_count: int  # From 'claims'
+    amount_total_cents: int
+    stats_claim_count: int  # From 'claim_stats'
+    stats_amount_total_cents: int
+    matches: bool
+
+
+# Response of GET /claims/totals/reconcile
+class Reconciliation(BaseModel):
+    matches: bool  # True when every status agrees
+    statuses: list[ReconciliationRow]
+
+
+# Kinds of claim changes in the change feed (GET /claims/changes)
+class ChangeType(str, Enum):
+    created = "created"
+    updated = "updated"
+    deleted = "deleted"
+    archived = "archived"  # Moved into the archive files (see archive.py); gone from the API like a deleted claim
+
+
+# One event of GET /claims/changes
+class ClaimChange(BaseModel):
+    position: int  # Position in the feed; send the last one seen as 'since' to read on from there
+    type: ChangeType
+    claim_id: int
+    version: Optional[int] = None  # The claim's version after the change (its ETag)
+    occurred_at: datetime  # When the change was written
+    claim: dict[str, Any]  # The claim (without its lines) as PUT/PATCH return it after the change (before it, for deletes)
+
+
+# Response of GET /claims/changes
+class ChangeFeed(BaseModel):
+    changes: list[ClaimChange]  # In feed order
+    next_since: int  # 'since' for the next request: the last position returned, or the same 'since' if nothing was new
+
+
+# Metadata of a file attached to a claim (POST/GET /claims/{claim_id}/attachments); the file itself is
+# downloaded from /claims/{claim_id}/attachments/{id}
+class Attachment(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    claim_id: int
+    filename: Optional[str] = None  # As given at upload, without directories
+    content_type: str
+    size: int  # Bytes
+    sha256: str  # Hex digest of the content (also the download's ETag)
+    uploaded_at: datetime
+
+
+# Response of POST /claims when CLAIMS_INTAKE_MODE=kafka (202 Accepted)
+class IntakeReceipt(BaseModel):
+    tracking_id: str  # Look the claim up with GET /claims/intake/{tracking_id} once it has been written
+    status: str = "queued"
+
+
+# Error reported for one record of a bulk request that could not be created
+class BulkClaimError(BaseModel):
+    index: int  # Position of the record in the request body
+    errors: list[dict[str, Any]]  # Validation errors (same shape as FastAPI's 422 details) or a DB error
+
+
+# Response of POST /claims/bulk
+class BulkClaimResult(BaseModel):
+    created: list[Claim]  # Created claims, in the same order as the request (rejected records skipped)
+    errors: list[BulkClaimError]  # One entry per rejected record
+
+
+# Validate the raw records of a bulk request one by one
+def split_valid_claims(records: list[dict[str, Any]]):
+    """
+    Returns (valid ClaimCreate objects, their indexes in 'records', error dicts for the invalid records).
+    """
+    valid_claims, valid_indexes, errors = [], [], []
+    for index, record in enumerate(records):
+        try:
+            valid_claims.append(ClaimCreate.model_validate(record))
+            valid_indexes.append(index)
+        except ValidationError as exc:
+            errors.append({"index": index, "errors": exc.errors(include_url=False, include_context=False)})
+    return valid_claims, valid_indexes, errors
+
+
+# Combine validation errors and DB errors into the body of a BulkClaimResult
+def bulk_result(created: list, errors: list[dict], failed: list[tuple[int, str]], valid_indexes: list[int]) -> dict:
+    """
+    'failed' holds (position in the valid claims, DB error message); positions are mapped back to request indexes.
+    """
+    for position, message in failed:
+        errors.append({"index": valid_indexes[position], "errors": [{"type": "database_error", "msg": message}]})
+    errors.sort(key=lambda error: error["index"])
+    return {"created": created, "errors": errors}
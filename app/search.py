@@ -0,0 +1,161 @@
+# Claimant name search (GET /claims/search)
+#
+# PostgreSQL: pg_trgm word similarity, backed by a GiST trigram index on claims.claimant_name. The index answers
+# both the "similar enough" filter (<%) and the ranking (<<-> distance, nearest first), so a page of the best
+# matches is read straight from the index instead of scoring every matching claim and sorting them.
+#
+# SQLite (tests and local runs): an external-content FTS5 table with the trigram tokenizer, kept in sync by
+# triggers. The trigrams of the query are OR'ed together and the matches ranked by bm25, so partial names and
+# most misspellings still find the claims that share the most trigrams with the query. FTS5 trigrams don't
+# span word boundaries, so it is less forgiving than pg_trgm (e.g. two typos in a four-letter word).
+
+import base64
+from typing import Optional
+
+from sqlalchemy import Float, String, column, func, literal, literal_column, select, table, text
+
+from . import models
+
+SEARCH_PAGE_SIZE = 20        # Page size used when the client doesn't pass 'limit'
+MAX_SEARCH_PAGE_SIZE = 100   # Upper bound on 'limit'
+MAX_SEARCH_RESULTS = 1000    # No cursor is issued past this many results: deeper pages cost an OFFSET scan and nobody reads them
+
+SEARCH_INDEX = "ix_claims_claimant_name_trgm"
+
+
+# -----------------------------
+# DDL
+# -----------------------------
+PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # GiST rather than GIN: only GiST can return rows in similarity order (nearest-neighbour scan)
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON claims USING gist (claimant_name gist_trgm_ops)",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS claims_fts USING fts5(
+    claimant_name, content='claims', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS claims_fts_after_insert AFTER INSERT ON claims
+    BEGIN INSERT INTO claims_fts (rowid, claimant_name) VALUES (NEW.id, NEW.claimant_name); END""",
+    """CREATE TRIGGER IF NOT EXISTS claims_fts_after_update AFTER UPDATE OF claimant_name ON claims
+    WHEN OLD.claimant_name IS NOT NEW.claimant_name
+    BEGIN
+        INSERT INTO claims_fts (claims_fts, rowid, claimant_name) VALUES ('delete', OLD.id, OLD.claimant_name);
+        INSERT INTO claims_fts (rowid, claimant_name) VALUES (NEW.id, NEW.claimant_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS claims_fts_after_delete AFTER DELETE ON claims
+    BEGIN INSERT INTO claims_fts (claims_fts, rowid, claimant_name) VALUES ('delete', OLD.id, OLD.claimant_name); END""",
+]
+
+
+def install(connection, rebuild: bool = False) -> None:
+    """
+    Create the search index (and, on SQLite, its sync triggers). Safe to run more than once.
+    The SQLite FTS table is filled from 'claims' when it is new, or when 'rebuild' is set.
+    """
+    if connection.dialect.name == "postgresql":
+        for statement in PG_DDL:
+            connection.execute(text(statement))
+        return
+
+    is_new = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'claims_fts'")).first() is None
+    for statement in SQLITE_DDL:
+        connection.execute(text(statement))
+    if is_new or rebuild:
+        connection.execute(text("INSERT INTO claims_fts (claims_fts) VALUES ('rebuild')"))
+
+
+def uninstall(connection) -> None:
+    """
+    Drop the SQLite FTS table along with 'claims' (the PostgreSQL index goes with the table).
+    """
+    if connection.dialect.name != "postgresql":
+        connection.execute(text("DROP TABLE IF EXISTS claims_fts"))
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+claims_fts = table("claims_fts", column("rowid"), column("rank"))
+
+
+def fts_query(q: str) -> Optional[str]:
+    """
+    FTS5 expression matching any trigram of any word of 'q', e.g. 'Jon Smith' -> "jon" OR "smi" OR "mit" OR "ith".
+    None when no word is long enough to have a trigram.
+    """
+    grams = []
+    for word in q.lower().split():
+        for i in range(len(word) - 2):
+            gram = word[i:i + 3]
+            if gram not in grams:
+                grams.append(gram)
+    if not grams:
+        return None
+    return " OR ".join('"' + gram.replace('"', '""') + '"' for gram in grams)
+
+
+def search_statement(dialect_name: str, q: str, limit: int, offset: int = 0, columns: Optional[list] = None):
+    """
+    Build the SELECT for one page of claims matching 'q', best match first (ORM objects, or just 'columns' if given).
+    Returns None when 'q' can't match anything. Fetches one extra row to find out whether another page exists.
+    """
+    selected = columns if columns is not None else [models.Claim]
+    name = models.Claim.claimant_name
+
+    if dialect_name == "postgresql":
+        query = literal(q, String)
+        # '<%' uses pg_trgm.word_similarity_threshold (set by 'similarity_threshold_statement')
+        stmt = select(*selected).where(query.op("<%", is_comparison=True)(name))
+        rank = query.op("<<->", return_type=Float)(name)  # 1 - word_similarity: the GiST index returns rows in this order
+    else:
+        match = fts_query(q)
+        if match is None:
+            return None
+        stmt = (
+            select(*selected)
+            .select_from(models.Claim.__table__)
+            .join(claims_fts, claims_fts.c.rowid == models.Claim.id)
+            .where(literal_column("claims_fts").op("MATCH")(match))
+        )
+        rank = claims_fts.c.rank  # bm25: more (and rarer) shared trigrams rank first
+
+    return stmt.order_by(rank, models.Claim.id).offset(offset).limit(limit + 1)
+
+
+def similarity_threshold_statement(min_similarity: float):
+    """
+    Sets pg_trgm's word similarity threshold for the current transaction only (run before 'search_statement').
+    """
+    return select(func.set_config("pg_trgm.word_similarity_threshold", str(min_similarity), True))
+
+
+# -----------------------------
+# Cursors (positions in the ranking)
+# -----------------------------
+def encode_search_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"search|{offset}".encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> int:
+    """
+    Turn a cursor produced by 'encode_search_cursor' back into its offset. Raises ValueError if it is malformed.
+    """
+    try:
+        prefix, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if prefix != "search" or not 0 <= int(offset) <= MAX_SEARCH_RESULTS:
+            raise ValueError
+        return int(offset)
+    except Exception as exc:  # bad base64, wrong kind of cursor, bad offset
+        raise ValueError("Invalid cursor") from exc
+
+
+def split_results(rows: list, limit: int, offset: int) -> tuple[list, Optional[str]]:
+    """
+    Trim the extra row fetched by 'search_statement' and build the next cursor if there is another page.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit < MAX_SEARCH_RESULTS:
+            return rows, encode_search_cursor(offset + limit)
+    return rows, None
@@ -0,0 +1,82 @@
+# Production server: several uvicorn worker processes sharing one listening socket
+#
+#   python -m app.server                          # one worker per CPU core, on WEB_HOST:WEB_PORT (0.0.0.0:8000)
+#   python -m app.server --workers 4 --port 9000
+#
+# Each worker is a separate process with its own event loop, threadpool and database pool, so size the pool for
+# the total: workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below the database's max_connections
+# (or use DB_EXTERNAL_POOLER). Workers are started fresh (spawned, not forked from this process), so none of them
+# inherits a pool; database.reset_pools_after_fork covers servers that fork after importing the app instead.
+#
+# SIGTERM (or Ctrl+C) drains the workers: they stop accepting connections, finish the requests in flight for up
+# to WEB_GRACEFUL_TIMEOUT seconds, run the app's shutdown (background jobs stopped, pools closed), then exit.
+# A worker that dies is replaced. Run 'python -m app.migrate' before starting the server.
+
+import argparse
+import logging
+import os
+
+import uvicorn
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+APP = "app.main:app"
+
+
+def cpu_count() -> int:
+    # CPUs this process may run on (a container's CPU set), not every CPU of the machine
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_count(requested: int) -> int:
+    return requested if requested > 0 else cpu_count()
+
+
+def uvicorn_options(args) -> dict:
+    """
+    Keyword arguments for uvicorn.run() from the parsed command line.
+    """
+    return {
+        "host": args.host,
+        "port": args.port,
+        "workers": worker_count(args.workers),
+        "backlog": args.backlog,
+        "timeout_keep_alive": args.keep_alive,
+        # Past this many open connections + requests a worker answers 503 at once, instead of letting requests
+        # queue for a database connection until DB_POOL_TIMEOUT. Idle keep-alive connections count too.
+        "limit_concurrency": args.limit_concurrency or None,
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "access_log": args.access_log,
+        "log_level": args.log_level,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the claims API with several worker processes")
+    parser.add_argument("--host", default=settings.web_host, help="Address to listen on (WEB_HOST)")
+    parser.add_argument("--port", type=int, default=settings.web_port, help="Port to listen on (WEB_PORT)")
+    parser.add_argument("--workers", type=int, default=settings.web_workers, help="Worker processes, 0 = one per CPU core (WEB_WORKERS)")
+    parser.add_argument("--backlog", type=int, default=settings.web_backlog, help="Listen backlog (WEB_BACKLOG)")
+    parser.add_argument("--keep-alive", type=int, default=settings.web_keep_alive, help="Idle keep-alive timeout in seconds (WEB_KEEP_ALIVE)")
+    parser.add_argument("--limit-concurrency", type=int, default=settings.web_limit_concurrency, help="Connections + requests per worker before 503, 0 = no limit (WEB_LIMIT_CONCURRENCY)")
+    parser.add_argument("--graceful-timeout", type=int, default=settings.web_graceful_timeout, help="Seconds to finish in-flight requests after SIGTERM (WEB_GRACEFUL_TIMEOUT)")
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=settings.web_access_log, help="Log every request (WEB_ACCESS_LOG)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    options = uvicorn_options(args)
+    logging.basicConfig(level=args.log_level.upper())
+    if not settings.external_pooler:
+        logger.info(
+            "Starting %d workers; up to %d database connections in total",
+            options["workers"], options["workers"] * (settings.pool_size + settings.max_overflow),
+        )
+    uvicorn.run(APP, **options)
+
+
+if __name__ == "__main__":
+    main()
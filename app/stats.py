@@ -0,0 +1,305 @@
+# Pre-aggregated claim statistics (GET /claims/stats)
+# The 'claim_stats' table holds one row per (status, hour, shard) with a claim count and an amount total.
+# Database triggers on 'claims' keep it up to date inside the same transaction as every INSERT, UPDATE
+# and DELETE, so every write path (single, bulk, set-based status changes, ...) is covered and
+# the stats query reads O(groups) rows instead of scanning every claim.
+#
+# Amounts are whole cents (money.py), so the aggregate totals are exact integer sums; GET /claims/totals
+# computes the same sums straight from the claims, and GET /claims/totals/reconcile checks the two agree.
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import BigInteger, delete, func, insert, select, text, type_coerce
+from sqlalchemy.orm import Session
+
+from . import models, money, schemas
+from .crud import as_naive_utc, claim_filter_conditions
+
+# Rows for the same (status, hour) are spread over this many shards (by claim id), so concurrent
+# writers in the same hour don't all wait on a single aggregate row
+STATS_SHARDS = 8
+
+
+# -----------------------------
+# Trigger DDL
+# -----------------------------
+# SQLite: row-level triggers. Buckets are stored in the same text format SQLAlchemy uses for DateTime.
+SQLITE_BUCKET = "strftime('%Y-%m-%d %H:00:00.000000', {row}.submitted_at)"
+SQLITE_UPSERT = (
+    "ON CONFLICT (status, bucket, shard) DO UPDATE SET "
+    "claim_count = claim_count + excluded.claim_count, amount_total = amount_total + excluded.amount_total"
+)
+
+
+def _sqlite_delta(row: str, sign: str) -> str:
+    # Add (+1, +amount) or remove (-1, -amount) one claim from its bucket
+    return (
+        f"INSERT INTO claim_stats (status, bucket, shard, claim_count, amount_total) "
+        f"SELECT {row}.status, {SQLITE_BUCKET.format(row=row)}, {row}.id % {STATS_SHARDS}, {sign}1, {sign}{row}.amount "
+        f"WHERE {row}.submitted_at IS NOT NULL {SQLITE_UPSERT};"
+    )
+
+
+SQLITE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS claim_stats_after_insert AFTER INSERT ON claims
+    BEGIN {_sqlite_delta('NEW', '+')} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS claim_stats_after_update AFTER UPDATE OF status, amount, submitted_at ON claims
+    WHEN OLD.status IS NOT NEW.status OR OLD.amount IS NOT NEW.amount OR OLD.submitted_at IS NOT NEW.submitted_at
+    BEGIN {_sqlite_delta('OLD', '-')} {_sqlite_delta('NEW', '+')} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS claim_stats_after_delete AFTER DELETE ON claims
+    BEGIN {_sqlite_delta('OLD', '-')} END""",
+]
+
+# PostgreSQL: statement-level triggers with transition tables, so a multi-row INSERT or UPDATE
+# costs one aggregate upsert per (status, hour, shard) group rather than one per row.
+PG_UPSERT = (
+    "ON CONFLICT (status, bucket, shard) DO UPDATE SET "
+    "claim_count = claim_stats.claim_count + EXCLUDED.claim_count, "
+    "amount_total = claim_stats.amount_total + EXCLUDED.amount_total"
+)
+def _pg_rows(source: str, sign: str, where: str = "") -> str:
+    return (
+        f"SELECT r.status, date_trunc('hour', r.submitted_at) AS bucket, r.id % {STATS_SHARDS} AS shard, "
+        f"{sign}1 AS claim_count, {sign}r.amount AS amount_total FROM {source} "
+        f"WHERE r.submitted_at IS NOT NULL {where}"
+    )
+
+
+def _pg_function(name: str, rows_sql: str) -> str:
+    return f"""CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO claim_stats (status, bucket, shard, claim_count, amount_total)
+    SELECT status, bucket, shard, sum(claim_count), sum(amount_total)
+    FROM ({rows_sql}) AS delta
+    GROUP BY status, bucket, shard
+    {PG_UPSERT};
+    RETURN NULL;
+END $$"""
+
+
+PG_TRIGGERS = [
+    _pg_function("claim_stats_on_insert", _pg_rows("new_rows r", "+")),
+    _pg_function(
+        "claim_stats_on_update",
+        # Only claims whose status, amount or submission time changed move between buckets
+        _pg_rows(
+            "old_rows r JOIN new_rows n ON n.id = r.id", "-",
+            "AND (r.status, r.amount, r.submitted_at) IS DISTINCT FROM (n.status, n.amount, n.submitted_at)",
+        )
+        + " UNION ALL "
+        + _pg_rows(
+            "new_rows r JOIN old_rows o ON o.id = r.id", "+",
+            "AND (r.status, r.amount, r.submitted_at) IS DISTINCT FROM (o.status, o.amount, o.submitted_at)",
+        ),
+    ),
+    _pg_function("claim_stats_on_delete", _pg_rows("old_rows r", "-")),
+    "DROP TRIGGER IF EXISTS claim_stats_after_insert ON claims",
+    """CREATE TRIGGER claim_stats_after_insert AFTER INSERT ON claims
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION claim_stats_on_insert()""",
+    "DROP TRIGGER IF EXISTS claim_stats_after_update ON claims",
+    """CREATE TRIGGER claim_stats_after_update AFTER UPDATE ON claims
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION claim_stats_on_update()""",
+    "DROP TRIGGER IF EXISTS claim_stats_after_delete ON claims",
+    """CREATE TRIGGER claim_stats_after_delete AFTER DELETE ON claims
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION claim_stats_on_delete()""",
+]
+
+
+def install_triggers(connection) -> None:
+    """
+    Create (or replace) the triggers that maintain 'claim_stats'. Safe to run more than once.
+    """
+    statements = PG_TRIGGERS if connection.dialect.name == "postgresql" else SQLITE_TRIGGERS
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+# -----------------------------
+# Full rebuild (first install, or repair)
+# -----------------------------
+def hour_bucket(connection, column):
+    # Same truncation the triggers use, for the dialect in use
+    if connection.dialect.name == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+
+
+def rebuild(connection) -> None:
+    """
+    Recompute 'claim_stats' from the claims table with one GROUP BY (used when the table is first created).
+    """
+    claims, claim_stats = models.Claim.__table__, models.ClaimStats.__table__
+    bucket = hour_bucket(connection, claims.c.submitted_at)
+    shard = claims.c.id % STATS_SHARDS
+    grouped = (
+        select(claims.c.status, bucket, shard, func.count(), func.sum(claims.c.amount))
+        .where(claims.c.submitted_at.is_not(None))
+        .group_by(claims.c.status, bucket, shard)
+    )
+    connection.execute(delete(claim_stats))
+    connection.execute(
+        insert(claim_stats).from_select(["status", "bucket", "shard", "claim_count", "amount_total"], grouped)
+    )
+
+
+# -----------------------------
+# Reading the statistics
+# -----------------------------
+def get_claim_stats(
+    db: Session,
+    by_status: bool = True,
+    period: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> list[dict]:
+    """
+    Claim counts and amount totals from 'claim_stats', grouped by status and/or by 'day' or 'hour'.
+    The submitted_at window is applied at hour granularity.
+    """
+    stmt = claim_stats_statement(by_status, period, submitted_from, submitted_to)
+    return claim_stats_rows(db.execute(stmt), by_status, period)
+
+
+def claim_stats_statement(
+    by_status: bool = True,
+    period: Optional[str] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+):
+    table = models.ClaimStats.__table__
+    columns, group_by = [], []
+
+    if by_status:
+        columns.append(table.c.status)
+        group_by.append(table.c.status)
+    if period == "day":
+        day = func.date(table.c.bucket).label("period")
+        columns.append(day)
+        group_by.append(day)
+    elif period == "hour":
+        columns.append(table.c.bucket.label("period"))
+        group_by.append(table.c.bucket)
+
+    claim_count = func.sum(table.c.claim_count)
+    stmt = select(*columns, claim_count.label("claim_count"), func.sum(table.c.amount_total).label("amount_total"))
+    if submitted_from is not None:
+        stmt = stmt.where(table.c.bucket >= as_naive_utc(submitted_from).replace(minute=0, second=0, microsecond=0))
+    if submitted_to is not None:
+        stmt = stmt.where(table.c.bucket < as_naive_utc(submitted_to))
+    return stmt.group_by(*group_by).having(claim_count != 0).order_by(*group_by)
+
+
+def claim_stats_rows(rows, by_status: bool, period: Optional[str]) -> list[dict]:
+    # The response rows for the result of 'claim_stats_statement'
+    results = []
+    for row in rows:
+        item = {"claim_count": row.claim_count, "amount_total": row.amount_total or money.from_cents(0)}
+        if by_status:
+            item["status"] = row.status
+        if period is not None:
+            # Days come back as a date (PostgreSQL) or text (SQLite); hours as a datetime
+            value = row.period
+            item["period"] = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        results.append(item)
+    return results
+
+
+# -----------------------------
+# Exact totals from the claims themselves (GET /claims/totals)
+# -----------------------------
+def cents_sum(column):
+    # SUM over the raw cents (not through the Money type), so the result is an exact integer on every dialect
+    return func.coalesce(func.sum(type_coerce(column, BigInteger)), 0)
+
+
+def get_claim_totals(
+    db: Session,
+    by_status: bool = True,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> list[dict]:
+    """
+    Claim counts and exact amount totals for the claims matching the filters, optionally grouped by status.
+    One aggregate query over 'claims': unlike 'get_claim_stats' it reads every matching claim, but filters on
+    anything and is exact to the cent at any precision.
+    """
+    stmt = claim_totals_statement(by_status, status, min_amount, max_amount, submitted_from, submitted_to)
+    return claim_totals_rows(db.execute(stmt), by_status)
+
+
+def claim_totals_statement(
+    by_status: bool = True,
+    status: Optional[schemas.ClaimStatus] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+):
+    table = models.Claim.__table__
+    columns = [table.c.status] if by_status else []
+    stmt = (
+        select(*columns, func.count().label("claim_count"), cents_sum(table.c.amount).label("cents"))
+        .where(*claim_filter_conditions(status, min_amount, max_amount, submitted_from, submitted_to))
+    )
+    if by_status:
+        stmt = stmt.group_by(table.c.status).order_by(table.c.status)
+    return stmt
+
+
+def claim_totals_rows(rows, by_status: bool) -> list[dict]:
+    # The response rows for the result of 'claim_totals_statement'
+    results = []
+    for row in rows:
+        cents = int(row.cents)  # PostgreSQL returns SUM(bigint) as a numeric
+        item = {"claim_count": row.claim_count, "amount_total": money.from_cents(cents), "amount_total_cents": cents}
+        if by_status:
+            item["status"] = row.status
+        results.append(item)
+    return results
+
+
+def reconcile(db: Session) -> dict:
+    """
+    Compare the per-status counts and totals of 'claim_stats' with the claims they were built from.
+    A mismatch means a write bypassed the triggers (e.g. a restore without them); 'rebuild' repairs it.
+    """
+    claims_statement, stats_statement = reconcile_statements()
+    return reconciliation(db.execute(claims_statement), db.execute(stats_statement))
+
+
+def reconcile_statements() -> tuple:
+    # Per-status counts and cents from the claims, then from 'claim_stats'
+    claims, claim_stats = models.Claim.__table__, models.ClaimStats.__table__
+    return (
+        select(claims.c.status, func.count().label("claim_count"), cents_sum(claims.c.amount).label("cents"))
+        .where(claims.c.submitted_at.is_not(None))  # The triggers skip claims without a submission time
+        .group_by(claims.c.status),
+        select(claim_stats.c.status, func.sum(claim_stats.c.claim_count).label("claim_count"), cents_sum(claim_stats.c.amount_total).label("cents"))
+        .group_by(claim_stats.c.status),
+    )
+
+
+def reconciliation(claim_rows, stats_rows) -> dict:
+    # The Reconciliation body for the results of 'reconcile_statements'
+    from_claims = {row.status: (row.claim_count, int(row.cents)) for row in claim_rows}
+    from_stats = {row.status: (int(row.claim_count), int(row.cents)) for row in stats_rows}
+
+    rows = []
+    for status in sorted(set(from_claims) | set(from_stats)):
+        count, cents = from_claims.get(status, (0, 0))
+        stats_count, stats_cents = from_stats.get(status, (0, 0))
+        if count == stats_count == 0 and cents == stats_cents == 0:
+            continue  # Status whose aggregate rows have all been zeroed out
+        rows.append({
+            "status": status,
+            "claim_count": count,
+            "amount_total_cents": cents,
+            "stats_claim_count": stats_count,
+            "stats_amount_total_cents": stats_cents,
+            "matches": (count, cents) == (stats_count, stats_cents),
+        })
+    return {"matches": all(row["matches"] for row in rows), "statuses": rows}
@@ -0,0 +1,148 @@
+# Shared helpers for the benchmark scripts: latency statistics, database setup and JSON baselines
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Optional
+
+
+# -----------------------------
+# Latency statistics
+# -----------------------------
+def percentile(samples: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of 'samples' (pct between 0 and 100). Returns 0 for an empty list.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))  # ceil(n * pct / 100), at least 1
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """
+    Turn per-operation latencies (seconds) measured over 'elapsed' seconds into a result entry.
+    """
+    count = len(latencies)
+    return {
+        "count": count,
+        "errors": errors,
+        "ops_per_sec": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+# -----------------------------
+# Database selection
+# -----------------------------
+def use_database(database_url: Optional[str]) -> str:
+    """
+    Point the app at the database to benchmark by setting DATABASE_URL, before anything from 'app' is imported.
+    Without a URL a fresh SQLite file in a temporary directory is used.
+    Use a throwaway PostgreSQL database: the benchmarks create, change and delete claims.
+    """
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='claims-bench-'), 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    return database_url
+
+
+def reset_schema(engine) -> None:
+    """
+    Drop and recreate every table, so each run starts from an empty database.
+    """
+    from app import models
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+
+# -----------------------------
+# JSON baselines
+# -----------------------------
+def environment(database_url: str, **extra) -> dict:
+    """
+    Describe where the numbers come from, so baselines from different machines aren't compared by mistake.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "database": database_url.split(":", 1)[0],
+        **extra,
+    }
+
+
+def write_report(path: str, meta: dict, results: dict) -> None:
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    List the benchmarks that got worse than 'baseline' by more than 'tolerance' (0.2 = 20%):
+    lower throughput, or higher p95 latency. Benchmarks missing from either side are ignored.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        if current["ops_per_sec"] < before["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {before['ops_per_sec']} -> {current['ops_per_sec']} ops/s")
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {current['p95_ms']} ms")
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    print(f"{'benchmark':<40} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, row in results.items():
+        print(
+            f"{name:<40} {row['ops_per_sec']:>10} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['errors']:>7}"
+        )
+
+
+def finish(args, meta: dict, results: dict) -> None:
+    """
+    Print the results, write them to '--output', and exit with status 1 if '--compare' finds regressions.
+    """
+    print_table(results)
+    if args.output:
+        write_report(args.output, meta, results)
+        print(f"\nWrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("database") != meta["database"]:
+            print(f"\nWarning: the baseline was measured on {baseline.get('meta', {}).get('database')}, this run on {meta['database']}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%} against {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+def add_report_arguments(parser) -> None:
+    parser.add_argument("--database-url", help="Database to benchmark (default: a temporary SQLite file)")
+    parser.add_argument("--output", help="Write the results to this JSON file (e.g. a new baseline)")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against; exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before it counts as a regression")
@@ -0,0 +1,104 @@
+# CPU cost of listing claims: the regular path (ORM objects + response_model) against FAST_JSON (Core rows + orjson)
+#
+# Run from the project root:
+#   python -m benchmarks.serialization
+#   python -m benchmarks.serialization --rows 10000 --repeat 20 --output benchmarks/baseline-serialization.json
+#
+# Each figure is CPU time (time.process_time) per ROWS rows, so the database's own work on the other side
+# of the connection isn't counted, only what this process spends fetching, validating and encoding.
+
+import argparse
+import json
+import time
+
+from benchmarks import common
+
+CLAIM_PAYLOAD = {"claimant_name": "Serialization User", "amount": 1234.56, "status": "pending"}
+
+
+def cpu(fn, repeat: int) -> list[float]:
+    """
+    CPU seconds of each of 'repeat' calls to 'fn'.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.process_time()
+        fn()
+        samples.append(time.process_time() - start)
+    return samples
+
+
+def run(rows: int, repeat: int, page_size: int) -> dict:
+    # Imported here so DATABASE_URL is set first (see common.use_database)
+    from fastapi.testclient import TestClient
+    from pydantic import TypeAdapter
+
+    from app import crud, fastjson, schemas
+    from app.config import settings
+    from app.database import SessionLocal, engine
+    from app.main import app
+
+    common.reset_schema(engine)
+    db = SessionLocal()
+    crud.create_claims_bulk(db, [schemas.ClaimCreate(**CLAIM_PAYLOAD)] * rows)
+
+    # What FastAPI does with response_model=list[schemas.ClaimWithLines]: validate every object, dump it, json.dumps it
+    adapter = TypeAdapter(list[schemas.ClaimWithLines])
+
+    def regular():
+        claims, _ = crud.get_claims_page(db, limit=rows)
+        content = adapter.dump_python(adapter.validate_python(claims, from_attributes=True), mode="json")
+        json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+        db.expunge_all()  # Don't let the identity map carry objects over to the next round
+
+    def fast():
+        claim_rows, _ = crud.get_claims_page_rows(db, limit=rows)
+        fastjson.encode_claim_list(claim_rows, crud.get_claim_line_rows(db, claim_rows))
+
+    def through_api(fast_json: bool):
+        def fetch_all_pages():
+            settings.fast_json = fast_json
+            cursor, fetched = None, 0
+            while fetched < rows:
+                params = {"limit": page_size, **({"cursor": cursor} if cursor else {})}
+                response = client.get("/claims", params=params)
+                fetched += page_size
+                cursor = response.headers.get("X-Next-Cursor")
+        return fetch_all_pages
+
+    results = {
+        f"list[{rows}].regular": common.summarize(cpu(regular, repeat), 1),
+        f"list[{rows}].fast_json": common.summarize(cpu(fast, repeat), 1),
+    }
+    with TestClient(app) as client:
+        results[f"api_pages[{rows}].regular"] = common.summarize(cpu(through_api(False), repeat), 1)
+        results[f"api_pages[{rows}].fast_json"] = common.summarize(cpu(through_api(True), repeat), 1)
+    db.close()
+
+    # 'ops_per_sec' isn't meaningful here (elapsed=1); the latency fields hold CPU milliseconds per 'rows' rows
+    for row in results.values():
+        row["ops_per_sec"] = round(1000 / row["mean_ms"], 1) if row["mean_ms"] else 0.0
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CPU per N listed claims, regular path against FAST_JSON")
+    common.add_report_arguments(parser)
+    parser.add_argument("--rows", type=int, default=10000, help="Claims listed per measurement")
+    parser.add_argument("--repeat", type=int, default=10, help="Measurements per path")
+    parser.add_argument("--page-size", type=int, default=1000, help="Page size for the api_pages measurements")
+    args = parser.parse_args()
+
+    database_url = common.use_database(args.database_url)
+    results = run(args.rows, args.repeat, args.page_size)
+
+    print(f"CPU per {args.rows} rows (ms, mean): ", end="")
+    for prefix in (f"list[{args.rows}]", f"api_pages[{args.rows}]"):
+        regular, fast = results[f"{prefix}.regular"]["mean_ms"], results[f"{prefix}.fast_json"]["mean_ms"]
+        print(f"{prefix} {regular} -> {fast} (saves {regular - fast:.1f} ms, {1 - fast / regular:.0%})  ", end="")
+    print("\n")
+    common.finish(args, common.environment(database_url, suite="serialization", rows=args.rows), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,18 @@
 # ---------------------------------------------
 
 # Import required libraries
+import os  # Used to point the app's own engine at the test database
 import pytest  # Pytest is used for defining fixtures and writing test cases
 from fastapi.testclient import TestClient  # Used to simulate HTTP requests to FastAPI routes
 from sqlalchemy import create_engine  # Creates the test DB engine
 from sqlalchemy.orm import sessionmaker, Session  # ORM tools to create DB sessions
 
+# Create a test SQLite database stored in a file named test.db (safe for integration tests)
+TEST_DATABASE_URL = "sqlite:///./test.db"
+
+# The app builds its engine from DATABASE_URL at import time; use the test DB unless told otherwise
+os.environ.setdefault("DATABASE_URL", TEST_DATABASE_URL)
+
 # Import FastAPI app and DB dependency
 from app.main import app  # Your FastAPI app instance
 from app.database import get_db  # The real get_db dependency used in your routes
@@ -17,9 +24,6 @@ from app import models  # To ensure all models like Claim are imported
 # DATABASE CONFIGURATION FOR TESTING
 # -------------------------------
 
-# Create a test SQLite database stored in a file named test.db (safe for integration tests)
-TEST_DATABASE_URL = "sqlite:///./test.db"
-
 # Create an engine connected to the test database
 # `check_same_thread=False` allows using this engine across multiple threads (FastAPI needs it)
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
@@ -0,0 +1,108 @@
+# ---------------------------------------------
+# Tests for the archival job (archive.py) and the partition helpers (partitions.py)
+# ---------------------------------------------
+
+import gzip
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from app import archive, models, partitions, stats
+
+
+def add_claim(db_session, status, submitted_at, name="Archive Test"):
+    claim = models.Claim(claimant_name=name, amount=10, status=status, submitted_at=submitted_at)
+    db_session.add(claim)
+    db_session.commit()
+    return claim
+
+
+def test_archive_moves_old_closed_and_rejected_claims(db_session, tmp_path):
+    # Submitted in 1999, long before the other test modules' claims
+    old_closed = add_claim(db_session, "closed", datetime(1999, 1, 5))
+    eob = models.ClaimAttachment(
+        claim_id=old_closed.id, filename="eob.pdf", content_type="application/pdf", size=3, sha256="ab" * 32,
+        uploaded_at=datetime(1999, 1, 6),
+    )
+    db_session.add(eob)
+    db_session.add_all([
+        models.ClaimLine(claim_id=old_closed.id, line_number=1, cpt_code="99213", icd_code="J20.9", units=1, charge=6),
+        models.ClaimLine(claim_id=old_closed.id, line_number=2, cpt_code="87880", icd_code="J02.0", units=2, charge=4),
+    ])
+    db_session.commit()
+    eob_id = eob.id
+    old_rejected = add_claim(db_session, "rejected", datetime(1999, 2, 7))
+    old_pending = add_claim(db_session, "pending", datetime(1999, 1, 6))
+    recent_closed = add_claim(db_session, "closed", datetime(1999, 12, 20))
+    ids = [claim.id for claim in (old_closed, old_rejected, old_pending, recent_closed)]
+    closed_id, rejected_id, pending_id, recent_id = ids
+
+    archived = archive.archive_claims(db_session, 90, tmp_path, chunk_size=1, now=datetime(1999, 12, 31))
+
+    assert archived == 2
+    left = set(db_session.scalars(select(models.Claim.id).where(models.Claim.id.in_(ids))))
+    assert left == {pending_id, recent_id}
+
+    # One file per month, with the export's NDJSON lines
+    assert sorted(path.name for path in tmp_path.glob("1999/*")) == [
+        "claims-1999-01.19991231T000000.ndjson.gz",
+        "claims-1999-02.19991231T000000.ndjson.gz",
+    ]
+    claims = list(archive.read_archive(tmp_path))
+    assert [(claim["id"], claim["status"], claim["submitted_at"]) for claim in claims] == [
+        (closed_id, "closed", "1999-01-05T00:00:00"),
+        (rejected_id, "rejected", "1999-02-07T00:00:00"),
+    ]
+
+    # The lines and attachment rows moved into the archive with their claim
+    assert claims[0]["lines"] == [
+        {"cpt_code": "99213", "icd_code": "J20.9", "units": 1, "charge": 6.0, "line_number": 1},
+        {"cpt_code": "87880", "icd_code": "J02.0", "units": 2, "charge": 4.0, "line_number": 2},
+    ]
+    assert claims[1]["lines"] == []
+    assert db_session.scalars(select(models.ClaimLine).where(models.ClaimLine.claim_id == closed_id)).all() == []
+    assert claims[0]["attachments"] == [{
+        "id": eob_id, "filename": "eob.pdf", "content_type": "application/pdf", "size": 3, "sha256": "ab" * 32,
+        "uploaded_at": "1999-01-06T00:00:00",
+    }]
+    assert claims[1]["attachments"] == []
+    assert db_session.scalars(select(models.ClaimAttachment).where(models.ClaimAttachment.claim_id == closed_id)).all() == []
+
+    # Change feed consumers are told the claims left
+    archived_events = db_session.scalars(
+        select(models.ClaimEvent.claim_id).where(models.ClaimEvent.change_type == "archived", models.ClaimEvent.claim_id.in_(ids))
+    ).all()
+    assert sorted(archived_events) == sorted([closed_id, rejected_id])
+
+    # The claim_stats triggers saw the deletes
+    rows = stats.get_claim_stats(db_session, period="day", submitted_from=datetime(1999, 1, 1), submitted_to=datetime(2000, 1, 1))
+    assert sum(row["claim_count"] for row in rows) == 2
+
+
+def test_read_archive_after_an_interrupted_chunk(tmp_path):
+    path = archive.archive_path(tmp_path, "1998-03", "run")
+    path.parent.mkdir(parents=True)
+    complete = gzip.compress(b'{"id": 1}\n{"id": 2}\n')
+    interrupted = gzip.compress(b'{"id": 2}\n{"id": 3}\n' * 100)
+    path.write_bytes(complete + interrupted[: len(interrupted) // 2])
+
+    # Claims of the interrupted chunk that were written come back too, once each
+    assert [claim["id"] for claim in archive.read_archive(tmp_path)] == [1, 2, 3]
+
+
+def test_dry_run_count(db_session):
+    add_claim(db_session, "rejected", datetime(1997, 5, 1))
+    assert archive.count_archivable(db_session, datetime(1997, 6, 1)) == 1
+
+
+def test_partition_helpers():
+    assert partitions.add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert partitions.add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partitions.partition_name(partitions.month_start(datetime(2025, 7, 19, 8))) == "claims_p202507"
+
+
+def test_partition_maintenance_is_a_no_op_on_sqlite(db_session):
+    connection = db_session.connection()
+    assert not partitions.is_partitioned(connection)
+    assert partitions.ensure_partitions(connection) == []
+    assert partitions.drop_empty_partitions(connection, before=date(2030, 1, 1)) == []
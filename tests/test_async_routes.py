@@ -0,0 +1,215 @@
+# ---------------------------------------------
+# Tests for the async routes (CLAIMS_DB_MODE=async)
+# ---------------------------------------------
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app import attachments, changes, models
+from app.async_routes import other_router, router
+from app.database import get_async_db, to_async_url
+
+
+# -------------------------------
+# FIXTURE: app with only the async routes, on its own SQLite file (aiosqlite driver)
+# -------------------------------
+@pytest.fixture(scope="module")
+def async_db_url(tmp_path_factory):
+    return f"sqlite:///{tmp_path_factory.mktemp('async') / 'async.db'}"
+
+
+@pytest.fixture(scope="module")
+def async_client(async_db_url):
+    url = to_async_url(async_db_url)
+    # NullPool: the TestClient runs the app on its own event loop, so connections aren't shared across loops
+    engine = create_async_engine(url, poolclass=NullPool)
+    AsyncTestingSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+    asyncio.run(create_tables())
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    async_app = FastAPI()
+    async_app.include_router(other_router)
+    async_app.include_router(router)
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    with TestClient(async_app) as c:
+        yield c
+    asyncio.run(engine.dispose())
+
+
+def test_to_async_url():
+    # Sync URLs are mapped to the async driver for the same database
+    assert to_async_url("postgresql://u:p@localhost/claims_db") == "postgresql+asyncpg://u:p@localhost/claims_db"
+    assert to_async_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+
+
+def test_async_claim_lifecycle(async_client):
+    # Create
+    response = async_client.post("/claims", json={"claimant_name": "Async User", "amount": 10.5, "status": "pending"})
+    assert response.status_code == 201
+    claim = response.json()
+
+    # Read back, by ID and in the list
+    assert async_client.get(f"/claims/{claim['id']}").json() == claim
+    assert claim in async_client.get("/claims").json()
+
+    # Update
+    response = async_client.put(f"/claims/{claim['id']}", json={"claimant_name": "Async User", "amount": 20, "status": "approved"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "approved"
+
+    # Partial update
+    response = async_client.patch(f"/claims/{claim['id']}", json={"status": "closed"})
+    header = {key: value for key, value in claim.items() if key != "lines"}  # PATCH returns the claim without its lines
+    assert response.json() == {**header, "amount": 20, "status": "closed"}
+
+    # Delete, then it's gone
+    assert async_client.delete(f"/claims/{claim['id']}").status_code == 204
+    assert async_client.get(f"/claims/{claim['id']}").status_code == 404
+    assert async_client.delete(f"/claims/{claim['id']}").status_code == 404
+
+
+def test_async_bulk_and_export(async_client):
+    records = [
+        {"claimant_name": "Async Bulk 1", "amount": 1, "status": "submitted"},
+        {"claimant_name": "", "amount": 1, "status": "submitted"},  # Invalid name
+        {"claimant_name": "Async Bulk 2", "amount": 2, "status": "submitted"},
+    ]
+    response = async_client.post("/claims/bulk", json=records)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["created"]) == 2
+    assert [error["index"] for error in data["errors"]] == [1]
+
+    # The export streams the created claims
+    lines = async_client.get("/claims/export").text.splitlines()
+    assert any('"Async Bulk 2"' in line for line in lines)
+
+
+def test_async_fast_json_matches_regular_path(async_client, monkeypatch):
+    from app.config import settings
+
+    claim = async_client.post("/claims", json={"claimant_name": "Async Fäst", "amount": 12.5, "status": "pending"}).json()
+    regular = [async_client.get(f"/claims/{claim['id']}").content, async_client.get("/claims").content]
+
+    monkeypatch.setattr(settings, "fast_json", True)
+    assert [async_client.get(f"/claims/{claim['id']}").content, async_client.get("/claims").content] == regular
+    assert async_client.get("/claims/99999999").status_code == 404
+
+
+def test_async_claim_lines(async_client, monkeypatch):
+    from app.config import settings
+
+    lines = [{"cpt_code": "99214", "icd_code": "E11.9", "charge": 90}, {"cpt_code": "83036", "icd_code": "E11.9", "charge": 25.25}]
+    payload = {"claimant_name": "Async Lines", "amount": 115.25, "status": "pending", "lines": lines}
+    claim = async_client.post("/claims", json=payload).json()
+    assert [(line["line_number"], line["charge"]) for line in claim["lines"]] == [(1, 90.0), (2, 25.25)]
+    keyed = async_client.post("/claims", json=payload, headers={"Idempotency-Key": "async-lines"}).json()
+    assert keyed["lines"] == async_client.post("/claims", json=payload, headers={"Idempotency-Key": "async-lines"}).json()["lines"]
+    bulk = async_client.post("/claims/bulk", json=[payload]).json()["created"][0]
+
+    # The amount stays the sum of the line charges
+    assert async_client.patch(f"/claims/{claim['id']}", json={"amount": 5}).status_code == 409
+    assert async_client.put(f"/claims/{claim['id']}", json={**payload, "amount": 5}).status_code == 409
+    assert async_client.patch(f"/claims/{claim['id']}", json={"amount": 115.25}).status_code == 200
+    claim = async_client.get(f"/claims/{claim['id']}").json()
+
+    regular = [async_client.get(f"/claims/{claim_id}").content for claim_id in (claim["id"], keyed["id"], bulk["id"])]
+    regular.append(async_client.get("/claims", params={"limit": 1000}).content)
+    assert async_client.get(f"/claims/{claim['id']}").json() == claim
+    assert claim in async_client.get("/claims", params={"limit": 1000}).json()
+
+    monkeypatch.setattr(settings, "fast_json", True)
+    fast = [async_client.get(f"/claims/{claim_id}").content for claim_id in (claim["id"], keyed["id"], bulk["id"])]
+    fast.append(async_client.get("/claims", params={"limit": 1000}).content)
+    assert fast == regular
+
+
+def test_async_search(async_client, monkeypatch):
+    from app.config import settings
+
+    for name in ("Async Wombleton", "Async Wimbledon", "Async Unrelated"):
+        async_client.post("/claims", json={"claimant_name": name, "amount": 1, "status": "pending"})
+
+    response = async_client.get("/claims/search", params={"q": "Womblton", "limit": 1})
+    assert [claim["claimant_name"] for claim in response.json()] == ["Async Wombleton"]
+    assert "X-Next-Cursor" in response.headers
+
+    monkeypatch.setattr(settings, "fast_json", True)
+    assert async_client.get("/claims/search", params={"q": "Womblton", "limit": 1}).content == response.content
+
+
+def test_async_conditional_writes(async_client):
+    response = async_client.post("/claims", json={"claimant_name": "Async Versioned", "amount": 5, "status": "pending"})
+    url, etag = f"/claims/{response.json()['id']}", response.headers["ETag"]
+    assert async_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    assert async_client.patch(url, json={"status": "approved"}, headers={"If-Match": etag}).headers["ETag"] == '"2"'
+    stale = async_client.put(url, json={"claimant_name": "Async Versioned", "amount": 6, "status": "closed"}, headers={"If-Match": etag})
+    assert stale.status_code == 412 and stale.headers["ETag"] == '"2"'
+    assert async_client.delete(url, headers={"If-Match": etag}).status_code == 412
+    assert async_client.delete(url, headers={"If-Match": '"2"'}).status_code == 204
+
+
+def test_async_transitions_stats_and_change_feed(async_client, async_db_url):
+    claim = async_client.post("/claims", json={"claimant_name": "Async Adjudicated", "amount": 40, "status": "submitted"}).json()
+    result = async_client.post("/claims/status-transitions", json={"transitions": [{"id": claim["id"], "status": "approved"}, {"id": 99999999, "status": "approved"}]}).json()
+    assert (result["updated"], result["missing"]) == ([claim["id"]], [99999999])
+    assert async_client.get(f"/claims/{claim['id']}").json()["status"] == "approved"
+
+    approved = {row["status"]: row for row in async_client.get("/claims/totals").json()}["approved"]
+    assert approved["claim_count"] >= 1 and approved["amount_total_cents"] >= 4000
+    assert {row["status"]: row["claim_count"] for row in async_client.get("/claims/stats").json()}["approved"] == approved["claim_count"]
+    assert async_client.get("/claims/totals/reconcile").json()["matches"] is True
+    assert async_client.get("/claims/intake/unknown").status_code == 404
+
+    # The relay is a separate job; the async route reads what it published
+    engine = create_engine(async_db_url)
+    changes.relay(sessionmaker(bind=engine))
+    engine.dispose()
+    feed = async_client.get("/claims/changes", params={"limit": 1000}).json()
+    assert [change["type"] for change in feed["changes"] if change["claim"]["claimant_name"] == "Async Adjudicated"] == ["created", "updated"]
+    assert async_client.get("/claims/changes", params={"since": feed["next_since"], "wait": 0.1}).json()["changes"] == []
+
+
+def test_async_attachments(async_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "store", attachments.AttachmentStore(tmp_path / "attachments"))
+    claim = async_client.post("/claims", json={"claimant_name": "Async Attached", "amount": 1, "status": "pending"}).json()
+    attachment = async_client.post(f"/claims/{claim['id']}/attachments", params={"filename": "eob.pdf"}, content=b"%PDF-1.7 scan").json()
+    assert async_client.get(f"/claims/{claim['id']}/attachments").json() == [attachment]
+    assert async_client.get(f"/claims/{claim['id']}/attachments/{attachment['id']}", headers={"Range": "bytes=0-3"}).content == b"%PDF"
+    assert async_client.post("/claims/99999999/attachments", content=b"x").status_code == 404
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_async_reads_go_through_the_claim_cache(async_client, monkeypatch, fast_json):
+    from app import cache
+    from app.config import settings
+
+    monkeypatch.setattr(cache, "claim_cache", cache.LRUCache())
+    monkeypatch.setattr(settings, "fast_json", fast_json)
+    claim = async_client.post("/claims", json={"claimant_name": "Async Cached", "amount": 3, "status": "pending"}).json()
+    url = f"/claims/{claim['id']}"
+
+    hits = cache.cache_hits.value(backend="memory")
+    first = async_client.get(url)
+    assert async_client.get(url).content == first.content
+    assert cache.cache_hits.value(backend="memory") == hits + 1
+
+    # Writes drop the entry, so the next read sees them
+    etag = async_client.patch(url, json={"status": "approved"}).headers["ETag"]
+    response = async_client.get(url)
+    assert response.json()["status"] == "approved" and response.headers["ETag"] == etag
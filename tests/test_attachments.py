@@ -0,0 +1,144 @@
+# ---------------------------------------------
+# Tests for claim attachments (attachments.py): streaming uploads, deduplication, Range downloads
+# ---------------------------------------------
+
+import hashlib
+
+import pytest
+
+from app import attachments, config
+
+CLAIM = {"claimant_name": "Attachment User", "amount": 80, "status": "submitted"}
+SCAN = bytes(range(256)) * 40  # 10,240 bytes
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Small chunks and limit, so the tests cover several chunks and the size cap
+    store = attachments.AttachmentStore(tmp_path / "attachments", chunk_size=1024, max_bytes=16 * 1024)
+    monkeypatch.setattr(attachments, "store", store)
+    monkeypatch.setattr(attachments.AttachmentFileResponse, "chunk_size", 1024)
+    return store
+
+
+def stored_files(store):
+    return sorted(path for path in store.root.rglob("*") if path.is_file())
+
+
+def test_upload_streams_and_deduplicates(client, store):
+    claim = client.post("/claims", json=CLAIM).json()
+    other = client.post("/claims", json=CLAIM).json()
+
+    # The body arrives in pieces (chunked transfer encoding, no Content-Length)
+    response = client.post(
+        f"/claims/{claim['id']}/attachments", params={"filename": "../scans/eob.pdf"},
+        content=(SCAN[i:i + 1000] for i in range(0, len(SCAN), 1000)), headers={"Content-Type": "application/pdf"},
+    )
+    assert response.status_code == 201
+    attachment = response.json()
+    digest = hashlib.sha256(SCAN).hexdigest()
+    assert attachment["claim_id"] == claim["id"]
+    assert (attachment["filename"], attachment["content_type"], attachment["size"], attachment["sha256"]) == ("eob.pdf", "application/pdf", len(SCAN), digest)
+    assert store.path(digest).read_bytes() == SCAN
+
+    # The same file on another claim gets its own metadata row, but is stored once
+    deduplicated = attachments.deduplicated.value()
+    again = client.post(f"/claims/{other['id']}/attachments", content=SCAN).json()
+    assert again["sha256"] == digest and again["id"] != attachment["id"]
+    assert again["content_type"] == attachments.DEFAULT_CONTENT_TYPE
+    assert stored_files(store) == [store.path(digest)]
+    assert attachments.deduplicated.value() == deduplicated + 1
+
+    assert client.get(f"/claims/{claim['id']}/attachments").json() == [attachment]
+    assert client.get(f"/claims/{other['id']}/attachments").json() == [again]
+
+
+def test_rejected_uploads_leave_nothing_behind(client, store):
+    claim = client.post("/claims", json=CLAIM).json()
+    url = f"/claims/{claim['id']}/attachments"
+    too_large = b"x" * (store.max_bytes + 1)
+
+    # Announced too large: refused before the body is read
+    assert client.post(url, content=too_large).status_code == 413
+    # Streamed past the limit
+    assert client.post(url, content=(too_large[i:i + 4096] for i in range(0, len(too_large), 4096))).status_code == 413
+    assert client.post(url, content=b"").status_code == 422
+    assert client.post("/claims/999999/attachments", content=SCAN).status_code == 404
+
+    assert stored_files(store) == []
+    assert client.get(url).json() == []
+    assert client.get("/claims/999999/attachments").status_code == 404
+
+
+def test_deleted_claims_take_their_attachments_along(client, store):
+    claim = client.post("/claims", json=CLAIM).json()
+    client.post(f"/claims/{claim['id']}/attachments", params={"filename": "eob.pdf"}, content=SCAN)
+    assert client.delete(f"/claims/{claim['id']}").status_code == 204
+
+    # The next claim gets a new ID, not the deleted claim's, and has no attachments
+    new = client.post("/claims", json=CLAIM).json()
+    assert new["id"] > claim["id"]
+    assert client.get(f"/claims/{new['id']}/attachments").json() == []
+    assert client.get(f"/claims/{claim['id']}/attachments").status_code == 404
+    # The file stays in the store (other claims may have the same one)
+    assert stored_files(store) == [store.path(hashlib.sha256(SCAN).hexdigest())]
+
+
+def test_download_with_ranges(client, store):
+    claim = client.post("/claims", json=CLAIM).json()
+    attachment = client.post(f"/claims/{claim['id']}/attachments", params={"filename": "itemized bill.pdf"}, content=SCAN, headers={"Content-Type": "application/pdf"}).json()
+    url = f"/claims/{claim['id']}/attachments/{attachment['id']}"
+    etag = f'"{attachment["sha256"]}"'
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert full.content == SCAN
+    assert full.headers["content-type"] == "application/pdf"
+    assert full.headers["etag"] == etag
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-disposition"] == "attachment; filename*=utf-8''itemized%20bill.pdf"
+
+    # Resuming a download: only the requested bytes, as long as the file is still the same one
+    part = client.get(url, headers={"Range": "bytes=1000-2999", "If-Range": etag})
+    assert part.status_code == 206
+    assert part.content == SCAN[1000:3000]
+    assert part.headers["content-range"] == f"bytes 1000-2999/{len(SCAN)}"
+    assert client.get(url, headers={"Range": "bytes=1000-2999", "If-Range": '"other"'}).content == SCAN
+    assert client.get(url, headers={"Range": f"bytes={len(SCAN)}-"}).status_code == 416
+
+    head = client.head(url)
+    assert head.status_code == 200 and head.content == b""
+    assert head.headers["content-length"] == str(len(SCAN))
+
+    assert full.headers["x-content-type-options"] == "nosniff"
+    assert client.get(f"/claims/{claim['id']}/attachments/999999").status_code == 404
+    assert client.get(f"/claims/999999/attachments/{attachment['id']}").status_code == 404
+
+
+def test_download_through_nginx(client, store, monkeypatch):
+    monkeypatch.setattr(config.settings, "attachment_accel_redirect", "/protected-attachments/")
+    claim = client.post("/claims", json=CLAIM).json()
+    attachment = client.post(f"/claims/{claim['id']}/attachments", params={"filename": "scan.tiff"}, content=SCAN, headers={"Content-Type": "image/tiff"}).json()
+
+    response = client.get(f"/claims/{claim['id']}/attachments/{attachment['id']}")
+    digest = attachment["sha256"]
+    assert response.headers["x-accel-redirect"] == f"/protected-attachments/sha256/{digest[:2]}/{digest[2:4]}/{digest}"
+    assert response.headers["content-type"] == "image/tiff"
+    assert response.headers["content-disposition"] == 'attachment; filename="scan.tiff"'
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.content == b""
+
+
+@pytest.mark.parametrize("accel_redirect", ["", "/protected-attachments"])
+def test_uploaded_html_is_only_ever_downloaded(client, store, monkeypatch, accel_redirect):
+    # A stored page or SVG must not run its scripts on the API's origin: always a download, and no sniffing
+    monkeypatch.setattr(config.settings, "attachment_accel_redirect", accel_redirect)
+    claim = client.post("/claims", json=CLAIM).json()
+    page = b"<html><script>alert(document.cookie)</script></html>"
+    attachment = client.post(f"/claims/{claim['id']}/attachments", content=page, headers={"Content-Type": "text/html"}).json()
+    assert attachment["filename"] is None
+
+    response = client.get(f"/claims/{claim['id']}/attachments/{attachment['id']}")
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="attachment"'
+    assert response.headers["x-content-type-options"] == "nosniff"
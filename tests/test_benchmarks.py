@@ -0,0 +1,32 @@
+# ---------------------------------------------
+# Tests for the benchmark helpers (benchmarks/common.py)
+# ---------------------------------------------
+
+from benchmarks import common
+
+
+def test_percentiles_and_summary():
+    samples = [i / 1000 for i in range(1, 101)]  # 1 ms .. 100 ms
+    assert common.percentile(samples, 50) == 0.05
+    assert common.percentile(samples, 99) == 0.099
+    assert common.percentile([], 95) == 0.0
+
+    summary = common.summarize(samples, elapsed=2.0, errors=3)
+    assert summary["count"] == 100 and summary["errors"] == 3
+    assert summary["ops_per_sec"] == 50.0
+    assert summary["p95_ms"] == 95.0
+
+
+def test_compare_flags_throughput_and_latency_regressions():
+    baseline = {"results": {
+        "get_claim": {"ops_per_sec": 1000, "p95_ms": 10},
+        "list_claims": {"ops_per_sec": 200, "p95_ms": 50},
+    }}
+    results = {
+        "get_claim": {"ops_per_sec": 950, "p95_ms": 11},      # Within 20%
+        "list_claims": {"ops_per_sec": 100, "p95_ms": 80},    # Slower on both counts
+        "new_route": {"ops_per_sec": 1, "p95_ms": 1000},      # Not in the baseline
+    }
+    regressions = common.compare(results, baseline, tolerance=0.2)
+    assert len(regressions) == 2
+    assert all(line.startswith("list_claims") for line in regressions)
@@ -0,0 +1,94 @@
+# ---------------------------------------------
+# Tests for the claim cache (cache.py)
+# ---------------------------------------------
+
+import pytest
+
+from app import cache
+
+
+# A clock the tests can move forward by hand
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Minimal stand-in for redis.Redis, holding values in a dict
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_lru_cache_ttl_and_eviction():
+    clock = FakeClock()
+    lru = cache.LRUCache(max_entries=2, ttl=10, clock=clock)
+    evictions = cache.cache_evictions.value(backend="memory")
+
+    lru.set(1, '{"id": 1}')
+    lru.set(2, '{"id": 2}')
+    assert lru.get(1) == '{"id": 1}'  # 1 is now the most recently used
+
+    # Adding a third entry evicts the least recently used one (2)
+    lru.set(3, '{"id": 3}')
+    assert lru.get(2) is None
+    assert lru.get(1) == '{"id": 1}'
+
+    # Entries expire after the TTL
+    clock.now = 11
+    assert lru.get(1) is None
+    assert cache.cache_evictions.value(backend="memory") == evictions + 2
+
+
+def test_redis_cache():
+    redis_cache = cache.RedisCache(client=FakeRedis(), ttl=30)
+    hits = cache.cache_hits.value(backend="redis")
+
+    assert redis_cache.get(5) is None
+    redis_cache.set(5, '{"id": 5}')
+    assert redis_cache.get(5) == '{"id": 5}'
+    redis_cache.delete(5)
+    assert redis_cache.get(5) is None
+    assert cache.cache_hits.value(backend="redis") == hits + 1
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    # Turn on the in-process cache for one test
+    lru = cache.LRUCache(max_entries=100, ttl=60)
+    monkeypatch.setattr(cache, "claim_cache", lru)
+    return lru
+
+
+def test_read_through_and_invalidation(client, memory_cache):
+    claim = client.post("/claims", json={"claimant_name": "Cached User", "amount": 5, "status": "pending"}).json()
+    misses = cache.cache_misses.value(backend="memory")
+    hits = cache.cache_hits.value(backend="memory")
+
+    # First read fills the cache, second read is a hit with the same body
+    assert client.get(f"/claims/{claim['id']}").json() == claim
+    assert client.get(f"/claims/{claim['id']}").json() == claim
+    assert cache.cache_misses.value(backend="memory") == misses + 1
+    assert cache.cache_hits.value(backend="memory") == hits + 1
+
+    # An update drops the entry, so the next read sees the new data
+    client.put(f"/claims/{claim['id']}", json={"claimant_name": "Cached User", "amount": 6, "status": "approved"})
+    assert client.get(f"/claims/{claim['id']}").json()["status"] == "approved"
+
+    # A delete drops the entry too
+    assert client.delete(f"/claims/{claim['id']}").status_code == 204
+    assert client.get(f"/claims/{claim['id']}").status_code == 404
+
+    # Counters are exposed on /metrics
+    assert 'claim_cache_hits_total{backend="memory"}' in client.get("/metrics").text
@@ -0,0 +1,98 @@
+# ---------------------------------------------
+# Tests for the change feed (changes.py): outbox events, the relay and GET /claims/changes
+# ---------------------------------------------
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app import changes, models
+from tests.conftest import TestingSessionLocal
+
+CLAIM = {"claimant_name": "Feed User", "amount": 42.5, "status": "submitted"}
+
+
+def publish_all() -> int:
+    """
+    Publish whatever is pending, and return the feed's last position.
+    """
+    changes.relay(TestingSessionLocal)
+    with TestingSessionLocal() as db:
+        return db.scalar(select(models.ChangeFeedState.last_position))
+
+
+def test_every_write_is_in_the_feed(client):
+    since = publish_all()
+
+    created = client.post("/claims", json=CLAIM).json()
+    patched = client.patch(f"/claims/{created['id']}", json={"amount": 50}).json()
+    bulk = client.post("/claims/bulk", json=[CLAIM, CLAIM]).json()["created"]
+    client.post("/claims/status-transitions", json={"transitions": [{"id": bulk[0]["id"], "status": "approved"}]})
+    client.delete(f"/claims/{bulk[1]['id']}")
+
+    # Nothing is visible until the relay has published it
+    assert client.get("/claims/changes", params={"since": since}).json() == {"changes": [], "next_since": since}
+    publish_all()
+
+    feed = client.get("/claims/changes", params={"since": since}).json()
+    assert [(change["type"], change["claim_id"], change["version"]) for change in feed["changes"]] == [
+        ("created", created["id"], 1),
+        ("updated", created["id"], 2),
+        ("created", bulk[0]["id"], 1),
+        ("created", bulk[1]["id"], 1),
+        ("updated", bulk[0]["id"], 2),
+        ("deleted", bulk[1]["id"], 1),
+    ]
+    assert [change["position"] for change in feed["changes"]] == list(range(since + 1, since + 7))
+    assert feed["next_since"] == since + 6
+
+    # Each event carries the claim as the API returns it after the change (without its lines)
+    assert feed["changes"][1]["claim"] == patched
+    assert {**patched, "lines": []} == client.get(f"/claims/{created['id']}").json()
+    assert feed["changes"][4]["claim"]["status"] == "approved"
+
+    # Pages: read on from 'next_since'
+    first = client.get("/claims/changes", params={"since": since, "limit": 4}).json()
+    rest = client.get("/claims/changes", params={"since": first["next_since"]}).json()
+    assert first["changes"] + rest["changes"] == feed["changes"]
+
+
+def test_long_poll_returns_when_a_change_is_published(client):
+    since = publish_all()
+
+    # Nothing new: the request waits 'wait' seconds, then returns an empty page
+    started = time.monotonic()
+    assert client.get("/claims/changes", params={"since": since, "wait": 0.6}).json()["changes"] == []
+    assert time.monotonic() - started >= 0.5
+
+    def write_and_publish():
+        time.sleep(0.3)
+        client.post("/claims", json=CLAIM)
+        publish_all()
+
+    writer = threading.Thread(target=write_and_publish)
+    writer.start()
+    started = time.monotonic()
+    feed = client.get("/claims/changes", params={"since": since, "wait": 10}).json()
+    writer.join()
+    assert [change["type"] for change in feed["changes"]] == ["created"]
+    assert time.monotonic() - started < 5
+
+
+def test_purged_changes_answer_410(client):
+    last = publish_all()
+    with TestingSessionLocal() as db:
+        assert changes.purge(db, retention_days=1, now=datetime.utcnow() + timedelta(days=2)) > 0
+
+    # A consumer still behind the purge has to start over from the position in the error
+    gone = client.get("/claims/changes", params={"since": 0})
+    assert gone.status_code == 410
+    assert f"since={last}" in gone.json()["detail"]
+    assert client.get("/claims/changes", params={"since": last}).json() == {"changes": [], "next_since": last}
+
+    # New changes carry on after the purged positions
+    client.post("/claims", json=CLAIM)
+    publish_all()
+    assert [change["position"] for change in client.get("/claims/changes", params={"since": last}).json()["changes"]] == [last + 1]
@@ -0,0 +1,125 @@
+# ---------------------------------------------
+# Tests for claim service lines: created with their claim, read back in a constant number of queries
+# ---------------------------------------------
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import InvalidRequestError
+
+from app import instrumentation, models
+from app.config import settings
+from tests.conftest import engine
+
+# The tests route requests to their own engine; count its statements like the app's engine
+instrumentation.instrument_engine(engine)
+
+LINES = [
+    {"cpt_code": "99213", "icd_code": "j20.9", "charge": 120},
+    {"cpt_code": "87880", "icd_code": "J02.0", "units": 2, "charge": 30.5},
+]
+CLAIM = {"claimant_name": "Lines User", "amount": 150.5, "status": "submitted", "lines": LINES}
+
+
+def queries(response) -> str:
+    return response.headers["server-timing"].split("desc=", 1)[1].split(",", 1)[0]
+
+
+def line_count(db_session, claim_id) -> int:
+    return db_session.scalar(select(func.count()).select_from(models.ClaimLine).where(models.ClaimLine.claim_id == claim_id))
+
+
+def test_lines_are_created_and_read_with_the_claim(client, db_session):
+    response = client.post("/claims", json=CLAIM)
+    assert response.status_code == 201
+    claim = response.json()
+    assert claim["lines"] == [
+        {"cpt_code": "99213", "icd_code": "J20.9", "units": 1, "charge": 120.0, "line_number": 1},
+        {"cpt_code": "87880", "icd_code": "J02.0", "units": 2, "charge": 30.5, "line_number": 2},
+    ]
+    assert client.get(f"/claims/{claim['id']}").json() == claim
+    assert claim in client.get("/claims", params={"limit": 1000}).json()
+
+    # Retries with an Idempotency-Key get the lines back too, and don't write them twice
+    first = client.post("/claims", json=CLAIM, headers={"Idempotency-Key": "lines"}).json()
+    again = client.post("/claims", json=CLAIM, headers={"Idempotency-Key": "lines"})
+    assert again.headers["Idempotent-Replayed"] == "true" and again.json() == first
+    assert first["lines"] == claim["lines"]
+    assert line_count(db_session, first["id"]) == 2
+
+    # Claims without lines have an empty list; deleting a claim deletes its lines
+    assert client.post("/claims", json={**CLAIM, "lines": []}).json()["lines"] == []
+    assert client.delete(f"/claims/{claim['id']}").status_code == 204
+    assert line_count(db_session, claim["id"]) == 0
+
+
+def test_invalid_lines_are_rejected(client):
+    assert client.post("/claims", json={**CLAIM, "amount": 150}).status_code == 422  # Charges don't add up
+    assert client.post("/claims", json={**CLAIM, "lines": [{**LINES[0], "cpt_code": "9921"}, LINES[1]]}).status_code == 422
+    assert client.post("/claims", json={**CLAIM, "lines": [{**LINES[0], "icd_code": "20.9"}, LINES[1]]}).status_code == 422
+    assert client.post("/claims", json={**CLAIM, "lines": [{**LINES[0], "units": 0}, LINES[1]]}).status_code == 422
+    too_many = [{"cpt_code": "99213", "icd_code": "J20.9", "charge": 1}] * 51
+    assert client.post("/claims", json={**CLAIM, "amount": 51, "lines": too_many}).status_code == 422
+
+
+def test_amount_stays_the_sum_of_the_lines(client):
+    claim = client.post("/claims", json=CLAIM).json()
+    url = f"/claims/{claim['id']}"
+    etag = client.get(url).headers["etag"]
+
+    # A different amount is refused, by PATCH and PUT alike, and nothing is written
+    response = client.patch(url, json={"amount": 99})
+    assert response.status_code == 409
+    assert "150.50" in response.json()["detail"]
+    assert client.put(url, json={"claimant_name": "Lines User", "amount": 99, "status": "submitted"}).status_code == 409
+    assert client.patch(url, json={"amount": 99}, headers={"If-Match": etag}).status_code == 409
+    assert client.get(url).json()["amount"] == 150.5
+
+    # The same amount, or other fields, can still be changed; a stale If-Match is still 412
+    assert client.patch(url, json={"amount": 150.5, "status": "approved"}).status_code == 200
+    assert client.patch(url, json={"amount": 99}, headers={"If-Match": etag}).status_code == 412
+    assert client.patch("/claims/999999", json={"amount": 99}).status_code == 404
+
+    # Claims without lines take any amount
+    other = client.post("/claims", json={**CLAIM, "lines": []}).json()
+    assert client.patch(f"/claims/{other['id']}", json={"amount": 99}).json()["amount"] == 99
+
+
+def test_bulk_writes_lines_with_their_claims(client, db_session):
+    records = [CLAIM, {**CLAIM, "amount": 150}, {"claimant_name": "No Lines", "amount": 5, "status": "pending"}]
+    result = client.post("/claims/bulk", json=records).json()
+    assert [error["index"] for error in result["errors"]] == [1]
+    with_lines, without_lines = result["created"]
+    assert len(client.get(f"/claims/{with_lines['id']}").json()["lines"]) == 2
+    assert client.get(f"/claims/{without_lines['id']}").json()["lines"] == []
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_pages_take_the_same_number_of_queries_at_any_size(client, monkeypatch, fast_json):
+    since = datetime.utcnow().isoformat()
+    client.post("/claims/bulk", json=[CLAIM] * 25)
+    monkeypatch.setattr(settings, "fast_json", fast_json)
+
+    # The claims, then the lines of the whole page: N+1 would be 2 queries for one claim and 26 for 25
+    small = client.get("/claims", params={"submitted_from": since, "limit": 1})
+    large = client.get("/claims", params={"submitted_from": since, "limit": 25})
+    assert len(large.json()) == 25 and all(len(claim["lines"]) == 2 for claim in large.json())
+    assert queries(small) == queries(large) == '"2 queries"'
+
+
+def test_fast_path_sends_the_same_lines(client, monkeypatch):
+    since = datetime.utcnow().isoformat()
+    claim = client.post("/claims", json=CLAIM).json()
+    regular = [client.get(f"/claims/{claim['id']}").content, client.get("/claims", params={"submitted_from": since}).content]
+    monkeypatch.setattr(settings, "fast_json", True)
+    assert [client.get(f"/claims/{claim['id']}").content, client.get("/claims", params={"submitted_from": since}).content] == regular
+
+
+def test_lines_are_never_loaded_one_claim_at_a_time(client, db_session):
+    claim = client.post("/claims", json=CLAIM).json()
+    db_claim = db_session.get(models.Claim, claim["id"])
+
+    # A read that didn't ask for the lines can't quietly run a SELECT per claim for them
+    with pytest.raises(InvalidRequestError):
+        db_claim.lines
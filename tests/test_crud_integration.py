@@ -1,9 +1,11 @@
+import csv, io, json
 from fastapi.testclient import TestClient
 from app.main import app
 from app.models import Claim  # Importing the Claim model
 from app.schemas import ClaimCreate, ClaimUpdate  # Importing schemas
 from app import schemas
 from app.crud import update_claim
+from app import crud
 from datetime import datetime, UTC
 datetime.now(UTC)
 
@@ -94,9 +96,7 @@ def test_get_claim_by_id(client, db_session):
 
     # Check that the returned claim's ID and claimant_name match
     assert data["id"] == claim.id
-    assert data["claimant_name"] in ["Test Claimant", "Updated User"]
-
-    #assert data["claimant_name"] == claim.claimant_name
+    assert data["claimant_name"] == claim.claimant_name  # Whichever claim is first in the test database
 
 # --------------------------
 # Test: Get claim by invalid ID (404)
@@ -187,3 +187,180 @@ def test_delete_invalid_claim(client):
     response = client.delete("/claims/999999")  # Try deleting something that doesn’t exist
     assert response.status_code == 404
     assert response.json()["detail"] == "Claim not found"
+
+# --------------------------
+# Test: Page through claims with a cursor and filters
+# --------------------------
+def test_get_claims_paginated(client):
+    # Create a few claims with an amount no other test uses, so the filter isolates them
+    created_ids = []
+    for i in range(5):
+        response = client.post("/claims", json={
+            "claimant_name": f"Paged User {i}",
+            "amount": round(424242.01 + i / 100, 2),
+            "status": "submitted",
+        })
+        assert response.status_code == 201
+        created_ids.append(response.json()["id"])
+
+    # Walk the pages two claims at a time until there is no next cursor
+    seen_ids = []
+    params = {"limit": 2, "status": "submitted", "min_amount": 424242, "max_amount": 424243}
+    while True:
+        response = client.get("/claims", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen_ids.extend(item["id"] for item in page)
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            break
+        params["cursor"] = next_cursor
+
+    # Every claim shows up exactly once, in creation order
+    assert seen_ids == created_ids
+
+    # A status filter that doesn't match returns an empty page
+    response = client.get("/claims", params={"status": "closed", "min_amount": 424242, "max_amount": 424243})
+    assert response.status_code == 200
+    assert response.json() == []
+
+# --------------------------
+# Test: Invalid cursor and page size
+# --------------------------
+def test_get_claims_invalid_paging(client):
+    assert client.get("/claims", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/claims", params={"limit": 0}).status_code == 422
+    assert client.get("/claims", params={"limit": 100000}).status_code == 422
+
+# --------------------------
+# Test: Bulk create with some invalid records
+# --------------------------
+def test_create_claims_bulk(client):
+    records = [
+        {"claimant_name": "Bulk One", "amount": 10, "status": "submitted"},
+        {"claimant_name": "   ", "amount": 20, "status": "submitted"},     # Blank name
+        {"claimant_name": "Bulk Three", "amount": 30, "status": "pending"},
+        {"claimant_name": "Bulk Four", "amount": -5, "status": "pending"},  # Negative amount
+    ]
+
+    response = client.post("/claims/bulk", json=records)
+
+    # Valid records are created even though others were rejected
+    assert response.status_code == 200
+    data = response.json()
+    assert [claim["claimant_name"] for claim in data["created"]] == ["Bulk One", "Bulk Three"]
+    assert all(claim["id"] is not None for claim in data["created"])
+    assert [error["index"] for error in data["errors"]] == [1, 3]
+
+    # Created claims are really in the database
+    response = client.get(f"/claims/{data['created'][1]['id']}")
+    assert response.status_code == 200
+    assert response.json()["claimant_name"] == "Bulk Three"
+
+# --------------------------
+# Test: Bulk create spanning several chunks
+# --------------------------
+def test_create_claims_bulk_chunks(db_session):
+    claims = [ClaimCreate(claimant_name=f"Chunk {i}", amount=i + 1, status="submitted") for i in range(5)]
+
+    created, failed = crud.create_claims_bulk(db_session, claims, chunk_size=2)
+
+    # Every claim is created, in input order, with increasing ids
+    assert failed == []
+    assert [row.claimant_name for row in created] == [f"Chunk {i}" for i in range(5)]
+    assert [row.id for row in created] == sorted(row.id for row in created)
+
+# --------------------------
+# Test: Stream all claims as NDJSON and CSV
+# --------------------------
+def test_export_claims(client):
+    created = client.post("/claims", json={"claimant_name": "Export User", "amount": 77.5, "status": "approved"}).json()
+    del created["lines"]  # The export has the claims without their lines
+
+    # NDJSON: one JSON object per line, with the same fields as GET /claims/{id} (except the lines)
+    response = client.get("/claims/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert created in rows
+
+    # CSV: header row, then one row per claim
+    response = client.get("/claims/export", params={"format": "csv"})
+    assert response.status_code == 200
+    lines = list(csv.reader(io.StringIO(response.text)))
+    assert lines[0] == ["id", "claimant_name", "amount", "status", "submitted_at"]
+    assert [str(created["id"]), "Export User", "77.5", "approved", created["submitted_at"]] in lines[1:]
+
+    # Unknown formats are rejected
+    assert client.get("/claims/export", params={"format": "xml"}).status_code == 422
+
+# --------------------------
+# Test: Partial update with PATCH
+# --------------------------
+def test_patch_claim(client):
+    claim = client.post("/claims", json={"claimant_name": "Patch User", "amount": 40, "status": "submitted"}).json()
+    del claim["lines"]  # PATCH returns the claim without its lines
+
+    # Only the status changes; name and amount keep their values
+    response = client.patch(f"/claims/{claim['id']}", json={"status": "approved"})
+    assert response.status_code == 200
+    assert response.json() == {**claim, "status": "approved"}
+
+    # An empty body changes nothing
+    assert client.patch(f"/claims/{claim['id']}", json={}).json() == {**claim, "status": "approved"}
+
+    # Fields that are sent must still be valid
+    assert client.patch(f"/claims/{claim['id']}", json={"amount": -1}).status_code == 422
+    assert client.patch(f"/claims/{claim['id']}", json={"claimant_name": None}).status_code == 422
+
+    # Unknown claims give 404
+    assert client.patch("/claims/999999", json={"status": "approved"}).status_code == 404
+
+# --------------------------
+# Test: Batch status transitions by ID
+# --------------------------
+def test_status_transitions_by_id(client):
+    pending = client.post("/claims", json={"claimant_name": "Adjudicate A", "amount": 1, "status": "pending"}).json()
+    closed = client.post("/claims", json={"claimant_name": "Adjudicate B", "amount": 1, "status": "closed"}).json()
+    submitted = client.post("/claims", json={"claimant_name": "Adjudicate C", "amount": 1, "status": "submitted"}).json()
+
+    response = client.post("/claims/status-transitions", json={"transitions": [
+        {"id": pending["id"], "status": "approved"},
+        {"id": closed["id"], "status": "approved"},      # 'closed' is final
+        {"id": submitted["id"], "status": "rejected"},
+        {"id": 999999, "status": "approved"},            # Doesn't exist
+    ]})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(data["updated"]) == sorted([pending["id"], submitted["id"]])
+    assert data["missing"] == [999999]
+    assert data["rejected"] == [{"id": closed["id"], "from_status": "closed", "to_status": "approved"}]
+
+    # The changes are in the database
+    assert client.get(f"/claims/{pending['id']}").json()["status"] == "approved"
+    assert client.get(f"/claims/{closed['id']}").json()["status"] == "closed"
+
+# --------------------------
+# Test: Batch status transition by filter
+# --------------------------
+def test_status_transitions_by_filter(db_session, client):
+    # Claims with an amount no other test uses, so the filter only matches them
+    claims = [ClaimCreate(claimant_name=f"Filter {i}", amount=515151, status=status)
+              for i, status in enumerate(["pending", "pending", "pending", "closed"])]
+    created, _ = crud.create_claims_bulk(db_session, claims)
+
+    # Small chunks, to go through several UPDATE rounds
+    result = crud.transition_matching_claims(
+        db_session, schemas.ClaimFilter(min_amount=515151, max_amount=515151), schemas.ClaimStatus.rejected, chunk_size=2
+    )
+
+    # The pending claims moved; the closed one didn't
+    assert result["updated"] == [row.id for row in created[:3]]
+    statuses = {claim["id"]: claim["status"] for claim in client.get("/claims", params={"min_amount": 515151, "max_amount": 515151}).json()}
+    assert statuses == {created[0].id: "rejected", created[1].id: "rejected", created[2].id: "rejected", created[3].id: "closed"}
+
+    # The request must use exactly one of the two modes
+    assert client.post("/claims/status-transitions", json={"target_status": "approved"}).status_code == 422
+    assert client.post("/claims/status-transitions", json={"transitions": [], "filter": {}, "target_status": "approved"}).status_code == 422
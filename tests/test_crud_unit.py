@@ -4,11 +4,14 @@ import pytest
 # MagicMock is used to mock objects like database sessions and query results
 from unittest.mock import MagicMock
 
+# datetime is used to build claims with a fixed submission time
+from datetime import datetime
+
 # Importing the actual functions we want to test from our crud.py
 from app import crud
 
 # Importing our Pydantic schemas for creating and updating claim data
-from app.schemas import ClaimCreate, ClaimUpdate
+from app.schemas import ClaimCreate, ClaimStatus, ClaimUpdate
 
 # Importing the SQLAlchemy model used in our application for consistency
 from app.models import Claim
@@ -72,17 +75,9 @@ def test_get_claim():
 def test_update_claim():
     db = MagicMock()
 
-    # Simulate the existing claim in the DB
-    existing_claim = Claim(
-        id=1,
-        claimant_name="Alice",
-        amount=5000,
-        status="pending",
-        #claim_type="Medical"
-    )
-
-    # Mock the DB to return this existing claim
-    db.query().filter().first.return_value = existing_claim
+    # The row the UPDATE ... RETURNING statement sends back
+    updated_row = MagicMock(id=1, claimant_name="Alice", amount=7000, status="approved", version=2, submitted_at=datetime(2024, 5, 1))
+    db.execute.return_value.first.return_value = updated_row
 
     # Input data to update (must match the ClaimUpdate schema)
     updated_claim_data = ClaimUpdate(
@@ -95,10 +90,45 @@ def test_update_claim():
     # Run the update function
     result = crud.update_claim(db=db, claim_id=1, updated_data=updated_claim_data)
 
+    # One UPDATE ... RETURNING statement with the new values, its change event, then one commit (no SELECT, no refresh)
+    stmt = db.execute.call_args_list[0].args[0]
+    compiled = stmt.compile()
+    assert str(compiled).startswith("UPDATE claims SET")
+    assert "RETURNING" in str(compiled)
+    assert compiled.params["amount"] == 7000
+    assert compiled.params["status"] == "approved"
+    assert str(db.execute.call_args_list[1].args[0].compile()).startswith("INSERT INTO claim_events")
+    assert db.execute.call_args_list[1].args[1][0]["change_type"] == "updated"
+    assert db.execute.call_count == 2
+    db.commit.assert_called_once()
+    db.refresh.assert_not_called()
+
+    # The row returned by the database is handed back
+    assert result is updated_row
+
+
+def test_patch_claim_only_sends_changed_columns():
+    db = MagicMock()
+    db.execute.return_value.first.return_value = MagicMock(id=1, claimant_name="Alice", amount=5000, status="closed", version=2, submitted_at=datetime(2024, 5, 1))
+
+    crud.patch_claim(db=db, claim_id=1, changes={"status": ClaimStatus.closed})
+
+    # Only the 'status' column is in the SET clause, with the version increment
+    compiled = db.execute.call_args_list[0].args[0].compile()
+    assert set(compiled.params) == {"status", "version_1", "id_1"}
+    assert compiled.params["status"] == "closed"
+    assert "version=(claims.version + :version_1)" in str(compiled)
+
+
+def test_update_missing_claim():
+    db = MagicMock()
+
+    # No row coming back means no claim had this ID
+    db.execute.return_value.first.return_value = None
+
+    result = crud.update_claim(db=db, claim_id=99, updated_data=ClaimUpdate(claimant_name="Nobody", amount=1, status="pending"))
 
-    # Assertions to make sure updates were applied
-    assert result.amount == 7000
-    assert result.status == "approved"
+    assert result is None
 
 
 # ----------- Test for Deleting a Claim -----------
@@ -106,26 +136,20 @@ def test_update_claim():
 def test_delete_claim():
     db = MagicMock()
 
-    # Mock a claim object to be deleted
-    mock_claim = Claim(
-        id=1,
-        claimant_name="Alice",
-        amount=5000,
-        status="pending",
-        #claim_type="Medical"
-    )
-
-    # Configure mock DB to return the mock claim
-    db.query().filter().first.return_value = mock_claim
+    # The row the DELETE ... RETURNING statement sends back
+    deleted_row = MagicMock(id=1, claimant_name="Alice", amount=5000, status="pending", version=1, submitted_at=datetime(2024, 5, 1))
+    db.execute.return_value.first.return_value = deleted_row
 
     # Run delete function
     result = crud.delete_claim(db=db, claim_id=1)
 
-    # Assert that the returned object is the deleted claim
-    assert result == mock_claim
+    # Assert that the returned object is the deleted row
+    assert result is deleted_row
 
-    # Also verify that delete and commit were called correctly
-    db.delete.assert_called_once_with(mock_claim)
+    # One DELETE ... RETURNING statement, its change event and one commit; nothing is loaded into the session first
+    assert str(db.execute.call_args_list[0].args[0].compile()).startswith("DELETE FROM claims")
+    assert db.execute.call_args_list[1].args[1][0]["change_type"] == "deleted"
+    db.delete.assert_not_called()
     db.commit.assert_called_once()
 
 
@@ -150,3 +174,21 @@ def test_get_all_claims():
     assert len(result) == 2
     assert result[0].claimant_name == "Alice"
     assert result[1].claimant_name == "Bob"
+
+
+# ----------- Test for Pagination Cursors -----------
+
+def test_cursor_round_trip():
+    # A cursor encodes the (submitted_at, id) position of the last claim on a page
+    claim = Claim(id=42, claimant_name="Alice", amount=5000, status="pending",
+                  submitted_at=datetime(2024, 5, 1, 12, 30, 15, 123456))
+
+    cursor = crud.encode_cursor(claim)
+
+    assert crud.decode_cursor(cursor) == (claim.submitted_at, 42)
+
+
+def test_decode_invalid_cursor():
+    # Anything we didn't issue is rejected with a ValueError
+    with pytest.raises(ValueError):
+        crud.decode_cursor("garbage")
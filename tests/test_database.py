@@ -0,0 +1,58 @@
+# ---------------------------------------------
+# Tests for engine configuration and pool metrics
+# ---------------------------------------------
+
+from app import database
+from app.config import Settings
+
+
+def test_settings_from_environment(monkeypatch):
+    # Pool settings are read from the environment
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    monkeypatch.setenv("DB_EXTERNAL_POOLER", "yes")
+
+    settings = Settings()
+
+    assert settings.pool_size == 20
+    assert settings.max_overflow == 0
+    assert settings.pool_pre_ping is False
+    assert settings.external_pooler is True
+
+
+def test_engine_options(monkeypatch):
+    # Local pooling: sized QueuePool, with the PostgreSQL statement timeout passed at connect time
+    monkeypatch.setattr(database.settings, "external_pooler", False)
+    monkeypatch.setattr(database.settings, "statement_timeout_ms", 5000)
+    options = database.engine_options("postgresql://localhost/claims_db")
+    assert options["poolclass"] is database.TimedQueuePool
+    assert options["pool_size"] == database.settings.pool_size
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+    # External pooler: no pool in the process at all
+    monkeypatch.setattr(database.settings, "external_pooler", True)
+    options = database.engine_options("postgresql://localhost/claims_db", is_async=True)
+    assert options["poolclass"] is database.TimedNullPool
+    assert "pool_size" not in options
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+
+
+def test_routes_use_shared_session_dependency(client):
+    # The routes use app.database.get_db, which conftest overrides with the test session
+    from app.main import app
+    assert database.get_db in app.dependency_overrides
+    assert client.get("/claims").status_code == 200
+
+
+def test_pool_metrics(client):
+    # Checking a connection out of the app's pool is recorded
+    before = database.pool_checkout_seconds.count()
+    with database.engine.connect():
+        pass
+    assert database.pool_checkout_seconds.count() == before + 1
+
+    # Wait time and saturation are exposed in the Prometheus format
+    body = client.get("/metrics").text
+    assert "db_pool_checkout_seconds_count" in body
+    assert "db_pool_saturation" in body
@@ -0,0 +1,107 @@
+# ---------------------------------------------
+# Tests for ETags and If-Match on single claims (etags.py): optimistic concurrency control
+# ---------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from app import cache, crud, etags, models
+from app.config import settings
+
+CLAIM = {"claimant_name": "Versioned User", "amount": 100, "status": "pending"}
+
+
+def test_parse_if_match():
+    assert etags.parse_if_match(None) is None
+    assert etags.parse_if_match("*") is None
+    assert etags.parse_if_match('"3"') == [3]
+    assert etags.parse_if_match('"3", "4"') == [3, 4]
+    # If-Match uses the strong comparison: weak and malformed tags never match
+    assert etags.parse_if_match('W/"3", 3, "x"') == []
+    assert etags.not_modified('W/"3"', 3) and etags.not_modified("*", 3) and not etags.not_modified('"2"', 3)
+
+
+def test_conditional_writes(client):
+    response = client.post("/claims", json=CLAIM)
+    claim, etag = response.json(), response.headers["ETag"]
+    assert etag == '"1"'
+    assert "version" not in claim  # The version travels in the ETag header only
+    url = f"/claims/{claim['id']}"
+
+    # GET sends the ETag; a client with the current copy gets 304
+    assert client.get(url).headers["ETag"] == etag
+    not_modified = client.get(url, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.headers["ETag"] == etag
+
+    # A write with the current ETag succeeds and moves the version on
+    response = client.put(url, json={**CLAIM, "amount": 150}, headers={"If-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] == '"2"'
+
+    # Writes based on the old copy are refused with the current ETag, and change nothing
+    for method, kwargs in (("PUT", {"json": {**CLAIM, "amount": 1}}), ("PATCH", {"json": {"status": "closed"}}), ("DELETE", {})):
+        stale = client.request(method, url, headers={"If-Match": etag}, **kwargs)
+        assert stale.status_code == 412
+        assert stale.headers["ETag"] == '"2"'
+    assert client.get(url).json() == {**claim, "amount": 150}
+
+    # No If-Match (or '*'): unconditional, as before
+    assert client.patch(url, json={"status": "approved"}, headers={"If-Match": "*"}).headers["ETag"] == '"3"'
+    assert client.patch(url, json={"claimant_name": "Renamed"}).headers["ETag"] == '"4"'
+
+    # DELETE with the current ETag; a conditional write on a missing claim is still 404
+    assert client.delete(url, headers={"If-Match": '"4"'}).status_code == 204
+    assert client.put(url, json=CLAIM, headers={"If-Match": '"4"'}).status_code == 404
+
+
+def test_if_match_can_be_required(client, monkeypatch):
+    claim = client.post("/claims", json=CLAIM).json()
+    monkeypatch.setattr(settings, "require_if_match", True)
+    assert client.patch(f"/claims/{claim['id']}", json={"status": "closed"}).status_code == 428
+    assert client.patch(f"/claims/{claim['id']}", json={"status": "closed"}, headers={"If-Match": '"1"'}).status_code == 200
+
+
+def test_batch_transitions_outdate_etags(client):
+    claim = client.post("/claims", json=CLAIM).json()
+    client.post("/claims/status-transitions", json={"transitions": [{"id": claim["id"], "status": "approved"}]})
+    assert client.patch(f"/claims/{claim['id']}", json={"status": "closed"}, headers={"If-Match": '"1"'}).status_code == 412
+
+
+def test_cached_claims_keep_their_etag(client, monkeypatch):
+    monkeypatch.setattr(cache, "claim_cache", cache.LRUCache(max_entries=10, ttl=60))
+    claim = client.post("/claims", json=CLAIM).json()
+    client.patch(f"/claims/{claim['id']}", json={"status": "approved"})
+    for _ in range(2):  # Miss, then hit
+        response = client.get(f"/claims/{claim['id']}")
+        assert response.headers["ETag"] == '"2"' and response.json()["status"] == "approved"
+
+
+def test_concurrent_writers_lose_no_updates(client, db_session):
+    # Several adjudicators each add 1.00 to the same claim a number of times, with read / If-Match write / retry on 412.
+    # Without the version check, concurrent read-modify-write cycles would overwrite each other's increments.
+    writers, increments = 8, 15
+    claim_id = client.post("/claims", json=CLAIM).json()["id"]
+    Session = sessionmaker(bind=db_session.get_bind())
+    table = models.Claim.__table__
+
+    def adjudicate(_):
+        with Session() as db:
+            for _ in range(increments):
+                while True:
+                    amount, version = db.execute(select(table.c.amount, table.c.version).where(table.c.id == claim_id)).one()
+                    db.commit()
+                    try:
+                        crud.patch_claim(db, claim_id, {"amount": amount + 1}, expected_versions=[version])
+                        break
+                    except crud.StaleClaimVersion:
+                        continue  # Someone else wrote first: read again and retry
+
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        list(pool.map(adjudicate, range(writers)))
+
+    db_session.expire_all()
+    amount, version = db_session.execute(select(table.c.amount, table.c.version).where(table.c.id == claim_id)).one()
+    assert amount == Decimal(CLAIM["amount"] + writers * increments)
+    assert version == 1 + writers * increments
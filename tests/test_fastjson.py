@@ -0,0 +1,46 @@
+# ---------------------------------------------
+# Tests for the FAST_JSON response path (fastjson.py): same bytes as the regular path
+# ---------------------------------------------
+
+from datetime import datetime
+
+from app import crud, fastjson, models
+from app.config import settings
+
+# Values that are easy to encode differently: non-ASCII names, quotes, microseconds, the smallest and largest amounts
+CLAIMS = [
+    {"claimant_name": 'Zoë "Fast" Ünal 🙂', "amount": 0.1, "status": "pending", "submitted_at": datetime(2031, 1, 1, 9, 0, 0)},
+    {"claimant_name": "Fast Micro", "amount": 1500.0, "status": "approved", "submitted_at": datetime(2031, 1, 1, 9, 0, 0, 120)},
+    {"claimant_name": "Fast Cent", "amount": 0.01, "status": "closed", "submitted_at": datetime(2031, 1, 1, 9, 0, 1)},
+    {"claimant_name": "Fast Huge", "amount": 999999999999.99, "status": "rejected", "submitted_at": datetime(2031, 1, 1, 9, 0, 2)},
+]
+
+
+def test_fast_path_sends_the_same_bytes(client, db_session, monkeypatch):
+    claims = [models.Claim(**values) for values in CLAIMS]
+    db_session.add_all(claims)
+    db_session.commit()
+    params = {"submitted_from": "2031-01-01T00:00:00", "limit": 2}
+
+    regular_page = client.get("/claims", params=params)
+    regular_next = client.get("/claims", params={**params, "cursor": regular_page.headers["X-Next-Cursor"]})
+    regular_one = [client.get(f"/claims/{claim.id}").content for claim in claims]
+
+    monkeypatch.setattr(settings, "fast_json", True)
+    fast_page = client.get("/claims", params=params)
+    fast_next = client.get("/claims", params={**params, "cursor": fast_page.headers["X-Next-Cursor"]})
+    assert fast_page.content == regular_page.content  # Encoded by orjson
+    assert fast_page.headers["X-Next-Cursor"] == regular_page.headers["X-Next-Cursor"]
+    assert fast_next.content == regular_next.content
+    assert "X-Next-Cursor" not in fast_next.headers
+
+    # Single claims: encoded straight from a row, without the ORM object
+    for claim, regular in zip(claims, regular_one):
+        assert crud.get_claim_json(db_session, claim.id, fast=True).encode() == regular
+        assert client.get(f"/claims/{claim.id}").content == regular
+    assert client.get("/claims/99999999").status_code == 404
+
+
+def test_fast_rows_have_only_the_schema_fields(db_session):
+    rows, _ = crud.get_claims_page_rows(db_session, limit=1)
+    assert rows and rows[0]._fields == fastjson.CLAIM_FIELDS
@@ -0,0 +1,87 @@
+# ---------------------------------------------
+# Tests for Idempotency-Key support on POST /claims
+# ---------------------------------------------
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from app import crud, models
+from app.schemas import ClaimCreate
+
+CLAIM = {"claimant_name": "Retry User", "amount": 310.0, "status": "submitted"}
+
+
+def count_claims(db_session, name):
+    return db_session.scalar(select(func.count()).select_from(models.Claim).where(models.Claim.claimant_name == name))
+
+
+def test_retry_returns_original_claim(client, db_session):
+    first = client.post("/claims", json=CLAIM, headers={"Idempotency-Key": "retry-1"})
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+
+    # Same key and claim (different JSON key order): the same claim comes back, nothing new is written
+    retry = client.post("/claims", json=dict(reversed(list(CLAIM.items()))), headers={"Idempotency-Key": "retry-1"})
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert count_claims(db_session, "Retry User") == 1
+
+    # Without a key every request creates a claim, as before
+    client.post("/claims", json=CLAIM)
+    assert count_claims(db_session, "Retry User") == 2
+
+
+def test_key_reused_for_another_claim(client):
+    client.post("/claims", json=CLAIM, headers={"Idempotency-Key": "reused"})
+    response = client.post("/claims", json={**CLAIM, "amount": 999}, headers={"Idempotency-Key": "reused"})
+    assert response.status_code == 422
+
+
+def test_key_of_deleted_claim(client):
+    claim = client.post("/claims", json=CLAIM, headers={"Idempotency-Key": "deleted"}).json()
+    client.delete(f"/claims/{claim['id']}")
+    assert client.post("/claims", json=CLAIM, headers={"Idempotency-Key": "deleted"}).status_code == 409
+
+
+def test_concurrent_request_with_same_key(db_session, monkeypatch):
+    # Another request stores the key between this request's lookup and its INSERT
+    claim = ClaimCreate(**CLAIM)
+    original, _ = crud.create_claim_idempotent(db_session, claim, "race", ttl=60)
+    real_lookup = crud.idempotency_lookup_statement
+    calls = []
+
+    def lookup_missing_first_time(key, cutoff):
+        calls.append(key)
+        return real_lookup("no-such-key" if len(calls) == 1 else key, cutoff)
+
+    monkeypatch.setattr(crud, "idempotency_lookup_statement", lookup_missing_first_time)
+    before = db_session.scalar(select(func.count()).select_from(models.Claim))
+    row, replayed = crud.create_claim_idempotent(db_session, claim, "race", ttl=60)
+
+    # The losing request's claim was rolled back and the winner's claim returned
+    assert replayed and row.id == original.id
+    assert db_session.scalar(select(func.count()).select_from(models.Claim)) == before
+
+
+def test_expired_keys(db_session):
+    claim = ClaimCreate(**{**CLAIM, "claimant_name": "Expiry User"})
+    first, _ = crud.create_claim_idempotent(db_session, claim, "old-key", ttl=60)
+    db_session.execute(
+        update(models.IdempotencyKey).where(models.IdempotencyKey.key == "old-key").values(created_at=datetime.utcnow() - timedelta(hours=2))
+    )
+    db_session.commit()
+
+    # An expired key is treated as new and taken over
+    second, replayed = crud.create_claim_idempotent(db_session, claim, "old-key", ttl=60)
+    assert not replayed and second.id != first.id
+
+    # Purging removes only expired keys
+    db_session.execute(
+        update(models.IdempotencyKey).where(models.IdempotencyKey.key == "old-key").values(created_at=datetime.utcnow() - timedelta(hours=2))
+    )
+    db_session.commit()
+    assert crud.purge_idempotency_keys(db_session, ttl=60, chunk_size=1) >= 1
+    assert db_session.get(models.IdempotencyKey, "old-key") is None
+    assert db_session.get(models.IdempotencyKey, "reused") is not None
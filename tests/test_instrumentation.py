@@ -0,0 +1,45 @@
+# ---------------------------------------------
+# Tests for the request timing middleware and SQL instrumentation (instrumentation.py)
+# ---------------------------------------------
+
+import logging
+
+from app import instrumentation
+from app.config import settings
+from tests.conftest import engine
+
+# The tests route requests to their own engine; time its statements like the app's engine
+instrumentation.instrument_engine(engine)
+
+
+def test_server_timing_header_counts_queries(client):
+    claim = client.post("/claims", json={"claimant_name": "Timing User", "amount": 10, "status": "pending"}).json()
+    response = client.get(f"/claims/{claim['id']}")
+
+    header = response.headers["server-timing"]
+    assert header.startswith("total;dur=")
+    assert 'desc="2 queries"' in header  # One SELECT for the claim and one for its lines (the cache is off in tests)
+    assert "pool;dur=" in header
+
+
+def test_route_metrics(client):
+    client.get("/claims", params={"limit": 5})
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/claims",status="200"}' in body
+    assert 'http_request_sql_statements_count{method="GET",route="/claims"}' in body
+
+
+def test_slow_query_log_shows_parameter_types_only(client, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "slow_query_ms", 0.000001)  # Every statement is "slow"
+    with caplog.at_level(logging.WARNING, logger="app.slow_query"):
+        client.get("/claims", params={"status": "pending", "min_amount": 5, "limit": 5})
+
+    messages = [record.getMessage() for record in caplog.records if record.name == "app.slow_query"]
+    assert messages and "FROM claims" in messages[0]
+    assert "str" in messages[0] and "'pending'" not in messages[0]
+
+
+def test_parameter_shape():
+    assert instrumentation.parameter_shape({"id": 1, "status": "pending"}) == "{id: int, status: str}"
+    assert instrumentation.parameter_shape([{"id": 1}, {"id": 2}]) == "2 x {id: int}"
+    assert instrumentation.parameter_shape((1, 2.5)) == "(int, float)"
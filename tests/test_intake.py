@@ -0,0 +1,65 @@
+# ---------------------------------------------
+# Tests for the Kafka claim intake (intake.py), using the in-process broker
+# ---------------------------------------------
+
+import json
+
+import pytest
+
+from app import intake
+from app.config import settings
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    # Kafka intake mode, with POST /claims producing to an in-memory topic
+    broker = intake.InMemoryBroker()
+    monkeypatch.setattr(settings, "intake_mode", "kafka")
+    monkeypatch.setattr(intake, "_producer", broker.producer("claims.intake"))
+    return broker
+
+
+def test_post_queues_claim_and_worker_writes_it(client, broker):
+    response = client.post("/claims", json={"claimant_name": "Queued User", "amount": 42.5, "status": "submitted"})
+    assert response.status_code == 202
+    tracking_id = response.json()["tracking_id"]
+
+    # Nothing is written until the worker runs
+    assert client.get(f"/claims/intake/{tracking_id}").status_code == 404
+
+    worker = intake.IntakeWorker(broker.consumer("claims.intake", "workers"), TestingSessionLocal, batch_size=10, linger_ms=0)
+    assert worker.run_once(idle_timeout=0) == 1
+
+    claim = client.get(f"/claims/intake/{tracking_id}").json()
+    assert claim["claimant_name"] == "Queued User"
+    assert client.get(f"/claims/{claim['id']}").json()["amount"] == 42.5
+
+
+def test_post_rejects_invalid_claim_without_queueing(client, broker):
+    response = client.post("/claims", json={"claimant_name": "Bad", "amount": -1, "status": "submitted"})
+    assert response.status_code == 422
+    assert broker.read("claims.intake", 0, 10, timeout=0) == []
+
+
+def test_worker_batches_and_ignores_redelivery(broker):
+    producer = broker.producer("claims.intake")
+    for i in range(5):
+        message = {"tracking_id": f"batch-{i}", "claim": {"claimant_name": f"Batch {i}", "amount": i + 1, "status": "pending"}}
+        producer.send(f"batch-{i}", json.dumps(message).encode())
+    producer.send("batch-0", json.dumps({"tracking_id": "batch-0", "claim": {"claimant_name": "Batch 0", "amount": 1, "status": "pending"}}).encode())
+    producer.send("junk", b"not json")
+
+    # batch_size caps each micro-batch
+    consumer = broker.consumer("claims.intake", "batches")
+    worker = intake.IntakeWorker(consumer, TestingSessionLocal, batch_size=4, linger_ms=0)
+    assert worker.next_batch(idle_timeout=0) == broker.read("claims.intake", 0, 4, timeout=0)
+
+    # A worker that crashed before committing: the next one reads the same records again
+    consumer = broker.consumer("claims.intake", "batches")
+    worker = intake.IntakeWorker(consumer, TestingSessionLocal, batch_size=10, linger_ms=0)
+    assert worker.run_once(idle_timeout=0) == 5  # The duplicate and the malformed message are skipped
+
+    # Replaying the whole topic (e.g. a new consumer group) writes nothing twice
+    replay = intake.IntakeWorker(broker.consumer("claims.intake", "replay"), TestingSessionLocal, batch_size=10, linger_ms=0)
+    assert replay.run_once(idle_timeout=0) == 0
@@ -0,0 +1,74 @@
+# ---------------------------------------------
+# Tests for schema migrations (migrate.py) and the startup pool warm-up
+# ---------------------------------------------
+
+from decimal import Decimal
+
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app import database, migrate, models
+
+# The claims table as the old create_all-at-import code created it
+LEGACY_SCHEMA = [
+    "CREATE TABLE claims (id INTEGER PRIMARY KEY, claimant_name VARCHAR NOT NULL, amount FLOAT NOT NULL, status VARCHAR, submitted_at DATETIME)",
+    "CREATE INDEX ix_claims_id ON claims (id)",
+    "INSERT INTO claims (claimant_name, amount, status, submitted_at) VALUES ('Old A', 10, 'pending', '2025-01-01 10:00:00'), ('Old B', 5, 'pending', '2025-01-01 10:30:00')",
+]
+
+
+def test_migrate_new_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    assert migrate.migrate(engine) == [step.version for step in migrate.MIGRATIONS]
+    assert {"claims", "claim_stats", "claim_attachments", "claim_lines", "schema_migrations"} <= set(inspect(engine).get_table_names())
+
+    # Nothing left to do the second time
+    assert migrate.migrate(engine) == []
+
+
+def test_migrate_upgrades_legacy_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        for statement in LEGACY_SCHEMA:
+            connection.execute(text(statement))
+
+    migrate.migrate(engine)
+
+    claims = inspect(engine)
+    assert "tracking_id" in {column["name"] for column in claims.get_columns("claims")}
+    assert {"ix_claims_submitted_at_id", "ix_claims_status_submitted_at_id", "ix_claims_tracking_id"} <= {
+        index["name"] for index in claims.get_indexes("claims")
+    }
+
+    # The float amounts were converted to cents, and read back as exact decimals
+    with Session(engine) as db:
+        assert sorted(db.scalars(select(models.Claim.amount))) == [Decimal("5.00"), Decimal("10.00")]
+
+    with engine.begin() as connection:
+        # claim_stats was filled from the existing claims, and the triggers keep it up to date
+        # Amounts are whole cents from migration 7 on
+        connection.execute(text("INSERT INTO claims (claimant_name, amount, status, submitted_at) VALUES ('New', 100, 'pending', '2025-01-01 10:45:00')"))
+        total = connection.execute(text("SELECT SUM(claim_count), SUM(amount_total) FROM claim_stats")).one()
+        # The existing claims were also added to the SQLite name search index
+        found = connection.execute(text("SELECT count(*) FROM claims_fts WHERE claims_fts MATCH 'old'")).scalar()
+        # The change feed starts empty
+        feed = connection.execute(text("SELECT last_position, purged_through FROM change_feed_state")).all()
+    assert tuple(total) == (3, 1600)
+    assert found == 2
+    assert [tuple(row) for row in feed] == [(0, 0)]
+
+    # claims was rebuilt as AUTOINCREMENT: the ID of a deleted claim is not handed out again
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM claims WHERE claimant_name = 'New'"))
+        connection.execute(text("INSERT INTO claims (claimant_name, amount, status, submitted_at) VALUES ('Newer', 100, 'pending', '2025-01-01 11:00:00')"))
+        newer_id = connection.execute(text("SELECT id FROM claims WHERE claimant_name = 'Newer'")).scalar()
+        found = connection.execute(text("SELECT count(*) FROM claims_fts WHERE claims_fts MATCH 'newer'")).scalar()
+    assert newer_id == 4
+    assert found == 1
+
+
+def test_warm_pool_leaves_connections_in_the_pool():
+    database.engine.dispose()
+    assert database.warm_pool(3) == 3
+    assert database.engine.pool.checkedin() == 3
+    assert database.engine.pool.checkedout() == 0
@@ -0,0 +1,68 @@
+# ---------------------------------------------
+# Tests for exact money amounts (money.py) and the totals API (GET /claims/totals)
+# ---------------------------------------------
+
+from decimal import Decimal, ROUND_CEILING
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import update
+
+from app import models, money, stats
+from app.schemas import ClaimCreate
+
+
+def test_cents_conversions():
+    assert money.to_cents(Decimal("12.34")) == 1234
+    assert money.to_cents(0.1) == 10
+    assert money.to_cents(7) == 700
+    assert money.from_cents(1234) == Decimal("12.34")
+    assert money.from_cents(1200.0) == Decimal("12.00")  # SQLite REAL column left by migration 7
+    with pytest.raises(ValueError):
+        money.to_cents(0.1 + 0.2)
+    assert money.to_cents(10.001, ROUND_CEILING) == 1001
+
+    # Filter bounds rounded inwards match the same whole-cent amounts
+    assert money.at_least(10.001) == Decimal("10.01")
+    assert money.at_most(10.009) == Decimal("10.00")
+
+
+def test_amounts_with_fractions_of_a_cent_are_rejected(client):
+    assert ClaimCreate(claimant_name="Money", amount=19.99, status="pending").amount == Decimal("19.99")
+    with pytest.raises(ValidationError):
+        ClaimCreate(claimant_name="Money", amount=0.1 + 0.2, status="pending")
+    response = client.post("/claims", json={"claimant_name": "Money", "amount": 1.005, "status": "pending"})
+    assert response.status_code == 422
+
+
+def test_totals_are_exact(client):
+    # In floats 0.1 + 0.1 + 0.1 + 0.2 is 0.5000000000000001; in cents it is 50
+    for _ in range(3):
+        client.post("/claims", json={"claimant_name": "Dime", "amount": 0.1, "status": "approved"})
+    client.post("/claims", json={"claimant_name": "Dime", "amount": 0.2, "status": "approved"})
+    created = client.get("/claims", params={"status": "approved", "min_amount": 0.1, "max_amount": 0.2}).json()
+    submitted_from = min(claim["submitted_at"] for claim in created)
+
+    params = {"status": "approved", "max_amount": 0.2, "submitted_from": submitted_from}
+    rows = client.get("/claims/totals", params=params).json()
+    assert rows == [{"status": "approved", "claim_count": 4, "amount_total": 0.5, "amount_total_cents": 50}]
+
+    overall = client.get("/claims/totals", params={**params, "by_status": False}).json()
+    assert overall == [{"claim_count": 4, "amount_total": 0.5, "amount_total_cents": 50}]
+
+
+def test_reconciliation(client, db_session):
+    client.post("/claims", json={"claimant_name": "Reconciled", "amount": 12.34, "status": "pending"})
+    report = client.get("/claims/totals/reconcile").json()
+    assert report["matches"] and report["statuses"]
+
+    # A write the triggers didn't see (here: straight into claim_stats) shows up as a mismatch
+    db_session.execute(update(models.ClaimStats).where(models.ClaimStats.status == "pending").values(claim_count=models.ClaimStats.claim_count + 1))
+    db_session.commit()
+    report = client.get("/claims/totals/reconcile").json()
+    assert not report["matches"]
+    assert [row["status"] for row in report["statuses"] if not row["matches"]] == ["pending"]
+
+    with db_session.get_bind().begin() as connection:
+        stats.rebuild(connection)
+    assert client.get("/claims/totals/reconcile").json()["matches"]
@@ -0,0 +1,201 @@
+# ---------------------------------------------
+# Tests for rate limiting and load shedding (ratelimit.py)
+# ---------------------------------------------
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import metrics, ratelimit
+from app.main import app as main_app
+from app.ratelimit import Limit
+
+
+# A clock the tests can move forward by hand
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Minimal stand-in for redis.asyncio.Redis: the script returns preset answers (or fails) and records its calls
+class FakeRedis:
+    def __init__(self, answers=(), error=None):
+        self.answers, self.error, self.calls = list(answers), error, []
+
+    def register_script(self, source):
+        async def script(keys, args):
+            self.calls.append((keys, args))
+            if self.error:
+                raise self.error
+            return self.answers.pop(0)
+        return script
+
+
+def limited_app(limiter, max_in_flight=0, route_limits=None, api_keys=("alice", "bob")):
+    """
+    A small app behind the middleware. 'sessions' counts the database sessions its routes asked for,
+    and /slow waits for 'release' to be set.
+    """
+    app = FastAPI()
+    app.state.sessions = 0
+    app.state.release = None
+
+    def get_session():
+        app.state.sessions += 1
+        return "session"
+
+    @app.get("/claims/{claim_id}")
+    def read_claim(claim_id: int, db=Depends(get_session)):
+        return {"id": claim_id}
+
+    @app.post("/claims")
+    def create_claim(db=Depends(get_session)):
+        return {"id": 1}
+
+    @app.post("/claims/bulk")
+    def create_bulk(db=Depends(get_session)):
+        return {"created": []}
+
+    @app.get("/slow")
+    async def slow(db=Depends(get_session)):
+        await app.state.release.wait()
+        return {}
+
+    @app.get("/metrics")
+    def read_metrics():
+        return {}
+
+    app.add_middleware(
+        ratelimit.RateLimitMiddleware, routes=app.router.routes, limiter=limiter,
+        read_limit=Limit(1, 3), write_limit=Limit(1, 2), route_limits=route_limits or {},
+        max_in_flight=max_in_flight, client_header="X-API-Key", api_keys=list(api_keys),
+    )
+    return app
+
+
+def test_memory_token_bucket():
+    clock = FakeClock()
+    limiter = ratelimit.MemoryRateLimiter(max_buckets=2, clock=clock)
+    limit = Limit(rate=2, burst=3)
+
+    # A full bucket allows 'burst' requests at once, then asks the client to wait for the next token
+    assert [asyncio.run(limiter.acquire("a", limit)) for _ in range(3)] == [0, 0, 0]
+    assert asyncio.run(limiter.acquire("a", limit)) == pytest.approx(0.5)
+
+    # Tokens come back at 'rate' per second
+    clock.now = 1.0
+    assert asyncio.run(limiter.acquire("a", limit)) == 0
+    assert asyncio.run(limiter.acquire("a", limit)) == 0
+    assert asyncio.run(limiter.acquire("a", limit)) > 0
+
+    # Other keys have their own bucket; past 'max_buckets' the least recently used one is dropped
+    assert asyncio.run(limiter.acquire("b", limit)) == 0
+    assert asyncio.run(limiter.acquire("c", limit)) == 0
+    assert len(limiter) == 2
+    assert asyncio.run(limiter.acquire("a", limit)) == 0  # Came back full
+
+
+def test_redis_limiter():
+    fake = FakeRedis(answers=[b"0", b"0.25"])
+    limiter = ratelimit.RedisRateLimiter(client=fake, prefix="rl:")
+    assert asyncio.run(limiter.acquire("key:abc:write", Limit(4, 10))) == 0
+    assert asyncio.run(limiter.acquire("key:abc:write", Limit(4, 10))) == 0.25
+    assert fake.calls[0] == (["rl:key:abc:write"], [4, 10])
+
+    # Redis errors let the request through
+    errors = ratelimit.limiter_errors.value(backend="redis")
+    broken = ratelimit.RedisRateLimiter(client=FakeRedis(error=ConnectionError("down")))
+    assert asyncio.run(broken.acquire("key:abc:write", Limit(4, 10))) == 0
+    assert ratelimit.limiter_errors.value(backend="redis") == errors + 1
+
+
+def test_parse_route_limits():
+    assert ratelimit.parse_route_limits("POST /claims/bulk=1/5, get /claims/export=0.2/2") == {
+        ("POST", "/claims/bulk"): Limit(1.0, 5),
+        ("GET", "/claims/export"): Limit(0.2, 2),
+    }
+    assert ratelimit.parse_route_limits("") == {}
+    with pytest.raises(ValueError):
+        ratelimit.parse_route_limits("POST /claims/bulk=fast")
+
+
+def test_clients_get_429_with_retry_after():
+    app = limited_app(ratelimit.MemoryRateLimiter(clock=FakeClock()), route_limits={("POST", "/claims/bulk"): Limit(1, 1)})
+    client = TestClient(app)
+    alice, bob = {"X-API-Key": "alice"}, {"X-API-Key": "bob"}
+
+    # Reads and writes have separate buckets: 3 reads and 2 writes go through, the next of each is refused
+    assert [client.get(f"/claims/{i}", headers=alice).status_code for i in range(4)] == [200, 200, 200, 429]
+    assert [client.post("/claims", headers=alice).status_code for _ in range(3)] == [200, 200, 429]
+    refused = client.get("/claims/1", headers=alice)
+    assert refused.headers["Retry-After"] == "1"
+    assert refused.json() == {"detail": "Rate limit exceeded; retry later"}
+
+    # A route with its own limit has its own bucket
+    assert [client.post("/claims/bulk", headers=alice).status_code for _ in range(2)] == [200, 429]
+
+    # Other clients (by key, or by address without one) are not affected; /metrics is never limited
+    assert client.get("/claims/1", headers=bob).status_code == 200
+    assert client.get("/claims/1").status_code == 200
+    assert all(client.get("/metrics", headers=alice).status_code == 200 for _ in range(5))
+
+    # Refused requests never asked for a database session
+    assert app.state.sessions == 3 + 2 + 1 + 1 + 1
+
+
+def test_unknown_keys_are_no_identity(monkeypatch):
+    app = limited_app(ratelimit.MemoryRateLimiter(clock=FakeClock()))
+    client = TestClient(app)
+
+    # A new made-up key with each request doesn't get a fresh bucket: they all count as the client's address
+    statuses = [client.get("/claims/1", headers={"X-API-Key": f"random-{i}"}).status_code for i in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    assert client.get("/claims/1").status_code == 429
+    # A configured key is its own client
+    assert client.get("/claims/1", headers={"X-API-Key": "alice"}).status_code == 200
+
+    # Behind a proxy that authenticates clients and sets the header, any value names a client
+    scope = {"headers": [(b"x-api-key", b"random-1")], "client": ("10.0.0.1", 1234)}
+    assert ratelimit.client_key(scope, b"x-api-key", ratelimit.key_digests(("alice",))) == "ip:10.0.0.1"
+    assert ratelimit.client_key(scope, b"x-api-key", None) == "key:" + ratelimit.key_digest(b"random-1")
+    monkeypatch.setattr(ratelimit.settings, "rate_limit_trust_client_header", True)
+    assert ratelimit.trusted_keys() is None
+
+
+def test_in_flight_cap_sheds_with_503():
+    app = limited_app(ratelimit.RateLimiter(), max_in_flight=1)
+
+    async def scenario():
+        app.state.release = asyncio.Event()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            slow = asyncio.create_task(client.get("/slow"))
+            while app.state.sessions == 0:
+                await asyncio.sleep(0.01)
+
+            # The one slot is taken: new requests are shed before they reach a dependency
+            shed = await client.get("/claims/1")
+            assert shed.status_code == 503
+            assert shed.headers["Retry-After"] == "1"
+            # The process-wide gauge counts it, even after another middleware (another app) was built
+            limited_app(ratelimit.RateLimiter()).build_middleware_stack()
+            assert "http_requests_in_flight 1\n" in metrics.registry.render()
+            assert (await client.get("/metrics")).status_code == 200
+            assert app.state.sessions == 1
+
+            app.state.release.set()
+            assert (await slow).status_code == 200
+            assert (await client.get("/claims/1")).status_code == 200
+
+    asyncio.run(scenario())
+
+
+def test_main_app_is_limited():
+    # Outermost middleware, so it runs before the timing middleware and the routes
+    assert main_app.user_middleware[0].cls is ratelimit.RateLimitMiddleware
+
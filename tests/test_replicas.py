@@ -0,0 +1,141 @@
+# ---------------------------------------------
+# Tests for read-replica routing (replicas.py): one primary and two replica SQLite files
+# ---------------------------------------------
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app import cache, database, models, replicas
+from app.config import settings
+from app.main import app
+
+CLAIM = {"claimant_name": "Replica User", "amount": 15, "status": "submitted"}
+ALICE, BOB = {"X-API-Key": "alice"}, {"X-API-Key": "bob"}
+
+
+# A clock the tests can move forward by hand
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Cluster:
+    """
+    A primary SQLite file and replica files that only see its changes when 'replicate' copies them over.
+    """
+
+    def __init__(self, tmp_path, replica_count=2):
+        self.primary_path = tmp_path / "primary.db"
+        self.replica_paths = [tmp_path / f"replica{i}.db" for i in range(replica_count)]
+        self.primary = create_engine(f"sqlite:///{self.primary_path}", connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(bind=self.primary)
+        self.clock = FakeClock()
+        self.replicas = replicas.ReplicaSet(
+            [f"sqlite:///{path}" for path in self.replica_paths],
+            lambda url: create_engine(url, connect_args={"check_same_thread": False}),
+            max_lag=5,
+            sticky=replicas.MemoryStickyClients(seconds=5, clock=self.clock),
+        )
+        for index in range(replica_count):
+            self.replicate(index)
+        self.replicas.check_lag()
+
+    def replicate(self, index):
+        # Replace the replica's contents with the primary's
+        with sqlite3.connect(self.primary_path) as source, sqlite3.connect(self.replica_paths[index]) as target:
+            source.backup(target)
+
+    def close(self):
+        self.replicas.dispose()
+        self.primary.dispose()
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    cluster = Cluster(tmp_path)
+    # The app's own get_db, on the test primary and replicas (instead of conftest's override)
+    monkeypatch.delitem(app.dependency_overrides, database.get_db)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=cluster.primary, autoflush=False, class_=replicas.RoutingSession))
+    monkeypatch.setattr(database, "replicas", cluster.replicas)
+    # Alice and Bob are told apart by their API keys, which only count once configured
+    monkeypatch.setattr(settings, "rate_limit_api_keys", ["alice", "bob"])
+    yield cluster
+    cluster.close()
+
+
+def test_reads_are_spread_over_the_replicas(cluster):
+    client = TestClient(app)
+    created = client.post("/claims", json=CLAIM, headers=ALICE).json()
+
+    # The write went to the primary only
+    with cluster.primary.connect() as connection:
+        assert connection.scalar(select(func.count()).select_from(models.Claim)) == 1
+    assert client.get(f"/claims/{created['id']}", headers=BOB).status_code == 404
+
+    # Only the first replica has caught up: round-robin reads alternate between finding the claim and not
+    cluster.replicate(0)
+    statuses = [client.get(f"/claims/{created['id']}", headers=BOB).status_code for _ in range(4)]
+    assert sorted(statuses) == [200, 200, 404, 404]
+    assert statuses[0] != statuses[1]
+
+    cluster.replicate(1)
+    assert all(client.get(f"/claims/{created['id']}", headers=BOB).status_code == 200 for _ in range(4))
+
+
+def test_read_your_writes(cluster, monkeypatch):
+    monkeypatch.setattr(cache, "claim_cache", cache.LRUCache())
+    client = TestClient(app)
+    created = client.post("/claims", json=CLAIM, headers=ALICE).json()
+
+    # The writer reads from the primary for REPLICA_STICKY_SECONDS; other clients read from the replicas
+    assert client.get(f"/claims/{created['id']}", headers=BOB).status_code == 404
+    assert client.get(f"/claims/{created['id']}", headers=ALICE).json() == created
+    assert len(cache.claim_cache) == 1  # Only the primary's copy was cached
+
+    cluster.clock.now = 6
+    cache.claim_cache.delete(created["id"])
+    assert client.get(f"/claims/{created['id']}", headers=ALICE).status_code == 404
+
+
+def test_lagging_replicas_fall_back_to_the_primary(cluster, monkeypatch):
+    client = TestClient(app)
+    created = client.post("/claims", json=CLAIM, headers=ALICE).json()
+    cluster.replicate(0)
+    url = f"/claims/{created['id']}"
+
+    # The second replica is too far behind, so every read goes to the first
+    lags = {str(replica.engine.url): lag for replica, lag in zip(cluster.replicas.replicas, (0.5, 30))}
+    monkeypatch.setattr(replicas, "measure_lag", lambda engine: lags[str(engine.url)])
+    cluster.replicas.check_lag()
+    assert all(client.get(url, headers=BOB).status_code == 200 for _ in range(4))
+
+    # With every replica behind or unreachable, reads use the primary
+    def unreachable(engine):
+        raise ConnectionError("replica down")
+
+    monkeypatch.setattr(replicas, "measure_lag", unreachable)
+    cluster.replicas.check_lag()
+    fallbacks = replicas.read_sessions.value(target="primary", reason="replicas_lagging")
+    created_later = client.post("/claims", json=CLAIM, headers=ALICE).json()
+    assert client.get(f"/claims/{created_later['id']}", headers=BOB).status_code == 200
+    assert replicas.read_sessions.value(target="primary", reason="replicas_lagging") == fallbacks + 1
+
+
+def test_writes_in_a_replica_session_go_to_the_primary(cluster):
+    replica = cluster.replicas.replicas[0]
+    with database.SessionLocal(info={"replica": replica.engine}) as db:
+        db.add(models.Claim(claimant_name="Flushed", amount=1, status="submitted"))
+        db.flush()
+        db.execute(insert(models.Claim), [{"claimant_name": "Inserted", "amount": 2, "status": "submitted"}])
+        assert db.scalar(select(func.count()).select_from(models.Claim)) == 0  # Reads: the replica
+        db.commit()
+
+    with cluster.primary.connect() as connection:
+        assert connection.scalars(select(models.Claim.claimant_name).order_by(models.Claim.id)).all() == ["Flushed", "Inserted"]
@@ -0,0 +1,87 @@
+# ---------------------------------------------
+# Tests for claimant name search (GET /claims/search, search.py) on SQLite FTS5
+# ---------------------------------------------
+
+from sqlalchemy.dialects import postgresql
+
+from app import models, search
+
+# Surnames unlikely to appear in the other test modules' claims
+NAMES = ["Quentin Zyxwarth", "Quentina Zyxwarthy", "Bartholomew Quaggle", "Zelda Quagglesworth"]
+
+
+def add_claims(db_session, names):
+    claims = [models.Claim(claimant_name=name, amount=10, status="pending") for name in names]
+    db_session.add_all(claims)
+    db_session.commit()
+    return claims
+
+
+def names(response):
+    return [claim["claimant_name"] for claim in response.json()]
+
+
+def test_search_finds_partial_and_misspelled_names(client, db_session):
+    add_claims(db_session, NAMES)
+
+    # Exact, partial and misspelled queries; the closest name comes first
+    assert names(client.get("/claims/search", params={"q": "Quentin Zyxwarth"}))[0] == "Quentin Zyxwarth"
+    assert set(names(client.get("/claims/search", params={"q": "zyxwar"}))) == {"Quentin Zyxwarth", "Quentina Zyxwarthy"}
+    assert names(client.get("/claims/search", params={"q": "Bartolomew Quagle"}))[0] == "Bartholomew Quaggle"
+
+    # Nothing in common, or no word long enough to have a trigram
+    assert client.get("/claims/search", params={"q": "Xqjvkp"}).json() == []
+    assert client.get("/claims/search", params={"q": "Qz"}).json() == []
+    assert client.get("/claims/search", params={"q": "Q"}).status_code == 422
+
+
+def test_search_index_follows_updates_and_deletes(client, db_session):
+    claim = add_claims(db_session, ["Ignatius Plonkworth"])[0]
+
+    client.patch(f"/claims/{claim.id}", json={"claimant_name": "Ignatius Vexbarrow"})
+    assert "Ignatius Plonkworth" not in names(client.get("/claims/search", params={"q": "Plonkworth"}))
+    assert names(client.get("/claims/search", params={"q": "Vexbarrow"}))[0] == "Ignatius Vexbarrow"
+
+    client.delete(f"/claims/{claim.id}")
+    assert "Ignatius Vexbarrow" not in names(client.get("/claims/search", params={"q": "Vexbarrow"}))
+
+
+def test_search_pages(client, db_session):
+    created = add_claims(db_session, [f"Paginus Quorrel {i}" for i in range(5)])
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"q": "Quorrel", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/claims/search", params=params)
+        assert response.status_code == 200
+        seen += [claim["id"] for claim in response.json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert pages == 3
+    assert sorted(seen) == [claim.id for claim in created]  # Every match once (equal ranks are ordered by id)
+
+    assert client.get("/claims/search", params={"q": "Quorrel", "cursor": "not-a-cursor"}).status_code == 400
+    list_cursor = client.get("/claims", params={"limit": 1}).headers["X-Next-Cursor"]
+    assert client.get("/claims/search", params={"q": "Quorrel", "cursor": list_cursor}).status_code == 400
+
+
+def test_search_stops_issuing_cursors_at_the_result_cap():
+    rows = list(range(search.MAX_SEARCH_PAGE_SIZE + 1))
+    assert search.split_results(rows, 100, search.MAX_SEARCH_RESULTS - 200)[1] is not None
+    assert search.split_results(rows, 100, search.MAX_SEARCH_RESULTS - 100) == (rows[:100], None)
+
+
+def test_fts_query_ors_the_trigrams_of_each_word():
+    assert search.fts_query('Jo Smith "x"') == '"smi" OR "mit" OR "ith" OR """x"""'
+    assert search.fts_query("ab cd") is None
+
+
+def test_postgresql_statement_uses_the_trigram_operators():
+    stmt = search.search_statement("postgresql", "Jon Smith", 20, 40)
+    sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    # '%' is doubled for psycopg2's paramstyle
+    assert "WHERE 'Jon Smith' <%% claims.claimant_name" in sql
+    assert "ORDER BY 'Jon Smith' <<-> claims.claimant_name, claims.id" in sql
+    assert "LIMIT 21 OFFSET 40" in sql
@@ -0,0 +1,105 @@
+# ---------------------------------------------
+# Tests for the production launcher (server.py) and the database pools of forked workers
+# ---------------------------------------------
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import database, models, server
+
+
+def launcher_args(**overrides):
+    args = dict(
+        host="127.0.0.1", port=9000, workers=2, backlog=512, keep_alive=30,
+        limit_concurrency=0, graceful_timeout=10, access_log=False, log_level="warning",
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_uvicorn_options():
+    options = server.uvicorn_options(launcher_args())
+    assert options["workers"] == 2
+    assert options["backlog"] == 512
+    assert options["timeout_keep_alive"] == 30
+    assert options["timeout_graceful_shutdown"] == 10
+    assert options["limit_concurrency"] is None  # 0 = no limit
+
+    assert server.uvicorn_options(launcher_args(limit_concurrency=200))["limit_concurrency"] == 200
+
+
+def test_zero_workers_means_one_per_core():
+    assert server.worker_count(0) == server.cpu_count() >= 1
+    assert server.worker_count(3) == 3
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_child_gets_its_own_pool():
+    with database.engine.connect() as connection:
+        connection.execute(text("SELECT 1"))  # Leaves a connection in the parent's pool
+    assert database.engine.pool.checkedin() >= 1
+
+    pid = os.fork()
+    if pid == 0:  # Child: the inherited connection is forgotten, a new one works
+        try:
+            inherited = database.engine.pool.checkedin()
+            with database.engine.connect() as connection:
+                ok = connection.execute(text("SELECT 1")).scalar() == 1
+            os._exit(0 if inherited == 0 and ok else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    # The parent's pooled connection survived the child
+    with database.engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_server_serves_and_drains_on_sigterm(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'server.db'}"
+    models.Base.metadata.create_all(bind=create_engine(db_url))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", "2", "--log-level", "warning"],
+        env={**os.environ, "DATABASE_URL": db_url},
+    )
+    try:
+        deadline = time.time() + 30
+        while True:
+            assert process.poll() is None, "the server exited during startup"
+            try:
+                response = httpx.post(f"http://127.0.0.1:{port}/claims", json={"claimant_name": "Worker Test", "amount": 12.5, "status": "submitted"}, timeout=5)
+                break
+            except httpx.HTTPError:
+                assert time.time() < deadline, "the server didn't start"
+                time.sleep(0.2)
+        assert response.status_code == 201
+
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=30) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def test_background_jobs_run_one_worker_at_a_time():
+    from app import main
+
+    # Each database-wide job has its own advisory lock, so jobs don't hold each other up
+    assert len(set(main.JOB_LOCK_KEYS.values())) == len(main.JOB_LOCK_KEYS)
+    # SQLite has no advisory locks: the job just runs
+    assert main.run_exclusively(main.JOB_LOCK_KEYS["change_relay"], lambda: 3) == 3
@@ -0,0 +1,62 @@
+# ---------------------------------------------
+# Tests for the pre-aggregated claim statistics (stats.py, GET /claims/stats)
+# ---------------------------------------------
+
+from sqlalchemy import func, select
+
+from app import crud, models, stats
+from app.schemas import ClaimCreate
+
+
+def stats_by_status(db_session):
+    # Totals per status from the aggregate table
+    return {row["status"]: (row["claim_count"], round(row["amount_total"], 2)) for row in stats.get_claim_stats(db_session)}
+
+
+def totals_from_claims(db_session):
+    # The same totals computed the slow way, straight from the claims table
+    rows = db_session.execute(
+        select(models.Claim.status, func.count(), func.sum(models.Claim.amount)).group_by(models.Claim.status)
+    ).all()
+    return {status: (count, round(total, 2)) for status, count, total in rows}
+
+
+def test_stats_follow_every_write_path(client, db_session):
+    # Single create, bulk create, update, partial update, status transitions and delete
+    claim = client.post("/claims", json={"claimant_name": "Stats A", "amount": 100, "status": "submitted"}).json()
+    crud.create_claims_bulk(db_session, [ClaimCreate(claimant_name=f"Stats {i}", amount=10 * i + 1, status="pending") for i in range(5)])
+    client.put(f"/claims/{claim['id']}", json={"claimant_name": "Stats A", "amount": 150, "status": "approved"})
+    client.patch(f"/claims/{claim['id']}", json={"claimant_name": "Stats A renamed"})  # Doesn't move the claim between groups
+    client.post("/claims/status-transitions", json={"filter": {"status": "pending"}, "target_status": "rejected"})
+    client.delete(f"/claims/{client.post('/claims', json={'claimant_name': 'Stats Gone', 'amount': 5, 'status': 'closed'}).json()['id']}")
+
+    # The aggregate table agrees with a full GROUP BY over the claims
+    db_session.expire_all()
+    assert stats_by_status(db_session) == totals_from_claims(db_session)
+
+    # Rebuilding from scratch gives the same result
+    with db_session.get_bind().begin() as connection:
+        stats.rebuild(connection)
+    assert stats_by_status(db_session) == totals_from_claims(db_session)
+
+
+def test_stats_endpoint(client):
+    client.post("/claims", json={"claimant_name": "Stats Endpoint", "amount": 12.5, "status": "closed"})
+
+    # By status
+    response = client.get("/claims/stats")
+    assert response.status_code == 200
+    by_status = {row["status"]: row for row in response.json()}
+    assert by_status["closed"]["claim_count"] >= 1
+    assert "period" not in by_status["closed"]
+
+    # By status and day; every group has a day like 2025-04-22
+    rows = client.get("/claims/stats", params={"group_by": ["status", "day"]}).json()
+    assert rows and all(len(row["period"]) == 10 for row in rows)
+
+    # By hour only; counts add up to the same total
+    rows_by_hour = client.get("/claims/stats", params={"group_by": "hour"}).json()
+    assert sum(row["claim_count"] for row in rows_by_hour) == sum(row["claim_count"] for row in by_status.values())
+
+    # Day and hour together make no sense
+    assert client.get("/claims/stats", params={"group_by": ["day", "hour"]}).status_code == 400